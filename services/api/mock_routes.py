@@ -13,10 +13,18 @@ async def conversation_engine_start_chat_session():
 async def conversation_engine_send_chat_message(body: BodyConversationEngineSendChatMessage):
     pass
 
+@app.post('/api/conversation_engine/send_chat_message_stream')
+async def conversation_engine_send_chat_message_stream(body: BodyConversationEngineSendChatMessage):
+    pass
+
 @app.post('/api/conversation_engine/get_chat_history')
 async def conversation_engine_get_chat_history(body: BodyConversationEngineGetChatHistory):
     pass
 
+@app.post('/api/conversation_engine/get_chat_history_page')
+async def conversation_engine_get_chat_history_page(body: BodyConversationEngineGetChatHistoryPage):
+    pass
+
 @app.post('/api/proposal_generator/generate_proposal')
 async def proposal_generator_generate_proposal(body: BodyProposalGeneratorGenerateProposal):
     pass
@@ -10,7 +10,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import HTMLResponse, Response
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.security import OAuth2PasswordBearer
 
@@ -29,13 +29,19 @@ import builtins
 
 from datetime import datetime, date, time, timedelta
 from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Any, TypeVar, Awaitable, List, Optional, Dict, Union, Literal, Annotated, Tuple, Set
+from typing import Callable, Any, TypeVar, Awaitable, AsyncIterator, List, Optional, Dict, Union, Literal, Annotated, Tuple, Set
 from functools import partial, wraps
+from contextlib import asynccontextmanager
 from uuid import UUID
 import uuid
 
 from solar.access import User
 from solar.media import MediaFile
+from solar.pool import close_async_pool, stop_health_monitor
+from solar.metrics import query_stats
+from solar.warmup import warm_up
+from solar.table import get_backend
+from solar.buffer import close_write_behind_buffers
 
 from api.utils import get_swagger_ui_html
 from api.models import TokenExchangeRequest, TokenResponse, TokenValidationRequest, LogoutResponse
@@ -50,8 +56,13 @@ REFRESH_TOKEN_COOKIE_NAME = "refresh_token"
 
 
 
-from .models import StartChatSessionOutputSchema, BodyConversationEngineSendChatMessage, SendChatMessageOutputSchema, BodyConversationEngineGetChatHistory, GetChatHistoryOutputSchema, BodyProposalGeneratorGenerateProposal, GenerateProposalOutputSchema, BodyProposalGeneratorGetProposalDetails, GetProposalDetailsOutputSchema, BodyGoogleDriveServiceUploadProposalToDrive, UploadProposalToDriveOutputSchema, TestGoogleDriveConnectionOutputSchema, BodyCalendarServiceGetCalendarBookingLink, GetCalendarBookingLinkOutputSchema, BodyCalendarServiceMarkCalendarBookingCompleted, MarkCalendarBookingCompletedOutputSchema
+from .models import StartChatSessionOutputSchema, BodyConversationEngineSendChatMessage, SendChatMessageOutputSchema, BodyConversationEngineGetChatHistory, GetChatHistoryOutputSchema, BodyConversationEngineGetChatHistoryPage, GetChatHistoryPageOutputSchema, BodyProposalGeneratorGenerateProposal, GenerateProposalOutputSchema, BodyProposalGeneratorGetProposalDetails, GetProposalDetailsOutputSchema, BodyGoogleDriveServiceUploadProposalToDrive, UploadProposalToDriveOutputSchema, TestGoogleDriveConnectionOutputSchema, BodyCalendarServiceGetCalendarBookingLink, GetCalendarBookingLinkOutputSchema, BodyCalendarServiceMarkCalendarBookingCompleted, MarkCalendarBookingCompletedOutputSchema
 from core import conversation_engine, proposal_generator, google_drive_service, calendar_service
+from core.chat_session import ChatSession
+from core.chat_message import ChatMessage
+from core.business_profile import BusinessProfile
+from core.proposal_recommendation import ProposalRecommendation
+from core.llm_client import close_llm_client
 
 
 ###############################################################################
@@ -117,9 +128,27 @@ T = TypeVar('T')
 # General App
 ##############################################################################
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open and prepare pool connections before taking traffic, so the first requests after a deploy don't pay for it.
+    # Raises when a database can't be reached, failing startup instead of reporting ready with cold pools.
+    await warm_up(
+        [ChatSession, ChatMessage, BusinessProfile, ProposalRecommendation],
+        statements=conversation_engine.turn_hot_statements()
+    )
+    yield
+    # Write out buffered rows while the pools are still open
+    await asyncio.to_thread(close_write_behind_buffers)
+    # Async DB pools are bound to this event loop, release their connections with it
+    if get_backend() is None:
+        await close_async_pool()
+        stop_health_monitor()
+    await close_llm_client()
+
 app = FastAPI(
     title="New app — 6/18 @ 11:03 PM",
-    docs_url=None
+    docs_url=None,
+    lifespan=lifespan
 )
 
 ###############################################################################
@@ -337,6 +366,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         print(f"get_current_user failed with error: {type(e).__name__}")
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+##############################################################################
+# Diagnostics Routes
+##############################################################################
+
+@app.get('/api/solar/query_stats', include_in_schema=False)
+async def solar_query_stats(user: User = Depends(get_current_user)) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-statement latency, row count and pool wait statistics of this worker, slowest total first.
+    """
+    return query_stats()
+
+@app.get('/api/conversation_engine/stats', include_in_schema=False)
+async def conversation_engine_stats(user: User = Depends(get_current_user)) -> Dict[str, Any]:
+    """
+    Readiness score agreement with the model, and completion and session cache statistics of this worker.
+    """
+    return conversation_engine.engine_stats()
+
 ##############################################################################
 # Normal Routes
 ##############################################################################
@@ -346,7 +393,7 @@ async def conversation_engine_start_chat_session() -> StartChatSessionOutputSche
     """
     Start a new chat session.
     """
-    response = await run_sync_in_thread(conversation_engine.start_chat_session)
+    response = await conversation_engine.start_chat_session()
     return response
 
 @app.post('/api/conversation_engine/send_chat_message', response_model=SendChatMessageOutputSchema, operation_id='conversation_engine_send_chat_message')
@@ -354,7 +401,7 @@ async def conversation_engine_send_chat_message(body: BodyConversationEngineSend
     """
     Process a user message and return the agent's response.
     """
-    response = await run_sync_in_thread(conversation_engine.send_chat_message, session_id=body.session_id, user_message=body.user_message)
+    response = await conversation_engine.send_chat_message(session_id=body.session_id, user_message=body.user_message, idempotency_key=body.idempotency_key)
     return response
 
 @app.post('/api/conversation_engine/get_chat_history', response_model=GetChatHistoryOutputSchema, operation_id='conversation_engine_get_chat_history')
@@ -362,7 +409,15 @@ async def conversation_engine_get_chat_history(body: BodyConversationEngineGetCh
     """
     Get the chat history for a session.
     """
-    response = await run_sync_in_thread(conversation_engine.get_chat_history, session_id=body.session_id)
+    response = await conversation_engine.get_chat_history(session_id=body.session_id)
+    return response
+
+@app.post('/api/conversation_engine/get_chat_history_page', response_model=GetChatHistoryPageOutputSchema, operation_id='conversation_engine_get_chat_history_page')
+async def conversation_engine_get_chat_history_page(body: BodyConversationEngineGetChatHistoryPage = Body(...)) -> GetChatHistoryPageOutputSchema:
+    """
+    Get one page of the chat history for a session, oldest first. Pass next_cursor back as `after` for the next page.
+    """
+    response = await conversation_engine.get_chat_history_page(session_id=body.session_id, after=body.after, limit=body.limit)
     return response
 
 @app.post('/api/proposal_generator/generate_proposal', response_model=GenerateProposalOutputSchema, operation_id='proposal_generator_generate_proposal')
@@ -410,5 +465,32 @@ async def calendar_service_mark_calendar_booking_completed(body: BodyCalendarSer
     """
     Mark that a user has completed calendar booking.
     """
-    response = await run_sync_in_thread(calendar_service.mark_calendar_booking_completed, session_id=body.session_id)
+    response = await calendar_service.mark_calendar_booking_completed(session_id=body.session_id)
     return response
+
+##############################################################################
+# Streaming Routes
+##############################################################################
+
+async def server_sent_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Formats {"event", "data"} dicts as server-sent events; a failure mid-stream becomes an error event"""
+    try:
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    except Exception as e:
+        logger.exception(f"Event stream failed: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'error': 'Internal server error'})}\n\n"
+
+@app.post('/api/conversation_engine/send_chat_message_stream', response_class=StreamingResponse, operation_id='conversation_engine_send_chat_message_stream')
+async def conversation_engine_send_chat_message_stream(body: BodyConversationEngineSendChatMessage = Body(...)) -> StreamingResponse:
+    """
+    Process a user message and stream the agent's response as server-sent events: `token` events carry text as
+    it is generated, a final `done` event carries the same payload as send_chat_message.
+    """
+    events = conversation_engine.stream_chat_message(session_id=body.session_id, user_message=body.user_message, idempotency_key=body.idempotency_key)
+    return StreamingResponse(
+        server_sent_events(events),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream, which would defeat the point
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
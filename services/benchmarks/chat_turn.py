@@ -0,0 +1,96 @@
+"""
+Compare chat turn latency of the combined and sequential ConversationEngine modes.
+
+Each round plans one turn (ConversationEngine.plan_turn) of a conversation that is past
+the readiness threshold, which is where sequential mode makes two completions and
+combined mode one. Runs against OpenRouter with OPENROUTER_API_KEY; --simulate-ms
+replaces the model with one that answers after a fixed delay, to check the call
+pattern offline:
+
+    cd services && python -m benchmarks.chat_turn --rounds 10
+    cd services && python -m benchmarks.chat_turn --simulate-ms 1500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+
+from core.conversation_engine import ConversationEngine, TURN_MODES
+from core.llm_client import close_llm_client
+
+CONVERSATION = [
+    {"role": "assistant", "content": "What's your business name and what industry are you in?"},
+    {"role": "user", "content": "Harbor Dental, a two-location dental practice."},
+    {"role": "assistant", "content": "What takes up most of your front desk's day?"},
+    {"role": "user", "content": "Phones. Appointment reminders and rescheduling calls eat most of the morning."},
+    {"role": "assistant", "content": "How do patients usually reschedule today?"},
+    {"role": "user", "content": "They call, and we juggle the calendar by hand. Double bookings happen weekly."},
+    {"role": "assistant", "content": "What happens with insurance questions?"},
+    {"role": "user", "content": "Two staff spend hours verifying coverage on payer portals before visits."},
+]
+
+
+class SimulatedCompletions:
+    """Answers like the model would, after a fixed delay"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if "response_format" in kwargs:
+            content = json.dumps({"ready": False, "next_question": "How many verifications do you run a day?"})
+        elif "enough information" in kwargs["messages"][-1]["content"]:
+            content = "need_more"
+        else:
+            content = "How many verifications do you run a day?"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+async def time_mode(mode: str, rounds: int, simulate_ms: float):
+    completions = SimulatedCompletions(simulate_ms / 1000) if simulate_ms else None
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions)) if completions else None
+    engine = ConversationEngine(client=client, mode=mode)
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await engine.plan_turn(uuid.uuid4(), CONVERSATION)
+        samples.append(time.perf_counter() - start)
+    # Each mode runs in its own event loop, and the shared client's connections belong to this one
+    await close_llm_client()
+    calls = completions.calls / rounds if completions else None
+    return samples, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--simulate-ms", type=float, default=0, help="simulated completion latency, 0 for OpenRouter")
+    args = parser.parse_args()
+
+    if not args.simulate_ms and not os.getenv("OPENROUTER_API_KEY"):
+        parser.error("OPENROUTER_API_KEY is not set; pass --simulate-ms to run without the model")
+    os.environ.setdefault("OPENROUTER_API_KEY", "simulated")
+    # Every round plans the same conversation, which the completion cache would answer after the first
+    os.environ.setdefault("COMPLETION_CACHE", "off")
+
+    print(f"{'mode':>12} {'mean (s)':>9} {'p50 (s)':>8} {'max (s)':>8} {'calls/turn':>11}")
+    for mode in TURN_MODES:
+        samples, calls = asyncio.run(time_mode(mode, args.rounds, args.simulate_ms))
+        calls_column = f"{calls:.1f}" if calls is not None else "-"
+        print(
+            f"{mode:>12} {statistics.mean(samples):>9.2f} {statistics.median(samples):>8.2f} "
+            f"{max(samples):>8.2f} {calls_column:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
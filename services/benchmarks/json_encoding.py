@@ -0,0 +1,95 @@
+"""
+Compare encodings of Table JSON columns: stdlib vs orjson, text vs binary parameters.
+
+Each round dumps the parameters of realistic ProposalRecommendation rows (a jsonb[] of
+recommended agents plus text columns) through psycopg's adaptation layer, exactly as
+Table.sync does before sending them, so no database is needed. "json.dumps, text" is
+the old path, "orjson, binary" what Table uses now:
+
+    cd services && python -m benchmarks.json_encoding
+    cd services && python -m benchmarks.json_encoding --rows 2000 --agents 12
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+import psycopg
+from psycopg.adapt import AdaptersMap, PyFormat, Transformer
+from psycopg.types.json import set_json_dumps
+
+from core.proposal_recommendation import ProposalRecommendation
+from solar import jsonb
+
+
+def make_proposal(agent_count: int) -> ProposalRecommendation:
+    agents = [
+        {
+            "name": f"Agent {i}",
+            "purpose": "Answers routine customer emails and escalates edge cases to staff. " * 3,
+            "tools": ["gmail", "calendar", "crm", "slack"],
+            "workflows": [
+                {"trigger": "new_email", "steps": ["classify", "draft_reply", "review"], "sla_minutes": 30},
+                {"trigger": "daily_digest", "steps": ["summarize", "send"], "sla_minutes": 1440},
+            ],
+            "estimated_hours_saved": 12.5,
+            "integrations": {"crm": {"provider": "hubspot", "objects": ["contacts", "deals"]}},
+        }
+        for i in range(agent_count)
+    ]
+    return ProposalRecommendation(
+        session_id=uuid.uuid4(),
+        business_profile_id=uuid.uuid4(),
+        pricing_tier="pro",
+        recommended_agents=agents,
+        implementation_timeline="4-6 weeks",
+        estimated_cost="$2,000/month",
+        key_benefits=["Faster response times", "Fewer missed bookings"],
+        technical_requirements=["Google Workspace", "HubSpot API access"],
+        integration_points=["Gmail", "Google Calendar", "HubSpot"],
+        proposal_summary="Automate customer communication and scheduling. " * 5,
+        full_proposal_content="# Proposal\n" + "Detailed implementation plan paragraph. " * 200,
+    )
+
+
+def time_dumps(rows, dumps, binary: bool) -> float:
+    context = AdaptersMap(psycopg.adapters)
+    set_json_dumps(dumps, context)
+    plan = ProposalRecommendation._get_plan()
+    formats = [
+        PyFormat.BINARY if binary and col in plan.json_columns else PyFormat.AUTO for col in plan.columns
+    ]
+    start = time.perf_counter()
+    for row in rows:
+        # A fresh Transformer per statement, as psycopg creates one per execute
+        Transformer(context).dump_sequence(row._get_row(plan), formats)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--agents", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = [make_proposal(args.agents) for _ in range(args.rows)]
+    encoders = {"json.dumps": json.dumps}
+    if jsonb.ORJSON_AVAILABLE:
+        encoders["orjson"] = jsonb.orjson_dumps
+    else:
+        print("orjson is not installed, only timing the stdlib (pip install -e .[json])")
+
+    baseline = None
+    print(f"{'encoder':>20} {'best (ms)':>10} {'per row (us)':>13} {'speedup':>8}")
+    for name, dumps in encoders.items():
+        for binary in (False, True):
+            best = min(time_dumps(rows, dumps, binary) for _ in range(args.repeat))
+            baseline = baseline or best
+            label = f"{name}, {'binary' if binary else 'text'}"
+            print(f"{label:>20} {best * 1000:>10.1f} {best / args.rows * 1e6:>13.1f} {baseline / best:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Time the Python-side cost of the conversation endpoints, without Postgres or the LLM.
+
+Tables run on the in-process MemoryBackend (solar/memory.py) and the ConversationEngine's
+model calls return canned answers, so what is left is the request cost this service adds
+itself: pydantic validation and dumps, statement building, JSON encoding, caches and the
+write-behind buffer. --profile prints the functions that cost the most:
+
+    cd services && python -m benchmarks.service_layer
+    cd services && python -m benchmarks.service_layer --sessions 200 --turns 8 --profile
+"""
+
+import argparse
+import asyncio
+import cProfile
+import os
+import pstats
+import statistics
+import time
+from collections import defaultdict
+
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")  # the OpenAI client refuses to start without one
+
+from core import conversation_engine
+from core.chat_message import ChatMessage
+from solar import MemoryBackend, set_backend
+
+
+async def canned_next_question(self, session_id, conversation_history):
+    return f"Follow-up question {len(conversation_history)}: how many hours a week does that take your team?"
+
+
+async def canned_should_generate_proposal(self, conversation_history):
+    return False
+
+
+async def canned_decide_turn(self, conversation_history):
+    return {"ready": False, "next_question": await canned_next_question(self, None, conversation_history)}
+
+
+async def canned_summarize(self, messages):
+    return f"{self.summary or ''} The owner answered {len(messages)} more questions about their email workload.".strip()
+
+
+async def run_session(turns: int, timings):
+    async def timed(name, call):
+        start = time.perf_counter()
+        result = call()
+        if asyncio.iscoroutine(result):
+            result = await result
+        timings[name].append(time.perf_counter() - start)
+        return result
+
+    session = await timed("start_chat_session", conversation_engine.start_chat_session)
+    session_id = session["session_id"]
+    for turn in range(turns):
+        message = f"Turn {turn}: we answer about forty customer emails a day by hand. " * 3
+        await timed("send_chat_message", lambda: conversation_engine.send_chat_message(session_id, message))
+    await timed("get_chat_history", lambda: conversation_engine.get_chat_history(session_id))
+    await timed("get_chat_history_page", lambda: conversation_engine.get_chat_history_page(session_id, limit=10))
+
+
+async def run(sessions: int, turns: int):
+    timings = defaultdict(list)
+    for _ in range(sessions):
+        await run_session(turns, timings)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--profile", action="store_true", help="print the top functions by cumulative time")
+    args = parser.parse_args()
+
+    set_backend(MemoryBackend())
+    conversation_engine.ConversationEngine.determine_next_question = canned_next_question
+    conversation_engine.ConversationEngine.should_generate_proposal = canned_should_generate_proposal
+    conversation_engine.ConversationEngine.decide_turn = canned_decide_turn
+    conversation_engine.ConversationEngine.summarize = canned_summarize
+
+    asyncio.run(run(5, args.turns))  # warm up plans, caches and lazily imported modules
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    timings = asyncio.run(run(args.sessions, args.turns))
+    if profiler:
+        profiler.disable()
+    ChatMessage.__write_behind__.flush()
+
+    print(f"{'endpoint':>22} {'calls':>6} {'mean (us)':>10} {'p50 (us)':>9} {'p95 (us)':>9}")
+    for name, samples in timings.items():
+        samples_us = sorted(sample * 1e6 for sample in samples)
+        p95 = samples_us[int(len(samples_us) * 0.95) - 1]
+        print(
+            f"{name:>22} {len(samples_us):>6} {statistics.mean(samples_us):>10.1f} "
+            f"{statistics.median(samples_us):>9.1f} {p95:>9.1f}"
+        )
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare the VALUES and COPY paths of Table.sync_many.
+
+Rows are written to a scratch copy of chat_messages (bench_chat_messages) that is created
+from the real table's definition and dropped afterwards, so the benchmark is safe to run
+against a development database:
+
+    cd services && python -m benchmarks.sync_many
+    cd services && python -m benchmarks.sync_many --sizes 1000 10000 --batch-size 5000
+"""
+
+import argparse
+import time
+import uuid
+
+from core.chat_message import ChatMessage
+
+
+class BenchChatMessage(ChatMessage):
+    __tablename__ = "bench_chat_messages"
+
+
+def make_messages(count: int):
+    session_id = uuid.uuid4()
+    return [
+        BenchChatMessage(
+            session_id=session_id,
+            role="user" if i % 2 else "assistant",
+            content=f"Benchmark message {i} " + "lorem ipsum " * 20,
+            message_order=i,
+        )
+        for i in range(count)
+    ]
+
+
+def time_sync_many(messages, batch_size: int, copy: bool) -> float:
+    BenchChatMessage.sql("TRUNCATE bench_chat_messages")
+    start = time.perf_counter()
+    BenchChatMessage.sync_many(messages, batch_size=batch_size, copy=copy)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    BenchChatMessage.sql(
+        "CREATE TABLE IF NOT EXISTS bench_chat_messages (LIKE chat_messages INCLUDING ALL)"
+    )
+    try:
+        print(f"{'rows':>8} {'values (s)':>12} {'copy (s)':>10} {'speedup':>8}")
+        for size in args.sizes:
+            messages = make_messages(size)
+            values_time = time_sync_many(messages, args.batch_size, copy=False)
+            copy_time = time_sync_many(messages, args.batch_size, copy=True)
+            print(f"{size:>8} {values_time:>12.3f} {copy_time:>10.3f} {values_time / copy_time:>7.1f}x")
+    finally:
+        BenchChatMessage.sql("DROP TABLE IF EXISTS bench_chat_messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ class BusinessProfile(Table):
     __tablename__ = "business_profiles"
     
     id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
-    session_id: uuid.UUID  # References chat_sessions.id
+    session_id: uuid.UUID = ColumnDetails(index=True)  # References chat_sessions.id
     business_name: str
     industry: str
     business_size: Optional[str] = None  # "small", "medium", "large"
@@ -38,7 +38,7 @@ def get_calendar_booking_link(business_name: Optional[str] = None, proposal_id:
     }
 
 @public
-def mark_calendar_booking_completed(session_id: str) -> Dict:
+async def mark_calendar_booking_completed(session_id: str) -> Dict:
     """Mark that a user has completed calendar booking."""
     try:
         from core.chat_session import ChatSession
@@ -46,10 +46,11 @@ def mark_calendar_booking_completed(session_id: str) -> Dict:
         
         session_uuid = uuid.UUID(session_id)
         
-        ChatSession.sql(
+        await ChatSession.asql(
             "UPDATE chat_sessions SET calendar_booking_completed = true WHERE id = %(session_id)s",
             {"session_id": session_uuid}
         )
+        ChatSession.update_cached(session_uuid, calendar_booking_completed=True)
         
         return {"success": True, "message": "Calendar booking marked as completed"}
         
@@ -1,14 +1,41 @@
-from solar import Table, ColumnDetails
+from solar import Table, ColumnDetails, Index, WriteBehindBuffer
+from core.chat_session import ChatSession
 from typing import Optional
 from datetime import datetime
 import uuid
 
+def _renumber(message: "ChatMessage") -> bool:
+    """
+    Move a buffered message whose message_order turned out to be taken to the end of its session, reserving the new
+    number like turns do. Whether there was a session to number it in.
+    """
+    rows = ChatSession.sql(
+        "UPDATE chat_sessions SET last_message_order = GREATEST(last_message_order, "
+        "(SELECT COALESCE(MAX(message_order), 0) FROM chat_messages WHERE session_id = %(session_id)s)) + 1 "
+        "WHERE id = %(session_id)s RETURNING last_message_order",
+        {"session_id": message.session_id}
+    )
+    if not rows:
+        return False
+    ChatSession.update_cached(message.session_id, last_message_order=rows[0]["last_message_order"])
+    message.message_order = rows[0]["last_message_order"]
+    return True
+
 class ChatMessage(Table):
     __tablename__ = "chat_messages"
-    
+    __indexes__ = (
+        # History reads filter by session and sort by message_order, which is unique within a session
+        Index(("session_id", "message_order"), unique=True),
+        # One turn per send_chat_message idempotency key, whichever worker gets the request
+        Index(("session_id", "idempotency_key"), unique=True, where="idempotency_key IS NOT NULL"),
+    )
+    # Messages are append-only: batch their inserts, reads merge in buffered rows of the session
+    __write_behind__ = WriteBehindBuffer(partition_key="session_id", on_reject=_renumber)
+
     id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
     session_id: uuid.UUID  # References chat_sessions.id
     role: str  # "user" or "assistant"
     content: str
     message_order: int  # For maintaining conversation order
+    idempotency_key: Optional[str] = None  # Client key of the send_chat_message request, on the user's message
     created_at: datetime = ColumnDetails(default_factory=datetime.now)
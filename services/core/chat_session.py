@@ -1,10 +1,11 @@
-from solar import Table, ColumnDetails
+from solar import Table, ColumnDetails, EntityCache
 from typing import Optional, Dict
 from datetime import datetime
 import uuid
 
 class ChatSession(Table):
     __tablename__ = "chat_sessions"
+    __cache__ = EntityCache(maxsize=1024, ttl=30)
     
     id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
     business_name: Optional[str] = None
@@ -13,6 +14,9 @@ class ChatSession(Table):
     contact_phone: Optional[str] = None
     session_status: str = "active"  # active, completed, abandoned
     pain_points: Optional[Dict] = None  # JSON storage for identified pain points
+    conversation_summary: Optional[str] = None  # Rolling summary of the conversation's earlier messages
+    summarized_messages: int = 0  # How many of the first messages conversation_summary covers
+    last_message_order: int = 0  # Highest message_order handed out, reserved per turn with an atomic UPDATE
     proposal_generated: bool = False
     google_drive_uploaded: bool = False
     calendar_booking_completed: bool = False
@@ -0,0 +1,257 @@
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+from openai import AsyncOpenAI
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# "memory" keeps completions in this worker, "sqlite" in a file that workers and restarts share, "off" disables caching
+COMPLETION_CACHE_BACKENDS = ("memory", "sqlite", "off")
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Fold the differences that don't change what is being asked: case, unicode forms, whitespace, end punctuation."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip(" .!?")
+
+def completion_key(request: Dict, normalized: bool = False) -> str:
+    """
+    The cache key of a chat completion request. It covers the model, every message including the system prompt, and
+    the other parameters such as response_format; the normalized key folds the message text with normalize_text.
+    """
+    if normalized:
+        request = {
+            **request,
+            "messages": [{**msg, "content": normalize_text(msg["content"])} for msg in request["messages"]],
+        }
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+    return ("normalized:" if normalized else "exact:") + digest
+
+def cacheable(request: Dict) -> bool:
+    """
+    Whether a request asks for one answer per context. Sampling for variety (a temperature above 0, several choices)
+    is not cached; requests leaving temperature at the model's default are, their callers want the same answer again.
+    """
+    return not request.get("temperature") and request.get("n", 1) == 1
+
+class MemoryCompletionBackend:
+    """LRU of completions in this worker's memory."""
+
+    blocking = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, content, tokens = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return content, tokens
+
+    def put(self, key: str, content: str, tokens: int):
+        with self._lock:
+            self._entries[key] = (time.time(), content, tokens)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+class SQLiteCompletionBackend:
+    """
+    Completions in an SQLite file, shared by the workers of a host and kept across restarts. Calls block on the file,
+    so async code makes them in a thread (CompletionCache.aget/aput).
+    """
+
+    blocking = True
+    # Puts between eviction passes, so the table overshoots maxsize by at most this many rows
+    EVICT_EVERY = 64
+
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions "
+            "(key TEXT PRIMARY KEY, content TEXT NOT NULL, tokens INTEGER NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_used_at ON completions (used_at)")
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, tokens, stored_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE completions SET used_at = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+
+    def put(self, key: str, content: str, tokens: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, content, tokens, stored_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, content, tokens, now, now),
+            )
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then those used less recently than the maxsize-th; called with _lock held"""
+        evicted = self._conn.execute("DELETE FROM completions WHERE stored_at < ?", (now - self.ttl,)).rowcount
+        # Seeks the used_at index to the cut-off rather than counting the table
+        evicted += self._conn.execute(
+            "DELETE FROM completions WHERE used_at < "
+            "(SELECT used_at FROM completions ORDER BY used_at DESC LIMIT 1 OFFSET ?)",
+            (self.maxsize - 1,),
+        ).rowcount
+        self.evictions += evicted
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+class CompletionCache:
+    """
+    Chat completion contents by request. A lookup tries the exact key, then the normalized one, so the same context
+    re-sent on a retry and a near-identical opening from another session both skip the model.
+    """
+
+    def __init__(self, backend, normalize: bool = True):
+        self.backend = backend
+        self.normalize = normalize
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def get(self, request: Dict) -> Optional[str]:
+        if not cacheable(request):
+            return None
+        entry = self.backend.get(completion_key(request))
+        exact_hit = entry is not None
+        if entry is None and self.normalize:
+            entry = self.backend.get(completion_key(request, normalized=True))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if exact_hit:
+                self.hits += 1
+            else:
+                self.normalized_hits += 1
+            self.tokens_saved += entry[1]
+        return entry[0]
+
+    def put(self, request: Dict, content: str, tokens: int = 0):
+        if not cacheable(request):
+            return
+        self.backend.put(completion_key(request), content, tokens)
+        if self.normalize:
+            self.backend.put(completion_key(request, normalized=True), content, tokens)
+
+    async def aget(self, request: Dict) -> Optional[str]:
+        """get() for async code, in a thread when the backend blocks"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.get, request)
+        return self.get(request)
+
+    async def aput(self, request: Dict, content: str, tokens: int = 0):
+        """put() for async code, in a thread when the backend blocks"""
+        if self.backend.blocking:
+            await asyncio.to_thread(self.put, request, content, tokens)
+        else:
+            self.put(request, content, tokens)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.normalized_hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "size": self.backend.size(),
+                "hits": self.hits,
+                "normalized_hits": self.normalized_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.normalized_hits) / lookups if lookups else None,
+                "evictions": self.backend.evictions,
+                "tokens_saved": self.tokens_saved,
+            }
+
+_cache: Optional[CompletionCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """The process-wide completion cache as configured by COMPLETION_CACHE, None when it is off."""
+    global _cache, _cache_configured
+    if _cache_configured:
+        return _cache
+    with _cache_lock:
+        if not _cache_configured:
+            backend_name = os.getenv("COMPLETION_CACHE", "memory").lower()
+            if backend_name not in COMPLETION_CACHE_BACKENDS:
+                raise ValueError(f"COMPLETION_CACHE must be one of {', '.join(COMPLETION_CACHE_BACKENDS)}, not {backend_name}")
+            maxsize = int(os.getenv("COMPLETION_CACHE_SIZE", "2048"))
+            ttl = float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "86400"))
+            if backend_name == "memory":
+                _cache = CompletionCache(MemoryCompletionBackend(maxsize, ttl))
+            elif backend_name == "sqlite":
+                path = os.getenv("COMPLETION_CACHE_PATH", "../cache/completions.sqlite3")
+                _cache = CompletionCache(SQLiteCompletionBackend(path, maxsize, ttl))
+            _cache_configured = True
+    return _cache
+
+def set_completion_cache(cache: Optional[CompletionCache]):
+    """Replace the process-wide completion cache, None turns caching off."""
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache, _cache_configured = cache, True
+
+async def complete(client: AsyncOpenAI, **request) -> str:
+    """chat.completions.create through the completion cache, returning the first choice's message content."""
+    cache = get_completion_cache()
+    if cache is not None:
+        content = await cache.aget(request)
+        if content is not None:
+            return content
+
+    response = await client.chat.completions.create(**request)
+    content = response.choices[0].message.content
+    if cache is not None and content:
+        usage = getattr(response, "usage", None)
+        await cache.aput(request, content, (usage.total_tokens or 0) if usage else 0)
+    return content
@@ -1,27 +1,160 @@
-from typing import List, Dict, Optional, Tuple
-from openai import OpenAI
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
+from collections import OrderedDict
+from openai import AsyncOpenAI
+from psycopg import errors
+import asyncio
 import os
 import json
+import logging
+import threading
+import time
 from core.chat_session import ChatSession
 from core.chat_message import ChatMessage
 from core.business_profile import BusinessProfile
+from core.completion_cache import complete, get_completion_cache
+from core.llm_client import get_llm_client
+from core.readiness import ReadinessScore, readiness_agreement, readiness_mode, score_readiness
 from solar.access import public
 import uuid
 
+logger = logging.getLogger(__name__)
+
+PROPOSAL_READY_MESSAGE = "Thank you for sharing all that information! I have a clear picture of your business challenges. Let me analyze everything and create a custom agent system recommendation for you. This will just take a moment..."
+
+# "combined" gets the readiness decision and the next question from one completion, "sequential" makes a call for each
+TURN_MODES = ("combined", "sequential")
+
+# Prompts see the rolling summary of a session's earlier messages and, verbatim, the messages after it. Once that
+# tail reaches SUMMARY_RECENT_MESSAGES + SUMMARY_BATCH messages, all but the last SUMMARY_RECENT_MESSAGES are folded
+# into the summary, so prompts stay the same size however long the conversation runs
+SUMMARY_RECENT_MESSAGES = 10
+SUMMARY_BATCH = 6
+# Bounds the prompt when summaries fall behind, e.g. while the model is down
+MAX_CONTEXT_MESSAGES = 2 * (SUMMARY_RECENT_MESSAGES + SUMMARY_BATCH)
+
+def build_conversation_context(
+    conversation_history: List[Dict], summary: Optional[str] = None, summarized_messages: int = 0
+) -> str:
+    """Build a prompt context from a session's rolling summary and, at most MAX_CONTEXT_MESSAGES, messages after it."""
+    context_parts = []
+    if summary:
+        context_parts.append(f"Summary of the earlier conversation: {summary}")
+    else:
+        summarized_messages = 0
+    for msg in conversation_history[summarized_messages:][-MAX_CONTEXT_MESSAGES:]:
+        role = "Business Owner" if msg["role"] == "user" else "Agent"
+        context_parts.append(f"{role}: {msg['content']}")
+    return "\n".join(context_parts)
+
 class ConversationEngine:
-    def __init__(self):
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-        )
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        mode: Optional[str] = None,
+        summary: Optional[str] = None,
+        summarized_messages: int = 0,
+    ):
+        # Engines are created per request, the client and its warm connections are shared by the process
+        self.client = client or get_llm_client()
+        # The session's rolling summary, covering the first summarized_messages messages of its history
+        self.summary = summary
+        self.summarized_messages = summarized_messages if summary else 0
+        self.mode = (mode or os.getenv("CHAT_TURN_MODE", "combined")).lower()
+        if self.mode not in TURN_MODES:
+            raise ValueError(f"CHAT_TURN_MODE must be one of {', '.join(TURN_MODES)}, not {self.mode}")
+        self.readiness_heuristic = readiness_mode()
     
     def get_initial_question(self) -> str:
         """Get the first question to start the conversation."""
         return "Hi! I'm here to help you discover how AI agents could transform your business operations. Let's start with the basics - what's your business name and what industry are you in?"
     
-    def determine_next_question(self, session_id: uuid.UUID, conversation_history: List[Dict]) -> str:
+    async def plan_turn(self, session_id: uuid.UUID, conversation_history: List[Dict]) -> Tuple[bool, Optional[str]]:
+        """Decide whether to generate the proposal and, if not, what to ask next: (ready, next_question)."""
+        # Before the readiness threshold only the question is needed, which is a single call either way
+        if self.mode == "sequential" or not self._has_enough_answers(conversation_history):
+            if await self.should_generate_proposal(conversation_history):
+                return True, None
+            return False, await self.determine_next_question(session_id, conversation_history)
+        
+        score = self._score_readiness(conversation_history)
+        if self._skip_readiness_check(score):
+            return False, await self.determine_next_question(session_id, conversation_history)
+        
+        decision = await self.decide_turn(conversation_history)
+        if score is not None:
+            readiness_agreement.record(score, decision["ready"])
+        if decision["ready"]:
+            return True, None
+        next_question = decision["next_question"].strip()
+        if not next_question:
+            # Not ready but no question either; ask for one rather than sending an empty message
+            next_question = await self.determine_next_question(session_id, conversation_history)
+        return False, next_question
+    
+    async def plan_streamed_turn(
+        self,
+        session_id: uuid.UUID,
+        conversation_history: List[Dict],
+        tokens: "asyncio.Queue[str]"
+    ) -> Tuple[bool, Optional[str]]:
+        """plan_turn that puts the next question's text on tokens as the model generates it."""
+        # Start the question while the readiness check runs, so the first token waits for the slower of the two calls
+        # rather than both; a token that arrives early waits until readiness is known
+        readiness = asyncio.ensure_future(self.should_generate_proposal(conversation_history))
+        question = self.stream_next_question(session_id, conversation_history)
+        first_token = asyncio.ensure_future(anext(question, None))
+        try:
+            if await readiness:
+                return True, None
+            parts = []
+            text = await first_token
+            while text is not None:
+                parts.append(text)
+                tokens.put_nowait(text)
+                text = await anext(question, None)
+            return False, "".join(parts).strip()
+        finally:
+            # Stops a question that is no longer needed (proposal ready, errors, cancelled turns); a no-op once it finished
+            for task in (readiness, first_token):
+                task.cancel()
+            await asyncio.gather(readiness, first_token, return_exceptions=True)
+            await question.aclose()
+    
+    async def determine_next_question(self, session_id: uuid.UUID, conversation_history: List[Dict]) -> str:
         """Determine the next question based on conversation history."""
+        content = await complete(
+            self.client,
+            model="openai/o4-mini",
+            messages=self._next_question_messages(conversation_history)
+        )
+        
+        return content.strip()
+    
+    async def stream_next_question(self, session_id: uuid.UUID, conversation_history: List[Dict]) -> AsyncIterator[str]:
+        """Like determine_next_question, but yields the question's text as the model generates it."""
+        # Same key as determine_next_question, so a question either of them got is a hit for both
+        request = {"model": "openai/o4-mini", "messages": self._next_question_messages(conversation_history)}
+        cache = get_completion_cache()
+        cached = await cache.aget(request) if cache is not None else None
+        if cached is not None:
+            yield cached
+            return
         
+        stream = await self.client.chat.completions.create(**request, stream=True)
+        parts = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Stops the generation when the client went away mid-stream
+            await stream.close()
+        # Only reached when the stream ran to the end, a question cut short isn't cached
+        if cache is not None and parts:
+            await cache.aput(request, "".join(parts))
+    
+    def _next_question_messages(self, conversation_history: List[Dict]) -> List[Dict]:
         # Get conversation context
         context = self._build_conversation_context(conversation_history)
         
@@ -44,30 +177,40 @@ Examples of good follow-up questions:
 
 Keep questions natural and empathetic. Show that you understand their pain points."""
 
-        response = self.client.chat.completions.create(
-            model="openai/o4-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Conversation so far:\n{context}\n\nWhat should I ask next to better understand their business challenges?"}
-            ]
-        )
-        
-        return response.choices[0].message.content.strip()
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Conversation so far:\n{context}\n\nWhat should I ask next to better understand their business challenges?"}
+        ]
     
     def _build_conversation_context(self, conversation_history: List[Dict]) -> str:
-        """Build context string from conversation history."""
-        context_parts = []
-        for msg in conversation_history[-10:]:  # Last 10 messages for context
-            role = "Business Owner" if msg["role"] == "user" else "Agent"
-            context_parts.append(f"{role}: {msg['content']}")
-        return "\n".join(context_parts)
-    
-    def should_generate_proposal(self, conversation_history: List[Dict]) -> bool:
-        """Determine if enough information has been gathered to generate a proposal."""
+        """Build context string from the rolling summary and the conversation history after it."""
+        return build_conversation_context(conversation_history, self.summary, self.summarized_messages)
+    
+    def _has_enough_answers(self, conversation_history: List[Dict]) -> bool:
+        """Need at least 4 substantial user responses before a proposal is considered."""
         user_messages = [msg for msg in conversation_history if msg["role"] == "user"]
+        return len(user_messages) >= 4
+    
+    def _score_readiness(self, conversation_history: List[Dict]) -> Optional[ReadinessScore]:
+        """The local readiness score (core/readiness.py) when READINESS_HEURISTIC is on or shadow, None when off."""
+        if self.readiness_heuristic == "off":
+            return None
+        return score_readiness(conversation_history)
+    
+    def _skip_readiness_check(self, score: Optional[ReadinessScore]) -> bool:
+        """Whether the score rules out a proposal this turn, so the model isn't asked."""
+        if self.readiness_heuristic == "on" and not score.maybe_ready:
+            readiness_agreement.record_skip()
+            return True
+        return False
+    
+    async def should_generate_proposal(self, conversation_history: List[Dict]) -> bool:
+        """Determine if enough information has been gathered to generate a proposal."""
+        if not self._has_enough_answers(conversation_history):
+            return False
         
-        # Need at least 4 substantial user responses
-        if len(user_messages) < 4:
+        score = self._score_readiness(conversation_history)
+        if self._skip_readiness_check(score):
             return False
         
         # Check if we have enough depth of information
@@ -84,7 +227,8 @@ Return "ready" if we have sufficient detail in at least 3 of these areas. Return
 
         context = self._build_conversation_context(conversation_history)
         
-        response = self.client.chat.completions.create(
+        content = await complete(
+            self.client,
             model="openai/o4-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -92,13 +236,227 @@ Return "ready" if we have sufficient detail in at least 3 of these areas. Return
             ]
         )
         
-        return "ready" in response.choices[0].message.content.lower()
+        ready = "ready" in content.lower()
+        if score is not None:
+            readiness_agreement.record(score, ready)
+        return ready
+    
+    async def decide_turn(self, conversation_history: List[Dict]) -> Dict:
+        """Readiness decision and next question from a single structured-output completion."""
+        system_prompt = """You are a business scoping agent that helps identify operational pain points and automation opportunities. Each turn you make two decisions.
+
+1. Is there enough information to create a meaningful agent system proposal? We need to understand:
+- Business type and industry
+- Main operational challenges or pain points
+- Time-wasting manual processes
+- Customer interaction challenges
+- Specific bottlenecks or inefficiencies
+
+Set "ready" to true if we have sufficient detail in at least 3 of these areas, false if we need additional information.
+
+2. If not ready, what should we ask next? Put it in "next_question" (leave it empty when ready). Ask ONE focused question that digs into operational challenges, time-wasting manual tasks, customer service bottlenecks, communication inefficiencies, data management issues, or scheduling and workflow problems. Make it conversational and specific to what the user has already shared - don't ask generic questions, build on their previous responses.
+
+Examples of good follow-up questions:
+- "You mentioned handling customer emails takes a lot of time. About how many emails do you process daily, and what types of questions come up most often?"
+- "That scheduling conflict issue sounds frustrating. What usually causes these conflicts - double bookings, last-minute changes, or communication gaps?"
+
+Keep questions natural and empathetic. Show that you understand their pain points."""
+        
+        schema = {
+            "name": "turn_decision",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "ready": {"type": "boolean", "description": "Whether there is enough information for a proposal"},
+                    "next_question": {"type": "string", "description": "Next question to ask, empty when ready"}
+                },
+                "required": ["ready", "next_question"],
+                "additionalProperties": False
+            }
+        }
+        
+        context = self._build_conversation_context(conversation_history)
+        
+        content = await complete(
+            self.client,
+            model="openai/o4-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Conversation so far:\n{context}\n\nDo we have enough information to generate a proposal, and if not, what should I ask next?"}
+            ],
+            response_format={"type": "json_schema", "json_schema": schema}
+        )
+        
+        return json.loads(content)
+    
+    async def summarize(self, messages: List[Dict]) -> str:
+        """Fold messages that are leaving the recent window into the rolling summary."""
+        system_prompt = """You keep a running summary of a conversation between an agent and a business owner, who is describing their business so we can propose AI agents for it.
+
+Update the summary with the new messages. Keep every concrete detail the business owner gave: business name, industry, size, locations, tools, volumes, time spent, pain points, manual tasks, customer service issues and bottlenecks, in their own terms and numbers. Note what the agent already asked, so it isn't asked again. Drop greetings and filler.
+
+Answer with the updated summary only, in at most 300 words."""
+
+        transcript = "\n".join(
+            f"{'Business Owner' if msg['role'] == 'user' else 'Agent'}: {msg['content']}" for msg in messages
+        )
+        content = await complete(
+            self.client,
+            model="openai/gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Summary so far:\n{self.summary or '(none yet)'}\n\nNew messages:\n{transcript}"}
+            ]
+        )
+        
+        return content.strip()
+
+class SessionState:
+    """
+    A session's conversation as the engine sees it, the message_order its next message gets, and the rolling summary
+    of its first summarized_messages messages
+    """
+
+    def __init__(self, messages: List[Dict], next_order: int, summary: Optional[str] = None, summarized_messages: int = 0):
+        self.messages = messages
+        self.next_order = next_order
+        self.summary = summary
+        self.summarized_messages = summarized_messages
+
+    def copy(self, messages: Optional[List[Dict]] = None, **changes) -> "SessionState":
+        state = SessionState(list(self.messages if messages is None else messages), self.next_order, self.summary, self.summarized_messages)
+        state.__dict__.update(changes)
+        return state
+
+class SessionHistoryCache:
+    """
+    Bounded LRU of SessionState by session id, so a turn doesn't re-read the history this process wrote on the last
+    one. An entry is only used while its next_order is still the session's next message_order, which catches turns
+    saved by other workers, and is dropped after idle_seconds without a turn.
+    """
+
+    def __init__(self, maxsize: int = 1024, idle_seconds: float = 900.0):
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        self._entries: "OrderedDict[uuid.UUID, Tuple[float, SessionState]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _live(self, session_id: uuid.UUID, next_order: int) -> Optional[SessionState]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        last_used, state = entry
+        if state.next_order != next_order or time.monotonic() - last_used > self.idle_seconds:
+            del self._entries[session_id]
+            return None
+        return state
+
+    def _store(self, session_id: uuid.UUID, state: SessionState):
+        if self.maxsize <= 0:
+            return
+        self._entries[session_id] = (time.monotonic(), state)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, session_id: uuid.UUID, next_order: int) -> Optional[SessionState]:
+        """The cached state if it is current for a session whose next message_order is next_order."""
+        with self._lock:
+            state = self._live(session_id, next_order)
+            if state is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(session_id, state)
+            return state.copy()
+
+    def put(self, session_id: uuid.UUID, state: SessionState):
+        with self._lock:
+            self._store(session_id, state.copy())
+
+    def advance(self, session_id: uuid.UUID, next_order: int, messages: List[Dict]) -> bool:
+        """
+        Append a turn numbered from next_order, if that is still the session's cached next order. False means the
+        entry is gone or another turn got there first, and the caller has to number the turn from the table.
+        """
+        with self._lock:
+            state = self._live(session_id, next_order)
+            if state is None:
+                return False
+            self._store(session_id, state.copy(state.messages + messages, next_order=next_order + len(messages)))
+            return True
+
+    def summarized(self, session_id: uuid.UUID, summary: str, summarized_messages: int):
+        """Record a new rolling summary on the session's entry, if it has one."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[1].summarized_messages < summarized_messages:
+                self._entries[session_id] = (entry[0], entry[1].copy(summary=summary, summarized_messages=summarized_messages))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+_session_cache = SessionHistoryCache(
+    maxsize=int(os.getenv("SESSION_CACHE_SIZE", "1024")),
+    idle_seconds=float(os.getenv("SESSION_CACHE_IDLE_SECONDS", "900")),
+)
+
+class IdempotentTurns:
+    """
+    Single flight for send_chat_message and stream_chat_message by (session id, idempotency key): a repeat of a turn
+    in progress waits for it instead of starting another, and a repeat of one answered in the last ttl seconds gets
+    the same response. Failed turns are forgotten, so their retries run again. Per worker; repeats reaching another
+    worker find the turn's claim on the idempotency key stored with the user's message (_claim_turn) and wait for its
+    reply there.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Only touched from the event loop, so no lock
+        self._turns: "OrderedDict[Tuple[uuid.UUID, str], Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.coalesced = 0
+
+    def run(self, key: Tuple[uuid.UUID, str], answer: Callable[[], Awaitable[Dict]]) -> Awaitable[Dict]:
+        entry = self._turns.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            self.coalesced += 1
+            turn = entry[1]
+        else:
+            # A task of its own, so the turn completes for the repeats even if the first request is cancelled
+            turn = asyncio.ensure_future(answer())
+            turn.add_done_callback(lambda done: self._forget_failed(key, done))
+            self._turns[key] = (time.monotonic(), turn)
+            self._turns.move_to_end(key)
+            while len(self._turns) > self.maxsize:
+                self._turns.popitem(last=False)
+        return asyncio.shield(turn)
+
+    def _forget_failed(self, key: Tuple[uuid.UUID, str], turn: asyncio.Future):
+        if (turn.cancelled() or turn.exception() is not None) and self._turns.get(key, (None, None))[1] is turn:
+            del self._turns[key]
+
+_idempotent_turns = IdempotentTurns(ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600")))
+
+def engine_stats() -> Dict:
+    """This worker's cache hit rates, and how often the readiness score agreed with the model, for diagnostics."""
+    completion_cache = get_completion_cache()
+    return {
+        "readiness": {"mode": readiness_mode(), **readiness_agreement.stats()},
+        "completion_cache": completion_cache.stats() if completion_cache is not None else None,
+        "session_cache": _session_cache.stats(),
+        "idempotent_turns": {"coalesced": _idempotent_turns.coalesced},
+    }
 
 @public
-def start_chat_session() -> Dict:
+async def start_chat_session() -> Dict:
     """Start a new chat session."""
-    session = ChatSession()
-    session.sync()
+    session = ChatSession(last_message_order=1)
+    await session.async_sync()
     
     engine = ConversationEngine()
     initial_question = engine.get_initial_question()
@@ -110,79 +468,397 @@ def start_chat_session() -> Dict:
         content=initial_question,
         message_order=1
     )
-    message.sync()
+    await ChatMessage.__write_behind__.aadd(message)
+    _session_cache.put(session.id, SessionState([{"role": "assistant", "content": initial_question}], 2))
     
     return {
         "session_id": str(session.id),
         "message": initial_question
     }
 
-@public
-def send_chat_message(session_id: str, user_message: str) -> Dict:
-    """Process a user message and return the agent's response."""
-    session_uuid = uuid.UUID(session_id)
-    
-    # Get conversation history
-    history_results = ChatMessage.sql(
-        "SELECT role, content FROM chat_messages WHERE session_id = %(session_id)s ORDER BY message_order",
-        {"session_id": session_uuid}
+def _with_buffered(rows: List[Dict], session_uuid: uuid.UUID) -> List[Dict]:
+    """Add the session's messages still in ChatMessage's write-behind buffer, so a session always reads its own writes."""
+    seen = {row["id"] for row in rows}
+    buffered = [
+        message.model_dump()
+        for message in ChatMessage.__write_behind__.pending(session_uuid)
+        if message.id not in seen
+    ]
+    if not buffered:
+        return rows
+    return sorted(rows + buffered, key=lambda row: row["message_order"])
+
+NEXT_MESSAGE_ORDER_QUERY = (
+    "SELECT COALESCE(MAX(message_order), 0) + 1 as next_order FROM chat_messages WHERE session_id = %(session_id)s"
+)
+RESERVE_MESSAGE_ORDERS_QUERY = (
+    "UPDATE chat_sessions SET last_message_order = GREATEST(last_message_order, %(floor)s) + %(count)s "
+    "WHERE id = %(session_id)s RETURNING last_message_order"
+)
+
+def turn_hot_statements() -> List[Tuple[type, str, object]]:
+    """
+    The statements every chat turn runs, with sample parameters of the types the turn uses, for solar.warmup to prepare
+    on new pool connections: the next message_order read, the last_message_order reservation and the chat_messages
+    upsert of a claimed turn. A sample session is upserted first, so the sample message has a session to reference;
+    the writes are rolled back.
+    """
+    session = ChatSession(last_message_order=0)
+    message = ChatMessage(session_id=session.id, role="user", content="", message_order=1, idempotency_key="")
+    session_plan, message_plan = ChatSession._get_plan(), ChatMessage._get_plan()
+    return [
+        (ChatMessage, NEXT_MESSAGE_ORDER_QUERY, {"session_id": session.id}),
+        (ChatSession, session_plan.upsert_statement, session._get_row(session_plan)),
+        (ChatSession, RESERVE_MESSAGE_ORDERS_QUERY, {"floor": 0, "count": 2, "session_id": session.id}),
+        (ChatMessage, message_plan.upsert_statement, message._get_row(message_plan)),
+    ]
+
+async def _next_message_order(session_uuid: uuid.UUID) -> int:
+    """The message_order the session's next message gets. An index-only read, cheap enough to check every turn."""
+    order_result = await ChatMessage.asql(
+        NEXT_MESSAGE_ORDER_QUERY,
+        {"session_id": session_uuid},
+        read_only=False  # a lagging replica could hand out a number that is already taken
+    )
+    # Buffered messages aren't in the table yet, number after them too
+    return max(
+        [order_result[0]["next_order"]]
+        + [message.message_order + 1 for message in ChatMessage.__write_behind__.pending(session_uuid)]
     )
-    conversation_history = [{"role": row["role"], "content": row["content"]} for row in history_results]
+
+async def _load_conversation(session_uuid: uuid.UUID) -> SessionState:
+    """The session's conversation, from the session cache while no other worker has added to it."""
+    state = _session_cache.get(session_uuid, await _next_message_order(session_uuid))
+    if state is not None:
+        return state
     
-    # Get next message order
-    order_result = ChatMessage.sql(
-        "SELECT COALESCE(MAX(message_order), 0) + 1 as next_order FROM chat_messages WHERE session_id = %(session_id)s",
-        {"session_id": session_uuid}
+    history_rows, session = await asyncio.gather(
+        ChatMessage.asql(
+            "SELECT id, role, content, message_order FROM chat_messages WHERE session_id = %(session_id)s ORDER BY message_order",
+            {"session_id": session_uuid},
+            read_only=False  # the version check above reads the primary, a replica could be behind it
+        ),
+        ChatSession.aget(session_uuid)
+    )
+    history_results = _with_buffered(history_rows, session_uuid)
+    state = SessionState(
+        [{"role": row["role"], "content": row["content"]} for row in history_results],
+        history_results[-1]["message_order"] + 1 if history_results else 1,
+        session.conversation_summary if session else None,
+        session.summarized_messages if session else 0
     )
-    next_order = order_result[0]["next_order"]
-    
-    # Save user message
-    user_msg = ChatMessage(
-        session_id=session_uuid,
-        role="user",
-        content=user_message,
-        message_order=next_order
+    _session_cache.put(session_uuid, state)
+    return state
+
+async def _reserve_message_orders(session_uuid: uuid.UUID, floor: int, count: int) -> int:
+    """
+    Hand out the session's next count message orders, past floor as well, and return the first. The row lock of the
+    UPDATE serializes turns of a session across workers, so no two of them get the same numbers.
+    """
+    rows = await ChatSession.asql(
+        RESERVE_MESSAGE_ORDERS_QUERY,
+        {"floor": floor, "count": count, "session_id": session_uuid}
     )
-    user_msg.sync()
+    if not rows:
+        raise ValueError(f"Chat session {session_uuid} does not exist")
+    ChatSession.update_cached(session_uuid, last_message_order=rows[0]["last_message_order"])
+    return rows[0]["last_message_order"] - count + 1
+
+# Attempts at saving a turn whose message orders turn out to be taken
+SAVE_TURN_ATTEMPTS = 3
+
+async def _save_turn(
+    session_uuid: uuid.UUID,
+    state: SessionState,
+    messages: List[Tuple[str, str]],
+    next_order: Optional[int] = None
+):
+    """
+    Number a turn's (role, content) messages and queue them on ChatMessage's write-behind buffer. next_order is the
+    first message's order when _claim_turn reserved it already.
+    """
+    turn = [{"role": role, "content": content} for role, content in messages]
+    # Sessions from before last_message_order existed start it at 0, the loaded conversation is a floor for those
+    floor = state.next_order - 1
+    for attempt in range(SAVE_TURN_ATTEMPTS):
+        if next_order is None:
+            next_order = await _reserve_message_orders(session_uuid, floor, len(messages))
+        try:
+            await ChatMessage.__write_behind__.aadd(*[
+                ChatMessage(session_id=session_uuid, role=role, content=content, message_order=next_order + offset)
+                for offset, (role, content) in enumerate(messages)
+            ])
+            break
+        except errors.UniqueViolation:
+            # Only raised when the buffer writes through; rows were written without a reservation, renumber past them
+            if attempt == SAVE_TURN_ATTEMPTS - 1:
+                raise
+            floor, next_order = await _next_message_order(session_uuid) - 1, None
     
-    # Add user message to history for processing
-    conversation_history.append({"role": "user", "content": user_message})
+    # The cached conversation only takes the turn if nothing was numbered in between, otherwise it is dropped
+    _session_cache.advance(session_uuid, next_order, turn)
+    _schedule_summary(session_uuid, len(state.messages) + len(turn), state.summarized_messages)
+
+async def _claim_turn(
+    session_uuid: uuid.UUID,
+    state: SessionState,
+    user_message: str,
+    idempotency_key: str
+) -> Tuple[Optional[ChatMessage], SessionState]:
+    """
+    Save the user's message of a turn with an idempotency key before the turn is answered, bypassing the write-behind
+    buffer, so the unique index on (session_id, idempotency_key) lets one request per key through across workers. The
+    order after the message is reserved for the reply. Returns the message, or None when another request holds the
+    key, and the conversation including it.
+    """
+    floor = state.next_order - 1
+    for attempt in range(SAVE_TURN_ATTEMPTS):
+        order = await _reserve_message_orders(session_uuid, floor, 2)
+        message = ChatMessage(
+            session_id=session_uuid,
+            role="user",
+            content=user_message,
+            message_order=order,
+            idempotency_key=idempotency_key
+        )
+        try:
+            await message.async_sync()
+            break
+        except errors.UniqueViolation:
+            claimed = await ChatMessage.asql(
+                "SELECT 1 FROM chat_messages WHERE session_id = %(session_id)s AND idempotency_key = %(idempotency_key)s",
+                {"session_id": session_uuid, "idempotency_key": idempotency_key},
+                read_only=False
+            )
+            if claimed:
+                return None, state
+            # The order was taken by a row written without a reservation, renumber past it
+            if attempt == SAVE_TURN_ATTEMPTS - 1:
+                raise
+            floor = await _next_message_order(session_uuid) - 1
     
-    engine = ConversationEngine()
+    user_turn = [{"role": "user", "content": user_message}]
+    _session_cache.advance(session_uuid, order, user_turn)
+    return message, state.copy(state.messages + user_turn, next_order=order + 1)
+
+# How long a repeat waits for another worker to answer the turn it claimed, past the model's own timeout
+CLAIMED_TURN_WAIT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120")) + 30
+
+async def _await_answer(session_uuid: uuid.UUID, idempotency_key: str) -> Dict:
+    """The response to a turn another request claimed, once it is saved."""
+    deadline = time.monotonic() + CLAIMED_TURN_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        answered = await _answered_turn(session_uuid, idempotency_key)
+        if answered is not None:
+            return answered
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Turn {idempotency_key} of chat session {session_uuid} is still being answered elsewhere")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+# Summaries being written, at most one per session
+_summary_tasks: Dict[uuid.UUID, asyncio.Task] = {}
+
+def _summary_due(message_count: int, summarized_messages: int) -> bool:
+    return message_count - summarized_messages >= SUMMARY_RECENT_MESSAGES + SUMMARY_BATCH
+
+def _schedule_summary(session_uuid: uuid.UUID, message_count: int, summarized_messages: int):
+    """
+    Fold the messages leaving the recent window into the session's summary, off the request path. message_count and
+    summarized_messages only decide whether it is worth a look, the task reads the current ones itself.
+    """
+    if not _summary_due(message_count, summarized_messages) or session_uuid in _summary_tasks:
+        return
+    task = asyncio.ensure_future(_update_summary(session_uuid))
+    _summary_tasks[session_uuid] = task
+    task.add_done_callback(lambda _: _summary_tasks.pop(session_uuid, None))
+
+async def _update_summary(session_uuid: uuid.UUID):
+    try:
+        # Turns saved while a summary is written don't schedule another, so keep going until the session is caught up
+        while await _summarize_once(session_uuid):
+            pass
+    except Exception:
+        # Prompts keep the unsummarized messages meanwhile, and the next turn tries again
+        logger.exception(f"Failed to update the conversation summary of session {session_uuid}")
+
+async def _summarize_once(session_uuid: uuid.UUID) -> bool:
+    """Extend the session's summary if it is due; whether it was."""
+    # The summary as persisted now, which another worker or an earlier task may have moved on since scheduling
+    rows = await ChatSession.asql(
+        "SELECT conversation_summary, summarized_messages FROM chat_sessions WHERE id = %(session_id)s",
+        {"session_id": session_uuid},
+        read_only=False
+    )
+    if not rows:
+        return False
+    previous_summary, previous = rows[0]["conversation_summary"], rows[0]["summarized_messages"]
+    conversation_history = (await _load_conversation(session_uuid)).messages
+    if not _summary_due(len(conversation_history), previous):
+        return False
     
-    # Check if ready for proposal generation
-    if engine.should_generate_proposal(conversation_history):
-        return {
-            "message": "Thank you for sharing all that information! I have a clear picture of your business challenges. Let me analyze everything and create a custom agent system recommendation for you. This will just take a moment...",
-            "ready_for_proposal": True
+    summarized_messages = len(conversation_history) - SUMMARY_RECENT_MESSAGES
+    engine = ConversationEngine(summary=previous_summary, summarized_messages=previous)
+    summary = await engine.summarize(conversation_history[previous:summarized_messages])
+    # Only replaces the summary this one extends, one written by another worker in the meantime wins
+    updated = await ChatSession.asql(
+        "UPDATE chat_sessions SET conversation_summary = %(summary)s, summarized_messages = %(summarized_messages)s "
+        "WHERE id = %(session_id)s AND summarized_messages = %(previous)s RETURNING summarized_messages",
+        {
+            "summary": summary,
+            "summarized_messages": summarized_messages,
+            "session_id": session_uuid,
+            "previous": previous,
         }
-    
-    # Generate next question
-    agent_response = engine.determine_next_question(session_uuid, conversation_history)
-    
-    # Save agent response
-    agent_msg = ChatMessage(
-        session_id=session_uuid,
-        role="assistant",
-        content=agent_response,
-        message_order=next_order + 1
     )
-    agent_msg.sync()
+    if not updated:
+        logger.info(f"Dropped a conversation summary of session {session_uuid}, another one was saved first")
+        return False
+    ChatSession.update_cached(session_uuid, conversation_summary=summary, summarized_messages=summarized_messages)
+    _session_cache.summarized(session_uuid, summary, summarized_messages)
+    return True
+
+@public
+async def send_chat_message(session_id: str, user_message: str, idempotency_key: Optional[str] = None) -> Dict:
+    """
+    Process a user message and return the agent's response. Requests that repeat an idempotency_key of the session,
+    e.g. client retries and double submits, get the response of the first one rather than another turn.
+    """
+    session_uuid = uuid.UUID(session_id)
+    if idempotency_key is None:
+        return await _answer_turn(session_uuid, user_message)
+    return await _idempotent_turns.run(
+        (session_uuid, idempotency_key),
+        lambda: _answer_turn(session_uuid, user_message, idempotency_key)
+    )
+
+async def _answered_turn(session_uuid: uuid.UUID, idempotency_key: str) -> Optional[Dict]:
+    """
+    The response to a turn whose user message carries idempotency_key, if the reply was saved already: the first
+    assistant message after the user's. _claim_turn reserves the order after the user's message for the reply, but the
+    write-behind buffer renumbers a reply whose order turned out to be taken (see chat_message._renumber) to the end.
+    """
+    rows = _with_buffered(await ChatMessage.asql(
+        "SELECT id, role, content, message_order, idempotency_key FROM chat_messages WHERE session_id = %(session_id)s AND message_order >= "
+        "(SELECT MIN(message_order) FROM chat_messages WHERE session_id = %(session_id)s AND idempotency_key = %(idempotency_key)s) "
+        "AND (idempotency_key = %(idempotency_key)s OR role = 'assistant') ORDER BY message_order LIMIT 2",
+        {"session_id": session_uuid, "idempotency_key": idempotency_key},
+        read_only=False  # the repeat of a request that just finished elsewhere, a replica may not have it yet
+    ), session_uuid)  # this worker's reply may still be buffered
+    first = next((i for i, row in enumerate(rows) if row["idempotency_key"] == idempotency_key), None)
+    if first is None:
+        return None
+    reply = next((row for row in rows[first + 1:] if row["role"] == "assistant"), None)
+    if reply is None:
+        return None
+    return {"message": reply["content"], "ready_for_proposal": reply["content"] == PROPOSAL_READY_MESSAGE}
+
+async def _answer_turn(
+    session_uuid: uuid.UUID,
+    user_message: str,
+    idempotency_key: Optional[str] = None,
+    tokens: "Optional[asyncio.Queue[str]]" = None
+) -> Dict:
+    """send_chat_message's turn; given tokens, the next question's text is put there as it is generated."""
+    # Get conversation history, and look for an earlier answer when the request may be a repeat
+    claim = None
+    if idempotency_key is None:
+        state = await _load_conversation(session_uuid)
+    else:
+        state, answered = await asyncio.gather(
+            _load_conversation(session_uuid), _answered_turn(session_uuid, idempotency_key)
+        )
+        if answered is not None:
+            return answered
+        claim, state = await _claim_turn(session_uuid, state, user_message, idempotency_key)
+        if claim is None:
+            return await _await_answer(session_uuid, idempotency_key)
+    
+    try:
+        # Add user message to history for processing, a claimed turn's conversation has it already
+        conversation_history = state.messages if claim is not None else state.messages + [{"role": "user", "content": user_message}]
+        
+        engine = ConversationEngine(summary=state.summary, summarized_messages=state.summarized_messages)
+        
+        # Check if ready for proposal generation, and if not get the next question
+        if tokens is None:
+            ready, agent_response = await engine.plan_turn(session_uuid, conversation_history)
+        else:
+            ready, agent_response = await engine.plan_streamed_turn(session_uuid, conversation_history, tokens)
+        if ready:
+            agent_response = PROPOSAL_READY_MESSAGE
+        
+        # Save the user message and agent response together, numbered at write time
+        if claim is None:
+            await _save_turn(session_uuid, state, [("user", user_message), ("assistant", agent_response)])
+        else:
+            await _save_turn(session_uuid, state, [("assistant", agent_response)], state.next_order)
+    except BaseException:
+        if claim is not None:
+            await _release_claim(claim)
+        raise
     
     return {
         "message": agent_response,
-        "ready_for_proposal": False
+        "ready_for_proposal": ready
     }
 
+async def _release_claim(claim: ChatMessage):
+    """Delete the user's message of a claimed turn that failed, so a retry answers it rather than waiting for it."""
+    try:
+        await asyncio.shield(claim.adelete())
+    except Exception:
+        logger.exception(f"Failed to release turn {claim.idempotency_key} of chat session {claim.session_id}")
+
+async def stream_chat_message(
+    session_id: str,
+    user_message: str,
+    idempotency_key: Optional[str] = None
+) -> AsyncIterator[Dict]:
+    """
+    Streaming variant of send_chat_message, served as server-sent events by the send_chat_message_stream route.
+    Yields {"event": "token", "data": {"text": ...}} while the next question is generated, then one
+    {"event": "done", "data": ...} holding send_chat_message's response. The turn is saved just before "done".
+    Repeats of an idempotency_key share the turn as in send_chat_message, and only get its "done".
+    """
+    session_uuid = uuid.UUID(session_id)
+    tokens: "asyncio.Queue[str]" = asyncio.Queue()
+    answer = lambda: _answer_turn(session_uuid, user_message, idempotency_key, tokens)
+    if idempotency_key is None:
+        turn = asyncio.ensure_future(answer())
+    else:
+        turn = _idempotent_turns.run((session_uuid, idempotency_key), answer)
+    
+    try:
+        while True:
+            next_token = asyncio.ensure_future(tokens.get())
+            await asyncio.wait({next_token, turn}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_token.done():
+                next_token.cancel()
+                break
+            yield {"event": "token", "data": {"text": next_token.result()}}
+        # Tokens put just before the turn ended
+        while not tokens.empty():
+            yield {"event": "token", "data": {"text": tokens.get_nowait()}}
+        yield {"event": "done", "data": await turn}
+    finally:
+        if idempotency_key is None:
+            # The client went away or the turn failed: stop the question. Keyed turns finish for their repeats
+            turn.cancel()
+            await asyncio.gather(turn, return_exceptions=True)
+
 @public
-def get_chat_history(session_id: str) -> List[Dict]:
+async def get_chat_history(session_id: str) -> List[Dict]:
     """Get the chat history for a session."""
     session_uuid = uuid.UUID(session_id)
     
-    messages = ChatMessage.sql(
-        "SELECT role, content, created_at FROM chat_messages WHERE session_id = %(session_id)s ORDER BY message_order",
-        {"session_id": session_uuid}
-    )
+    messages = _with_buffered(await ChatMessage.asql(
+        "SELECT id, role, content, message_order, created_at FROM chat_messages WHERE session_id = %(session_id)s ORDER BY message_order",
+        {"session_id": session_uuid},
+        # Flushed messages leave the buffer before a replica has them, only the primary is sure to have them instead
+        read_only=False
+    ), session_uuid)
     
     return [
         {
@@ -192,3 +868,37 @@ def get_chat_history(session_id: str) -> List[Dict]:
         }
         for msg in messages
     ]
+
+@public
+async def get_chat_history_page(session_id: str, after: Optional[str] = None, limit: int = 50) -> Dict:
+    """Get one page of the chat history for a session, oldest first. Pass next_cursor back as `after` for the next page."""
+    session_uuid = uuid.UUID(session_id)
+    limit = max(1, min(limit, 200))
+    
+    page = await ChatMessage.apage(
+        where="session_id = %(session_id)s",
+        params={"session_id": session_uuid},
+        order_by=["message_order"],
+        after=after,
+        limit=limit,
+        as_model=False,
+        read_only=False,  # as in get_chat_history, a replica could miss messages that just left the buffer
+    )
+    
+    items = page.items
+    if page.next_cursor is None and (items or after is None):
+        # Buffered messages are newer than anything in the table, so they only extend the last page
+        last_order = items[-1]["message_order"] if items else 0
+        items = items + [row for row in _with_buffered([], session_uuid) if row["message_order"] > last_order]
+    
+    return {
+        "messages": [
+            {
+                "role": msg["role"],
+                "content": msg["content"],
+                "timestamp": msg["created_at"].isoformat()
+            }
+            for msg in items
+        ],
+        "next_cursor": page.next_cursor
+    }
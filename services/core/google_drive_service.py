@@ -103,18 +103,14 @@ class GoogleDriveService:
         try:
             proposal_uuid = uuid.UUID(proposal_id)
             
-            proposal_results = ProposalRecommendation.sql(
-                """SELECT pr.*, bp.business_name, bp.industry 
-                   FROM proposal_recommendations pr
-                   JOIN business_profiles bp ON pr.business_profile_id = bp.id
-                   WHERE pr.id = %(proposal_id)s""",
-                {"proposal_id": proposal_uuid}
-            )
+            # Primary-key reads, the proposal from ProposalRecommendation's cache
+            proposal = ProposalRecommendation.get(proposal_uuid)
+            profile = BusinessProfile.get(proposal.business_profile_id) if proposal else None
             
-            if not proposal_results:
+            if not proposal or not profile:
                 return {"success": False, "error": "Proposal not found"}
             
-            proposal_data = proposal_results[0]
+            proposal_data = {**proposal.model_dump(), "business_name": profile.business_name, "industry": profile.industry}
             
             if not self.service:
                 return {"success": False, "error": "Google Drive service not available - check credentials"}
@@ -172,15 +168,18 @@ Date: {datetime.now().strftime('%B %d, %Y')}
             
             file_id = file.get('id')
             
-            ProposalRecommendation.sql(
-                "UPDATE proposal_recommendations SET google_drive_file_id = %(file_id)s, pdf_generated = true WHERE id = %(proposal_id)s",
-                {"file_id": file_id, "proposal_id": proposal_uuid}
-            )
-            
-            ChatSession.sql(
-                "UPDATE chat_sessions SET google_drive_uploaded = true WHERE id = %(session_id)s",
-                {"session_id": proposal_data['session_id']}
-            )
+            # Both flags in one pipelined commit
+            with ProposalRecommendation.transaction() as tx:
+                tx.execute(
+                    "UPDATE proposal_recommendations SET google_drive_file_id = %(file_id)s, pdf_generated = true WHERE id = %(proposal_id)s",
+                    {"file_id": file_id, "proposal_id": proposal_uuid}
+                )
+                tx.execute(
+                    "UPDATE chat_sessions SET google_drive_uploaded = true WHERE id = %(session_id)s",
+                    {"session_id": proposal_data['session_id']}
+                )
+            ProposalRecommendation.update_cached(proposal_uuid, google_drive_file_id=file_id, pdf_generated=True)
+            ChatSession.update_cached(proposal_data['session_id'], google_drive_uploaded=True)
             
             return {
                 "success": True,
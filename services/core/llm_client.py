@@ -0,0 +1,48 @@
+from typing import Optional
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+import httpx
+import os
+
+# HTTP/2 multiplexes concurrent completions over one connection; it needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+_client: Optional[AsyncOpenAI] = None
+
+def get_llm_client() -> AsyncOpenAI:
+    """
+    The process-wide OpenRouter client. Its connection pool keeps TLS connections to openrouter.ai alive between
+    requests, so only the first completion of a worker pays for connection setup. Create engines with it rather
+    than a client of their own.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            # Reasoning models can think for a while before the first byte, but a dead connection should fail fast
+            timeout=Timeout(float(os.getenv("LLM_TIMEOUT_SECONDS", "120")), connect=10.0),
+            # Retries back off on connection errors, 429s and 5xx responses
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            http_client=DefaultAsyncHttpxClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                    max_keepalive_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_SECONDS", "300")),
+                ),
+            ),
+        )
+    return _client
+
+async def close_llm_client():
+    """Close the shared client's connections, e.g. on application shutdown; the next get_llm_client() makes a new one."""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close()
@@ -1,26 +1,34 @@
 from typing import List, Dict, Optional, Tuple
-from openai import OpenAI
-import os
+from openai import AsyncOpenAI
 import json
 from datetime import datetime
 from core.chat_session import ChatSession
 from core.chat_message import ChatMessage
 from core.business_profile import BusinessProfile
 from core.proposal_recommendation import ProposalRecommendation
+from core.completion_cache import complete
+from core.conversation_engine import build_conversation_context
+from core.llm_client import get_llm_client
 from solar.access import public
 import uuid
 
 class ProposalGenerator:
-    def __init__(self):
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-        )
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        self.client = client or get_llm_client()
     
-    def extract_business_profile(self, conversation_history: List[Dict]) -> Dict:
-        """Extract structured business information from conversation."""
+    async def extract_business_profile(
+        self,
+        conversation_history: List[Dict],
+        summary: Optional[str] = None,
+        summarized_messages: int = 0,
+    ) -> Dict:
+        """
+        Extract structured business information from conversation. Like chat turns, the prompt has the session's
+        rolling summary (ChatSession.conversation_summary, covering its first summarized_messages messages) and a
+        window of the messages after it, so it stays the same size however long the conversation ran.
+        """
         
-        context = "\\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
+        context = build_conversation_context(conversation_history, summary, summarized_messages)
         
         system_prompt = """Extract structured business information from this conversation. 
         Focus on identifying specific pain points, time wasters, bottlenecks, and automation opportunities mentioned by the business owner."""
@@ -65,7 +73,8 @@ class ProposalGenerator:
             }
         }
         
-        response = self.client.chat.completions.create(
+        content = await complete(
+            self.client,
             model="openai/gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -74,4 +83,4 @@ class ProposalGenerator:
             response_format={"type": "json_schema", "json_schema": schema}
         )
         
-        return json.loads(response.choices[0].message.content)
+        return json.loads(content)
@@ -1,14 +1,15 @@
-from solar import Table, ColumnDetails
+from solar import Table, ColumnDetails, EntityCache
 from typing import Optional, List, Dict
 from datetime import datetime
 import uuid
 
 class ProposalRecommendation(Table):
     __tablename__ = "proposal_recommendations"
+    __cache__ = EntityCache(maxsize=1024, ttl=30)
     
     id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
-    session_id: uuid.UUID  # References chat_sessions.id
-    business_profile_id: uuid.UUID  # References business_profiles.id
+    session_id: uuid.UUID = ColumnDetails(index=True)  # References chat_sessions.id
+    business_profile_id: uuid.UUID = ColumnDetails(index=True)  # References business_profiles.id
     pricing_tier: str  # "starter" or "pro"
     recommended_agents: List[Dict]  # Array of recommended agent configurations
     implementation_timeline: str
@@ -0,0 +1,119 @@
+from typing import Dict, List, Optional
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# "off" always asks the model, "shadow" asks the model but scores the conversation too and logs whether the two agree,
+# "on" skips the model when the score says the conversation can't be ready yet
+READINESS_MODES = ("off", "shadow", "on")
+
+# Keywords for the areas the readiness prompt asks about, matched at word starts in the business owner's messages
+READINESS_AREAS = {
+    "business": [
+        "business", "company", "industry", "practice", "clinic", "agency", "firm", "shop", "store", "restaurant",
+        "studio", "startup", "we sell", "we provide", "we offer", "locations", "employees", "staff",
+    ],
+    "challenges": [
+        "challenge", "problem", "issue", "struggl", "pain", "frustrat", "difficult", "hard to", "headache",
+        "biggest", "worst", "hate", "annoying", "stress",
+    ],
+    "manual_work": [
+        "manual", "by hand", "spreadsheet", "excel", "paper", "copy", "data entry", "re-enter", "retype",
+        "repetitive", "hours", "every day", "each day", "every week", "each week", "tedious", "juggl",
+    ],
+    "customers": [
+        "customer", "client", "patient", "guest", "caller", "call", "phone", "email", "inquir", "question",
+        "support", "complain", "review", "booking", "appointment", "reservation", "order", "follow up", "follow-up",
+    ],
+    "bottlenecks": [
+        "bottleneck", "slow", "delay", "backlog", "wait", "behind", "miss", "double book", "double-book", "error",
+        "mistake", "overwhelm", "fall through", "falls through", "lose", "lost", "takes too", "too long",
+    ],
+}
+
+_AREA_PATTERNS = {
+    area: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")")
+    for area, keywords in READINESS_AREAS.items()
+}
+
+# Answers this short haven't said enough to be worth the model's time, whatever words they use
+MIN_ANSWER_WORDS = 40
+
+def readiness_mode() -> str:
+    mode = os.getenv("READINESS_HEURISTIC", "off").lower()
+    if mode not in READINESS_MODES:
+        raise ValueError(f"READINESS_HEURISTIC must be one of {', '.join(READINESS_MODES)}, not {mode}")
+    return mode
+
+def readiness_min_areas() -> int:
+    """Areas the business owner has to have covered before the model is asked; the prompt wants 3 in detail."""
+    return int(os.getenv("READINESS_HEURISTIC_MIN_AREAS", "3"))
+
+class ReadinessScore:
+    """Which readiness areas the business owner's answers touch, and how much they have written."""
+
+    def __init__(self, areas: List[str], answer_words: int, min_areas: int):
+        self.areas = areas
+        self.answer_words = answer_words
+        self.min_areas = min_areas
+
+    @property
+    def maybe_ready(self) -> bool:
+        """False when the conversation clearly can't be ready, True when it's up to the model."""
+        return len(self.areas) >= self.min_areas and self.answer_words >= MIN_ANSWER_WORDS
+
+    def __repr__(self) -> str:
+        return f"ReadinessScore(areas={self.areas}, answer_words={self.answer_words}, maybe_ready={self.maybe_ready})"
+
+def score_readiness(conversation_history: List[Dict], min_areas: Optional[int] = None) -> ReadinessScore:
+    """Score the conversation's coverage of the readiness areas, in microseconds and without a model call."""
+    answers = " ".join(msg["content"] for msg in conversation_history if msg["role"] == "user").lower()
+    areas = [area for area, pattern in _AREA_PATTERNS.items() if pattern.search(answers)]
+    return ReadinessScore(areas, len(answers.split()), readiness_min_areas() if min_areas is None else min_areas)
+
+class ReadinessAgreement:
+    """
+    Counts how often the score matched the model's verdict. A conversation the score would have held back but the
+    model called ready is a missed proposal once the heuristic is on, those are logged with their score for tuning.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compared = 0
+        self.agreed = 0
+        self.missed_ready = 0
+        self.skipped = 0
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record(self, score: ReadinessScore, ready: bool):
+        with self._lock:
+            self.compared += 1
+            if score.maybe_ready == ready:
+                self.agreed += 1
+            elif ready:
+                self.missed_ready += 1
+            compared, rate = self.compared, self.agreed / self.compared
+        if score.maybe_ready == ready:
+            logger.debug(f"Readiness score agreed with the model (ready={ready}), {rate:.0%} of {compared} agree")
+        else:
+            # Scored maybe-ready but the model wants more is the expected disagreement; the model is the tiebreaker
+            level = logging.WARNING if ready else logging.INFO
+            logger.log(level, f"Readiness score disagreed with the model (ready={ready}): {score}, {rate:.0%} of {compared} agree")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "compared": self.compared,
+                "agreed": self.agreed,
+                "agreement_rate": self.agreed / self.compared if self.compared else None,
+                "missed_ready": self.missed_ready,
+                "skipped": self.skipped,
+            }
+
+readiness_agreement = ReadinessAgreement()
@@ -1,4 +1,7 @@
-from .table import Table, ColumnDetails
+from .table import Table, ColumnDetails, Index, Page, Backend, set_backend
+from .cache import EntityCache
+from .buffer import WriteBehindBuffer
+from .memory import MemoryBackend
 from .access import authenticated, User, public
 
-__all__ = [Table, ColumnDetails, authenticated, User, public]
+__all__ = [Table, ColumnDetails, Index, Page, EntityCache, WriteBehindBuffer, Backend, MemoryBackend, set_backend, authenticated, User, public]
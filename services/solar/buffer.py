@@ -0,0 +1,208 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains WriteBehindBuffer, which batches inserts into append-only tables. Tables opt in by declaring one
+# as a class attribute, next to __tablename__:
+#
+#     class ChatMessage(Table):
+#         __tablename__ = "chat_messages"
+#         __write_behind__ = WriteBehindBuffer(partition_key="session_id")
+#
+# add() queues rows and returns immediately; a background thread collects them for Config.write_behind_flush_ms and
+# writes everything queued with one multi-row upsert (Table.sync_many). Rows stay readable through pending() until
+# their write commits, so a request can merge them into what it reads back from the database (read-your-writes).
+# Upserts are keyed by primary key, so a failed flush is simply retried. Rows the database rejects for a constraint
+# would fail every retry: the on_reject hook gets a chance to repair each one (e.g. renumber it), and rows that are
+# still rejected are logged in full and set aside on dead_letters rather than holding back the rest. Buffers are
+# flushed on interpreter exit and by close_write_behind_buffers(), which the application's shutdown hook should call.
+# Only rows of this process are visible, and rows still buffered when the process dies are lost, so use it where that
+# trade-off is acceptable.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from typing import Any, Callable, List, Optional, Type, TYPE_CHECKING
+
+from .config import config
+from .pool import retry_delay
+
+import atexit
+import logging
+import psycopg
+import threading
+import time
+
+if TYPE_CHECKING:
+    from .table import Table
+
+logger = logging.getLogger(__name__)
+
+
+######################################################################################################################
+# Write-Behind Buffer
+######################################################################################################################
+
+
+class WriteBehindBuffer:
+    """Queue of rows of one append-only Table, written in batches by a background thread"""
+
+    def __init__(
+        self,
+        partition_key: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        batch_size=1000,
+        on_reject: Optional[Callable[["Table"], bool]] = None,
+    ):
+        self.partition_key = partition_key  # column pending() filters on, e.g. the session id
+        self._flush_interval = flush_interval  # seconds, None to read Config.write_behind_flush_ms on every add
+        self.batch_size = batch_size
+        self.on_reject = on_reject  # repairs a row the database rejected, True to write it again
+        self.dead_letters: List["Table"] = []  # rows the database rejected even after on_reject
+        self.table_class: Optional[Type["Table"]] = None
+        self._pending: List["Table"] = []  # queued, not yet being written
+        self._in_flight: List["Table"] = []  # being written by the current flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        _buffers.append(self)
+
+    def __set_name__(self, owner, name):
+        self.table_class = owner
+
+    @property
+    def flush_interval(self) -> float:
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return config.write_behind_flush_ms() / 1000
+
+    @property
+    def enabled(self) -> bool:
+        """A zero flush interval turns the buffer into a plain write-through"""
+        return self.flush_interval > 0 and not self._closed
+
+    def add(self, *objects: "Table"):
+        """Queue rows for the next flush, or write them right away when the buffer is disabled"""
+        if not self.enabled:
+            self.table_class.sync_many(list(objects), batch_size=self.batch_size)
+            return
+        with self._lock:
+            self._pending.extend(objects)
+            self._start()
+        self._wakeup.set()
+
+    async def aadd(self, *objects: "Table"):
+        """add() for async code, which must not block the loop on the write-through path"""
+        if not self.enabled:
+            await self.table_class.async_sync_many(list(objects), batch_size=self.batch_size)
+            return
+        self.add(*objects)
+
+    def pending(self, partition_value: Any = None) -> List["Table"]:
+        """Rows added but not yet committed, optionally only those whose partition_key equals partition_value"""
+        with self._lock:
+            rows = self._in_flight + self._pending
+        if partition_value is None:
+            return rows
+        return [row for row in rows if getattr(row, self.partition_key) == partition_value]
+
+    def flush(self):
+        """Write everything queued so far, blocking until it is committed; on failure the rows are requeued"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._in_flight = []
+                raise
+            with self._lock:
+                self._in_flight = []
+
+    def _write(self, batch: List["Table"]):
+        try:
+            self.table_class.sync_many(batch, batch_size=self.batch_size)
+        except psycopg.IntegrityError:
+            # One row breaking a constraint fails the whole statement, and would again on every retry: write the rows
+            # one at a time so the ones the database rejects don't hold back the rest
+            for row in batch:
+                self._write_row(row)
+
+    def _write_row(self, row: "Table"):
+        try:
+            self.table_class.sync_many([row])
+            return
+        except psycopg.IntegrityError as e:
+            error = e
+        if self.on_reject is not None and self.on_reject(row):
+            try:
+                self.table_class.sync_many([row])
+                return
+            except psycopg.IntegrityError as e:
+                error = e
+        with self._lock:
+            self.dead_letters.append(row)
+        logger.error(
+            f"Set aside a {self.table_class.__tablename__} row the database rejects: {str(error)}; "
+            f"row: {row.model_dump_json()}"
+        )
+
+    def close(self):
+        """Stop the flusher thread and write what is left; later adds are written through"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _start(self):
+        """Start the flusher thread if needed; called with _lock held"""
+        if self._thread is None or not self._thread.is_alive():
+            name = f"solar-write-behind-{self.table_class.__tablename__}"
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        failures = 0
+        while not self._closed:
+            self._wakeup.wait()
+            if self._closed:
+                return  # close() does the final flush
+            # Give concurrent requests a few milliseconds to add their rows to the same statement
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.error(f"Write-behind flush of {self.table_class.__tablename__} failed, will retry: {str(e)}")
+                time.sleep(retry_delay(failures))
+                self._wakeup.set()
+
+
+_buffers: List[WriteBehindBuffer] = []
+
+
+def close_write_behind_buffers():
+    """Flush every buffer and switch them to write-through, e.g. on application shutdown"""
+    for buffer in _buffers:
+        if buffer.table_class is None:
+            continue
+        try:
+            buffer.close()
+        except Exception as e:
+            logger.error(f"Failed to flush write-behind buffer of {buffer.table_class.__tablename__}: {str(e)}")
+
+
+atexit.register(close_write_behind_buffers)
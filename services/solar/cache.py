@@ -0,0 +1,100 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains EntityCache, an in-process read-through cache of Table rows keyed by primary key. Tables opt in
+# by declaring one as a class attribute, next to __tablename__:
+#
+#     class ChatSession(Table):
+#         __tablename__ = "chat_sessions"
+#         __cache__ = EntityCache(maxsize=1024, ttl=30)
+#
+# Table.get/get_many read through it, and sync/sync_many/delete keep it up to date. Writes made with raw SQL must
+# call Table.invalidate, or Table.update_cached when they know the values they wrote. Entries are per process, so the TTL bounds how stale a row written elsewhere can get.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import threading
+import time
+
+
+######################################################################################################################
+# Entity Cache
+######################################################################################################################
+
+
+class EntityCache:
+    """Thread-safe LRU cache of model instances with an optional time-to-live"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, pk) -> Optional[Any]:
+        """Return a copy of the cached instance, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, instance = entry
+            if expires_at < time.monotonic():
+                del self._entries[pk]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(pk)
+            self.hits += 1
+        # Hand out copies so callers mutating their instance can't corrupt the cached row
+        return instance.model_copy(deep=True)
+
+    def put(self, pk, instance):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        instance = instance.model_copy(deep=True)
+        with self._lock:
+            self._entries[pk] = (expires_at, instance)
+            self._entries.move_to_end(pk)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, pk, **fields):
+        """Set fields on the cached instance, if there is one; its expiry stays, it bounds the other fields"""
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is not None:
+                self._entries[pk] = (entry[0], entry[1].model_copy(update=fields))
+
+    def evict(self, *pks):
+        with self._lock:
+            for pk in pks:
+                if self._entries.pop(pk, None) is not None:
+                    self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
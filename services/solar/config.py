@@ -10,11 +10,12 @@
 ######################################################################################################################
 
 
+from functools import lru_cache
 from pathlib import Path
 import sys
 import os
 from dotenv import load_dotenv
-from typing import Union, Dict, Optional
+from typing import Union, Dict, List, Optional
 
 ######################################################################################################################
 # Configuration Class
@@ -78,21 +79,87 @@ class Config:
         """Get all the connection strings for all the tables with PG_CONN prefix."""
         pg_conn_strings = {}
         for key, value in os.environ.items():
-            if key.startswith("PG_RESOURCE_"):
+            if key.startswith("PG_RESOURCE_") and not key.endswith("_REPLICAS"):
                 pg_conn_strings[key] = value
         pg_conn_strings["NEON_CONN_URL"] = self.hosted_postgres_connection_string()
         return pg_conn_strings
 
+    @lru_cache(maxsize=None)
     def get_pg_key_for_table(self, table_class_name: str) -> str:
-        """Get the connection string for a given table name."""
+        """Get the pool key for a given table name.
+
+        The env var named after the table class (e.g. CHATMESSAGE) may either name one of the configured keys
+        (e.g. PG_RESOURCE_ANALYTICS) or hold a connection string of its own, in which case the env var name is the key.
+        Every statement looks its key up, so it is resolved once per table; get_pg_key_for_table.cache_clear() makes
+        env changes take effect.
+        """
         table_name_env_key = table_class_name.upper().replace("-", "_")
         if table_name_env_key == "USER":
             return "NEON_CONN_URL"
-        connection_string_val = os.getenv(table_name_env_key)
-        if connection_string_val is None:
+        table_env_val = os.getenv(table_name_env_key)
+        if table_env_val is None:
             return "NEON_CONN_URL"
+        if table_env_val in self.get_all_pg_connection_strings():
+            return table_env_val
+        return table_name_env_key
+
+    def get_pg_connection_string(self, pg_key: str) -> str:
+        """Get the connection string for a pool key returned by get_pg_key_for_table."""
+        pg_conn_strings = self.get_all_pg_connection_strings()
+        if pg_key in pg_conn_strings:
+            return pg_conn_strings[pg_key]
+        connection_string_val = os.getenv(pg_key)
+        self._throw_if_missing(True, connection_string_val, pg_key)
         return connection_string_val
 
+    def get_pg_replica_connection_strings(self, pg_key: str) -> List[str]:
+        """Get the read-replica connection strings for a pool key, from the comma-separated <pg_key>_REPLICAS."""
+        replicas_val = os.getenv(f"{pg_key}_REPLICAS")
+        if not replicas_val:
+            return []
+        return [conn.strip() for conn in replicas_val.split(",") if conn.strip()]
+
+    def pg_replica_max_lag(self) -> float:
+        """Get the replication lag, in seconds, above which reads fall back from a replica to the primary."""
+        return float(os.getenv("PG_REPLICA_MAX_LAG_SECONDS", "5"))
+
+    def pg_pool_min_size(self) -> int:
+        """Get the number of connections each Postgres pool keeps open, and opens at startup warm-up."""
+        return int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+
+    def pg_pool_max_size(self) -> int:
+        """Get the maximum number of connections of each Postgres pool."""
+        return int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+
+    def pg_search_path_mode(self) -> str:
+        """
+        Get how pools set search_path: "options" (libpq startup options), "set" (a SET on every new connection) or
+        "auto" (the default: "set" for pooler hosts such as Neon's -pooler endpoints, which reject startup options).
+        """
+        mode = os.getenv("PG_SEARCH_PATH_MODE", "auto").lower()
+        if mode not in ("auto", "options", "set"):
+            raise ConfigurationError(f"PG_SEARCH_PATH_MODE must be auto, options or set, not {mode}")
+        return mode
+
+    def write_behind_flush_ms(self) -> float:
+        """Get how long write-behind buffers collect rows before writing them; 0 writes rows through immediately."""
+        return float(os.getenv("WRITE_BEHIND_FLUSH_MS", "5"))
+
+    def slow_query_threshold_ms(self) -> float:
+        """Get the duration, in milliseconds, above which Table.sql statements are logged as slow."""
+        return float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))
+
+    def slow_query_explain(self) -> bool:
+        """Whether to capture EXPLAIN (ANALYZE, BUFFERS) for slow read-only statements; this re-runs them."""
+        return os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "yes")
+
+    def table_backend(self) -> str:
+        """Get where Tables run their statements: "postgres" (the default) or "memory", see solar/memory.py."""
+        backend = os.getenv("SOLAR_TABLE_BACKEND", "postgres").lower()
+        if backend not in ("postgres", "memory"):
+            raise ConfigurationError(f"SOLAR_TABLE_BACKEND must be postgres or memory, not {backend}")
+        return backend
+
     def model_api_key(self, throw_if_missing: bool = True) -> str:
         """Get the OpenRouter API key for model access."""
         api_key = os.getenv("OPENROUTER_API_KEY")
@@ -0,0 +1,161 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file turns the indexes declared on Table classes (ColumnDetails(index=True) and __indexes__) into
+# CREATE INDEX CONCURRENTLY statements, and compares them with pg_indexes to report the ones a database is missing:
+#
+#     cd services && python -m solar.indexes            # DDL for every declared index
+#     cd services && python -m solar.indexes --missing  # DDL for the indexes the database lacks, exit status 1 if any
+#
+# CONCURRENTLY builds don't block writes but can't run inside a transaction, so run the output with psql (or any
+# autocommit session) rather than in a migration transaction.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from typing import List, Optional, Tuple, Type
+
+from .table import Table, Index
+
+import argparse
+import importlib
+import pkgutil
+import sys
+
+MAX_IDENTIFIER_LENGTH = 63  # Postgres truncates longer names
+
+
+######################################################################################################################
+# Declared Indexes
+######################################################################################################################
+
+
+def index_name(table_name: str, index: Index) -> str:
+    """The index's explicit name, or ix_/ux_<table>_<columns> truncated to Postgres' identifier limit"""
+    if index.name:
+        return index.name
+    prefix = "ux" if index.unique else "ix"
+    return f"{prefix}_{table_name}_{'_'.join(index.columns)}"[:MAX_IDENTIFIER_LENGTH]
+
+
+def declared_indexes(table_class: Type[Table]) -> List[Index]:
+    """All indexes declared on a Table, with names filled in"""
+    table_name = table_class.__tablename__
+    indexes = [
+        Index((name,))
+        for name, field_info in table_class.model_fields.items()
+        if field_info.json_schema_extra and field_info.json_schema_extra.get("index", False)
+    ]
+    indexes.extend(table_class.__indexes__)
+
+    resolved = []
+    for index in indexes:
+        for column in index.columns:
+            if column not in table_class.model_fields:
+                raise ValueError(f"Index on {table_name} references unknown column {column}")
+        resolved.append(Index(index.columns, index.unique, index_name(table_name, index), index.where))
+    return resolved
+
+
+def create_index_statement(table_class: Type[Table], index: Index) -> str:
+    unique = "UNIQUE " if index.unique else ""
+    where = f" WHERE {index.where}" if index.where else ""
+    return (
+        f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {index.name} "
+        f"ON {table_class.__tablename__} ({', '.join(index.columns)}){where};"
+    )
+
+
+######################################################################################################################
+# Comparison With The Database
+######################################################################################################################
+
+
+def _parse_index_definition(indexdef: str) -> Tuple[bool, Tuple[str, ...], bool]:
+    """Split a pg_indexes.indexdef into (unique, key columns, partial)"""
+    partial = " WHERE " in indexdef
+    definition = indexdef.split(" WHERE ")[0].split(" INCLUDE ")[0]
+    unique = definition.startswith("CREATE UNIQUE INDEX")
+    columns = definition[definition.index("(", definition.index(" USING ")) + 1 : definition.rindex(")")]
+    return unique, tuple(column.strip().strip('"') for column in columns.split(",")), partial
+
+
+def _is_covered(index: Index, existing: List[Tuple[str, str]]) -> bool:
+    """Whether an existing index serves the declared one: same name, or a matching column prefix"""
+    for name, indexdef in existing:
+        if name == index.name:
+            return True
+        unique, columns, partial = _parse_index_definition(indexdef)
+        if index.where or partial:
+            continue  # partial indexes only count by name
+        if index.unique:
+            if unique and columns == index.columns:
+                return True
+        elif columns[: len(index.columns)] == index.columns:
+            return True
+    return False
+
+
+def missing_indexes(table_class: Type[Table], schema_name: str = "public") -> List[Index]:
+    """Declared indexes of a Table that the database doesn't have yet"""
+    declared = declared_indexes(table_class)
+    if not declared:
+        return []
+    rows = table_class.sql(
+        """SELECT indexname, indexdef FROM pg_indexes
+           WHERE tablename = %(table_name)s AND schemaname = ANY(current_schemas(false))""",
+        {"table_name": table_class.__tablename__},
+        schema_name=schema_name,
+    )
+    existing = [(row["indexname"], row["indexdef"]) for row in rows]
+    return [index for index in declared if not _is_covered(index, existing)]
+
+
+######################################################################################################################
+# Command Line
+######################################################################################################################
+
+
+def find_tables(package: str = "core") -> List[Type[Table]]:
+    """Import every module of a package and return the concrete Table subclasses defined in it"""
+    module = importlib.import_module(package)
+    for info in pkgutil.iter_modules(module.__path__, f"{package}."):
+        importlib.import_module(info.name)
+
+    tables, pending = [], list(Table.__subclasses__())
+    while pending:
+        table_class = pending.pop()
+        pending.extend(table_class.__subclasses__())
+        if table_class.__module__.startswith(package) and getattr(table_class, "__tablename__", None):
+            tables.append(table_class)
+    return sorted(tables, key=lambda table_class: table_class.__tablename__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Emit CREATE INDEX DDL for the indexes declared on Tables")
+    parser.add_argument("--package", default="core", help="package whose Table classes are scanned")
+    parser.add_argument("--missing", action="store_true", help="only emit indexes the database doesn't have")
+    parser.add_argument("--schema", default="public")
+    args = parser.parse_args(argv)
+
+    missing_count = 0
+    for table_class in find_tables(args.package):
+        if args.missing:
+            indexes = missing_indexes(table_class, args.schema)
+            missing_count += len(indexes)
+        else:
+            indexes = declared_indexes(table_class)
+        for index in indexes:
+            print(create_index_statement(table_class, index))
+
+    if args.missing:
+        print(f"-- {missing_count} missing index(es)", file=sys.stderr)
+        return 1 if missing_count else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
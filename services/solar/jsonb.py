@@ -0,0 +1,57 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains the JSON encoder used for Table JSON columns. Every pool connection is opened with the `adapters`
+# context below, so the Jsonb values built by Table._prepare_value are dumped by it instead of psycopg's default
+# json.dumps. When orjson is installed it is used for both directions: it serializes straight to bytes (no
+# intermediate str for psycopg to encode) and handles UUIDs and datetimes natively. Without it the stdlib is used.
+#
+# set_dumps/set_loads swap in another encoder; call them before the pools are created, since connections copy the
+# context when they open.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from typing import Any, Callable, Union
+
+import psycopg
+from psycopg.adapt import AdaptersMap
+from psycopg.types.json import set_json_dumps, set_json_loads
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+######################################################################################################################
+# Encoders
+######################################################################################################################
+
+
+adapters = AdaptersMap(psycopg.adapters)  # adapt context of every pool connection, see pool._connection_kwargs
+
+
+def orjson_dumps(obj: Any) -> bytes:
+    # Like json.dumps, accept non-string dict keys instead of raising
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def set_dumps(dumps: Callable[[Any], Union[str, bytes]]):
+    """Encode JSON parameters of pool connections with dumps, which may return str or bytes"""
+    set_json_dumps(dumps, adapters)
+
+
+def set_loads(loads: Callable[[Union[str, bytes]], Any]):
+    """Decode json/jsonb results of pool connections with loads"""
+    set_json_loads(loads, adapters)
+
+
+if ORJSON_AVAILABLE:
+    set_dumps(orjson_dumps)
+    set_loads(orjson.loads)
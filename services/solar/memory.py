@@ -0,0 +1,472 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains MemoryBackend, a Table backend that keeps every table in an in-process SQLite database instead of
+# Postgres. Statements still go through the whole Table code path (pydantic dumps and validation, statement building,
+# JSON encoding, caches, metrics), so it separates the Python-side cost of a request from database latency, and lets
+# the service layer run on a laptop without NEON_CONN_URL:
+#
+#     set_backend(MemoryBackend())          # or SOLAR_TABLE_BACKEND=memory
+#
+# Tables are created on first use from the Table classes (with their declared indexes), so only the schema the models
+# describe exists. Statements are translated from the Postgres dialect the core modules use: %s/%(name)s placeholders,
+# `= ANY(%s)` lookups, ::casts, NOW(), ILIKE, row-value comparisons, ON CONFLICT upserts and RETURNING. UUIDs,
+# timestamps, booleans and JSON/array columns come back as the same Python types psycopg returns. Anything SQLite
+# can't run (COPY, Postgres-only functions, EXPLAIN ANALYZE) raises psycopg.ProgrammingError. Constraint violations
+# raise psycopg's IntegrityError/UniqueViolation, so callers handle them as they would in production.
+#
+# All connections share one SQLite connection and take turns using it, so this measures per-request cost, not
+# database concurrency.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Type, Union, get_args, get_origin
+
+import psycopg
+from psycopg import errors
+from psycopg.types.json import Json, Jsonb
+from pydantic import BaseModel
+
+from .indexes import declared_indexes
+from .table import Backend, Table
+
+import asyncio
+import itertools
+import json
+import logging
+import re
+import sqlite3
+import threading
+import types
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+######################################################################################################################
+# Types
+######################################################################################################################
+# SQLite picks a column's converter by the first word of its declared type, and its affinity by the rest
+
+
+sqlite3.register_converter("SOLAR_UUID", lambda value: uuid.UUID(value.decode()))
+sqlite3.register_converter("SOLAR_TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("SOLAR_DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("SOLAR_BOOL", lambda value: bool(int(value)))
+sqlite3.register_converter("SOLAR_JSON", json.loads)
+
+
+def _column_type(annotation, json_column: bool) -> str:
+    """SQLite column type for a Table field annotation"""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            annotation = args[0]
+    if json_column or annotation in (list, dict, tuple) or get_origin(annotation) in (list, dict, tuple):
+        return "SOLAR_JSON TEXT"
+    if annotation is uuid.UUID:
+        return "SOLAR_UUID TEXT"
+    if annotation is datetime:
+        return "SOLAR_TIMESTAMP TEXT"
+    if annotation is date:
+        return "SOLAR_DATE TEXT"
+    if annotation is bool:
+        return "SOLAR_BOOL INTEGER"
+    if annotation is int:
+        return "INTEGER"
+    if annotation is float:
+        return "REAL"
+    return "TEXT"
+
+
+def _json_default(value):
+    if isinstance(value, (Json, Jsonb)):
+        return value.obj
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _adapt(value):
+    """Turn a parameter into a value sqlite3 can bind, stored the way the column converters read it back"""
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return value
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    # Jsonb wrappers, dicts, and lists for array columns and = ANY(...) lookups
+    return json.dumps(value, default=_json_default)
+
+
+def _adapt_params(params):
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {name: _adapt(value) for name, value in params.items()}
+    return [_adapt(value) for value in params]
+
+
+######################################################################################################################
+# Statement Translation
+######################################################################################################################
+
+
+_ANY = re.compile(r"=\s*ANY\s*\(\s*(%\(\w+\)[sb]|%[sb])\s*\)", re.I)
+_NAMED_PLACEHOLDER = re.compile(r"%\((\w+)\)[sb]")
+_POSITIONAL_PLACEHOLDER = re.compile(r"%[sb]")
+_CAST = re.compile(r"::\w+(\[\])?")
+_LOCKING_CLAUSE = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b", re.I)
+_TRUNCATE = re.compile(r"^\s*TRUNCATE\s+(TABLE\s+)?", re.I)
+
+
+@lru_cache(maxsize=1024)
+def translate(sql_statement: str) -> str:
+    """Rewrite a statement from the Postgres dialect Tables use into SQLite's"""
+    statement = _ANY.sub(r"IN (SELECT value FROM json_each(\1))", sql_statement)
+    statement = _NAMED_PLACEHOLDER.sub(r":\1", statement)
+    statement = _POSITIONAL_PLACEHOLDER.sub("?", statement)
+    statement = statement.replace("%%", "%")
+    statement = _CAST.sub("", statement)
+    statement = _LOCKING_CLAUSE.sub("", statement)
+    statement = _TRUNCATE.sub("DELETE FROM ", statement)
+    statement = re.sub(r"\bNOW\(\)", "CURRENT_TIMESTAMP", statement, flags=re.I)
+    statement = re.sub(r"\bGREATEST\(", "MAX(", statement, flags=re.I)
+    statement = re.sub(r"\bLEAST\(", "MIN(", statement, flags=re.I)
+    return re.sub(r"\bILIKE\b", "LIKE", statement, flags=re.I)
+
+
+######################################################################################################################
+# Connections
+######################################################################################################################
+
+
+def _dict_row(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class _Pipeline:
+    """Statements already run one at a time, so there is nothing to flush"""
+
+    def sync(self):
+        pass
+
+
+class _AsyncPipeline:
+    async def sync(self):
+        pass
+
+
+class MemoryCursor:
+    """The part of psycopg's Cursor that Table uses; results are fetched eagerly"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+        self._rows: List[Dict[str, Any]] = []
+        self.description = None
+        self.rowcount = -1
+        self.itersize = 100
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql_statement: str, params=None, prepare: Optional[bool] = None):
+        statement = translate(sql_statement)
+        try:
+            cursor = self._db.execute(statement, _adapt_params(params))
+            self.description = cursor.description
+            self._rows = cursor.fetchall() if cursor.description is not None else []
+            self.rowcount = len(self._rows) if cursor.description is not None else cursor.rowcount
+        except sqlite3.IntegrityError as e:
+            error_class = errors.UniqueViolation if "UNIQUE" in str(e) else psycopg.IntegrityError
+            raise error_class(str(e)) from e
+        except sqlite3.Error as e:
+            raise psycopg.ProgrammingError(f"{e} (memory backend statement: {statement.strip()})") from e
+        return self
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        return self._rows.pop(0) if self._rows else None
+
+    def copy(self, statement: str):
+        raise psycopg.NotSupportedError("COPY is not supported by the memory backend, use sync_many(copy=False)")
+
+
+class MemoryConnection:
+    """The part of psycopg's Connection that Table uses"""
+
+    def __init__(self, backend: "MemoryBackend"):
+        self._backend = backend
+
+    def cursor(self, name: Optional[str] = None) -> MemoryCursor:
+        return MemoryCursor(self._backend._db)
+
+    def execute(self, sql_statement: str, params=None, prepare: Optional[bool] = None) -> MemoryCursor:
+        return self.cursor().execute(sql_statement, params, prepare=prepare)
+
+    @contextmanager
+    def transaction(self):
+        # Savepoints nest, and the outermost one begins and commits a transaction
+        savepoint = f"solar_{next(self._backend._savepoints)}"
+        db = self._backend._db
+        db.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield
+        except BaseException:
+            db.execute(f"ROLLBACK TO {savepoint}")
+            db.execute(f"RELEASE {savepoint}")
+            raise
+        db.execute(f"RELEASE {savepoint}")
+
+    @contextmanager
+    def pipeline(self):
+        yield _Pipeline()
+
+
+class AsyncMemoryCursor:
+    """Awaitable twin of MemoryCursor; SQLite in memory never blocks, so nothing is offloaded to a thread"""
+
+    def __init__(self, cursor: MemoryCursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def itersize(self) -> int:
+        return self._cursor.itersize
+
+    @itersize.setter
+    def itersize(self, value: int):
+        self._cursor.itersize = value
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def __aiter__(self):
+        for row in self._cursor.fetchall():
+            yield row
+
+    async def execute(self, sql_statement: str, params=None, prepare: Optional[bool] = None):
+        self._cursor.execute(sql_statement, params, prepare=prepare)
+        return self
+
+    async def fetchall(self) -> List[Dict[str, Any]]:
+        return self._cursor.fetchall()
+
+    async def fetchone(self) -> Optional[Dict[str, Any]]:
+        return self._cursor.fetchone()
+
+    def copy(self, statement: str):
+        return self._cursor.copy(statement)
+
+
+class AsyncMemoryConnection:
+    def __init__(self, backend: "MemoryBackend"):
+        self._connection = MemoryConnection(backend)
+
+    def cursor(self, name: Optional[str] = None) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self._connection.cursor(name))
+
+    async def execute(self, sql_statement: str, params=None, prepare: Optional[bool] = None):
+        return AsyncMemoryCursor(self._connection.execute(sql_statement, params, prepare=prepare))
+
+    @asynccontextmanager
+    async def transaction(self):
+        with self._connection.transaction():
+            yield
+
+    @asynccontextmanager
+    async def pipeline(self):
+        yield _AsyncPipeline()
+
+
+######################################################################################################################
+# Backend
+######################################################################################################################
+
+
+class _Gate:
+    """
+    Hands the shared SQLite connection to one owner at a time: a thread, or an asyncio task (which may hold it across
+    awaits, e.g. inside Table.atransaction). Re-entrant, since a Table call inside a transaction block checks out a
+    connection again.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._owner = None
+        self._depth = 0
+
+    @staticmethod
+    def _current_owner():
+        try:
+            return asyncio.current_task() or threading.get_ident()
+        except RuntimeError:
+            return threading.get_ident()
+
+    def _try_acquire(self, owner) -> bool:
+        if self._owner is not None and self._owner != owner:
+            return False
+        self._owner = owner
+        self._depth += 1
+        return True
+
+    def acquire(self):
+        owner = self._current_owner()
+        with self._condition:
+            while not self._try_acquire(owner):
+                self._condition.wait()
+
+    async def aacquire(self):
+        owner = self._current_owner()
+        while True:
+            with self._condition:
+                if self._try_acquire(owner):
+                    return
+            # Held by a thread or by another task that is awaiting something, check back shortly
+            await asyncio.sleep(0.0005)
+
+    def release(self):
+        with self._condition:
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+
+class _MemoryPool:
+    def __init__(self, backend: "MemoryBackend"):
+        self._backend = backend
+
+    @contextmanager
+    def connection(self):
+        self._backend._gate.acquire()
+        try:
+            yield MemoryConnection(self._backend)
+        finally:
+            self._backend._gate.release()
+
+
+class _AsyncMemoryPool:
+    def __init__(self, backend: "MemoryBackend"):
+        self._backend = backend
+
+    @asynccontextmanager
+    async def connection(self):
+        await self._backend._gate.aacquire()
+        try:
+            yield AsyncMemoryConnection(self._backend)
+        finally:
+            self._backend._gate.release()
+
+
+def _table_classes(base: Type[Table] = Table):
+    for subclass in base.__subclasses__():
+        yield subclass
+        yield from _table_classes(subclass)
+
+
+class MemoryBackend(Backend):
+    """Keeps every Table in one in-process SQLite database, see the top of this file"""
+
+    def __init__(self):
+        self._db = sqlite3.connect(
+            ":memory:", check_same_thread=False, isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self._db.row_factory = _dict_row
+        self._gate = _Gate()
+        self._savepoints = itertools.count()
+        self._created: Set[type] = set()
+        self._table_names: Set[str] = set()
+        self._pool = _MemoryPool(self)
+        self._async_pool = _AsyncMemoryPool(self)
+
+    def get_pool(self, table_class: Type[Table], schema_name: str) -> _MemoryPool:
+        self._create_tables()
+        return self._pool
+
+    async def get_async_pool(self, table_class: Type[Table], schema_name: str) -> _AsyncMemoryPool:
+        self._create_tables()
+        return self._async_pool
+
+    def reset(self):
+        """Delete every row and empty the Table caches, e.g. between benchmark rounds or tests"""
+        with self._pool.connection():
+            for table_name in self._table_names:
+                self._db.execute(f"DELETE FROM {table_name}")
+        for table_class in self._created:
+            if table_class.__cache__ is not None:
+                table_class.__cache__.clear()
+
+    def _create_tables(self):
+        """Create the tables of Table classes defined since the last call; raw SQL may join any of them"""
+        classes = [table_class for table_class in _table_classes() if table_class not in self._created]
+        if not classes:
+            return
+        with self._pool.connection():
+            for table_class in classes:
+                self._created.add(table_class)
+                table_name = table_class.__tablename__
+                if table_name is None or table_name in self._table_names:
+                    continue
+                try:
+                    plan = table_class._get_plan()
+                except ValueError:
+                    continue  # abstract or incomplete Tables can't be synced either
+                self._create_table(table_class, plan)
+                self._table_names.add(table_name)
+
+    def _create_table(self, table_class: Type[Table], plan):
+        columns = []
+        for name in plan.columns:
+            column = f"{name} {_column_type(table_class.model_fields[name].annotation, name in plan.json_columns)}"
+            if name == plan.primary_key:
+                column += " PRIMARY KEY"
+            columns.append(column)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {plan.table_name} ({', '.join(columns)})")
+
+        for index in declared_indexes(table_class):
+            unique = "UNIQUE " if index.unique else ""
+            where = f" WHERE {translate(index.where)}" if index.where else ""
+            statement = (
+                f"CREATE {unique}INDEX IF NOT EXISTS {index.name} "
+                f"ON {plan.table_name} ({', '.join(index.columns)}){where}"
+            )
+            try:
+                self._db.execute(statement)
+            except sqlite3.Error as e:
+                logger.warning(f"Memory backend skipped index {index.name}: {str(e)}")
@@ -0,0 +1,213 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains the in-process query statistics kept by Table.sql/asql. Statements are grouped by fingerprint
+# (the SQL with literals and placeholders replaced by ?), and each fingerprint keeps a latency histogram, row counts,
+# and the split between waiting for a pool connection and executing. Statements slower than
+# Config.slow_query_threshold_ms are logged, and with Config.slow_query_explain the EXPLAIN (ANALYZE, BUFFERS) plan of
+# slow read-only statements is captured as well, at most once per EXPLAIN_INTERVAL per fingerprint and on a background
+# thread, so the request that was already slow doesn't wait for its statement to run again. query_stats() returns a
+# snapshot, e.g. for an API route.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import config
+
+import logging
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+EXPLAIN_INTERVAL = 300  # seconds between EXPLAIN captures of the same fingerprint
+EXPLAIN_QUEUE_SIZE = 16  # slow statements waiting for their plan; more are dropped until the explain thread catches up
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_WHITESPACE = re.compile(r"\s+")
+
+
+######################################################################################################################
+# Fingerprints
+######################################################################################################################
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql_statement: str) -> str:
+    """Normalize a statement so executions that differ only in their values are grouped together"""
+    statement = _STRING_LITERAL.sub("?", sql_statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+######################################################################################################################
+# Statistics
+######################################################################################################################
+
+
+@dataclass
+class QueryStats:
+    """Running totals for one fingerprint"""
+
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    slow_calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    pool_wait_ms: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    last_plan: Optional[str] = None
+    last_explained: float = 0.0
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the given fraction of calls (None if unbounded or no calls)"""
+        if not self.calls:
+            return None
+        target = fraction * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        execution_ms = self.total_ms - self.pool_wait_ms
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "slow_calls": self.slow_calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else None,
+            "max_ms": round(self.max_ms, 3),
+            "pool_wait_ms": round(self.pool_wait_ms, 3),
+            "execution_ms": round(execution_ms, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "histogram": dict(zip([f"<={bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"], self.buckets)),
+            "last_plan": self.last_plan,
+        }
+
+
+_stats: Dict[str, QueryStats] = {}
+_stats_lock = threading.Lock()
+
+
+def record_query(sql_statement: str, pool_wait: float, execution: float, rows: int) -> bool:
+    """Record one successful execution (times in seconds) and return whether it was slow"""
+    key = fingerprint(sql_statement)
+    total_ms = (pool_wait + execution) * 1000
+    slow = total_ms >= config.slow_query_threshold_ms()
+
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = QueryStats()
+        stats.calls += 1
+        stats.rows += max(rows, 0)
+        stats.total_ms += total_ms
+        stats.pool_wait_ms += pool_wait * 1000
+        stats.max_ms = max(stats.max_ms, total_ms)
+        stats.buckets[bisect_left(LATENCY_BUCKETS_MS, total_ms)] += 1
+        if slow:
+            stats.slow_calls += 1
+
+    if slow:
+        logger.warning(
+            f"Slow query ({total_ms:.1f} ms, {pool_wait * 1000:.1f} ms waiting for a connection, {rows} rows): {key}"
+        )
+    return slow
+
+
+def record_error(sql_statement: str):
+    key = fingerprint(sql_statement)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = QueryStats()
+        stats.errors += 1
+
+
+def explain_due(sql_statement: str) -> bool:
+    """Whether the plan of a slow statement should be captured now; at most once per EXPLAIN_INTERVAL per fingerprint"""
+    if not config.slow_query_explain():
+        return False
+    now = time.monotonic()
+    with _stats_lock:
+        stats = _stats.get(fingerprint(sql_statement))
+        if stats is None or (stats.last_explained and now - stats.last_explained < EXPLAIN_INTERVAL):
+            return False
+        stats.last_explained = now
+        return True
+
+
+_explain_queue: "queue.Queue[Tuple[str, Callable[[], str]]]" = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+_explain_thread: Optional[threading.Thread] = None
+
+
+def schedule_explain(sql_statement: str, explain: Callable[[], str]) -> bool:
+    """
+    Capture the plan of a slow statement off the request path: a background thread calls explain(), which runs the
+    EXPLAIN on a connection of its own, and records the plan it returns. False when the capture had to be dropped.
+    """
+    global _explain_thread
+    try:
+        _explain_queue.put_nowait((sql_statement, explain))
+    except queue.Full:
+        logger.info(f"Skipped the plan of slow query {fingerprint(sql_statement)}, too many are waiting")
+        return False
+    with _stats_lock:
+        if _explain_thread is None or not _explain_thread.is_alive():
+            _explain_thread = threading.Thread(target=_run_explains, name="solar-explain", daemon=True)
+            _explain_thread.start()
+    return True
+
+
+def _run_explains():
+    while True:
+        sql_statement, explain = _explain_queue.get()
+        try:
+            record_plan(sql_statement, explain())
+        except Exception as e:
+            logger.warning(f"Failed to capture the plan of a slow query: {str(e)}")
+        finally:
+            _explain_queue.task_done()
+
+
+def record_plan(sql_statement: str, plan: str):
+    key = fingerprint(sql_statement)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is not None:
+            stats.last_plan = plan
+    logger.warning(f"Plan of slow query {key}:\n{plan}")
+
+
+def query_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of the statistics by fingerprint, the statements with the most total time first"""
+    with _stats_lock:
+        items = sorted(_stats.items(), key=lambda item: item[1].total_ms, reverse=True)
+        return {key: stats.snapshot() for key, stats in items}
+
+
+def reset_query_stats():
+    with _stats_lock:
+        _stats.clear()
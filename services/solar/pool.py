@@ -0,0 +1,697 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains the Postgres connection pool management used by the Table class. Pools are created lazily, one
+# per (PG key, schema) pair (see Config.get_all_pg_connection_strings), in both a blocking flavor (ConnectionPool)
+# and an asyncio flavor (AsyncConnectionPool) so that async request handlers can await the database without a
+# worker thread. Async pools are kept per event loop, so code that runs several loops (tests, worker threads) gets
+# pools of its own loop. Each pool pins its search_path through the libpq `options` startup parameter, so a query in
+# any schema costs a single round-trip and connections never need a SET after checkout.
+#
+# Connection poolers in front of Postgres (PgBouncer, Neon's -pooler endpoints) reject or ignore startup options, so
+# for those hosts (see Config.pg_search_path_mode) pools instead run SET search_path once on every new connection.
+# That SET is a session setting: a transaction-mode pooler may run later statements on another server connection
+# that does not have it, unless the pooler tracks search_path (PgBouncer's track_extra_parameters). Tables outside
+# the default auth/public search_path should use a direct (non-pooler) connection string there.
+#
+# A PG key may also have read replicas (Config.get_pg_replica_connection_strings). Their pools are keyed by replica
+# index, and choose_replica picks one round-robin among those whose measured replication lag is within
+# Config.pg_replica_max_lag, returning None (i.e. use the primary) when none qualifies.
+#
+# Health checks stay off the request path: a background monitor (a daemon thread for blocking pools, a task on the
+# event loop for async pools) checks each pool on its own jittered schedule, replaces only the pools that fail, and
+# refreshes replica lag. Callers retry transient errors with retry_delay's backoff instead of resetting pools.
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+import asyncio
+import itertools
+import random
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from psycopg import errors, OperationalError
+from psycopg.conninfo import conninfo_to_dict
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from psycopg import AsyncConnection
+
+from .config import config, ConfigurationError
+from .jsonb import adapters
+
+import logging
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration constants, sizes come from Config.pg_pool_min_size/pg_pool_max_size
+DEFAULT_TIMEOUT = 30  # seconds
+DEFAULT_KEEPALIVE = 60  # seconds
+DEFAULT_RECONNECT_TIMEOUT = 5  # seconds
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.1  # seconds, doubled on every attempt
+DEFAULT_RETRY_BACKOFF_CAP = 2  # seconds
+
+PoolKey = Tuple[str, str, Optional[int]]  # (PG key, schema, replica index or None for the primary)
+
+_pools: Dict[PoolKey, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+_monitor_interval = 5  # seconds between health monitor passes
+_pool_check_interval = 300  # Check each pool's health about every 5 minutes
+_pool_next_check: Dict[PoolKey, float] = {}
+_monitor_thread: Optional[threading.Thread] = None
+_monitor_stop = threading.Event()
+
+# Async pools, their lock and their health monitor belong to the event loop that created them, see _loop_pools
+_async_loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPools]" = weakref.WeakKeyDictionary()
+_async_loops_lock = threading.Lock()
+
+# Statements prepared on every new connection of a PG key's pools, see register_hot_statement
+_hot_statements: Dict[str, List[Tuple[str, Any, bool]]] = {}  # -> [(statement, params, write)]
+
+_replica_check_interval = 10  # seconds between replication lag measurements of a replica
+_replica_lag: Dict[Tuple[str, int], Tuple[float, Optional[float]]] = {}  # -> (checked at, lag or None if down)
+_replica_round_robin = itertools.count()
+
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag
+"""
+
+
+def _pool_schema(schema_name: str) -> str:
+    """public and auth share the default search_path, so they share a pool"""
+    if schema_name == "public" or schema_name == "auth":
+        return "public"
+    return schema_name
+
+
+def _search_path_options(pg_conn_string: str, schema_name: str) -> str:
+    """Build the libpq `options` value pinning search_path, keeping any options already in the connection string"""
+    search_path = "auth,public" if schema_name == "public" else schema_name
+    option = f"-c search_path={search_path}"
+    existing = conninfo_to_dict(pg_conn_string).get("options")
+    return f"{existing} {option}" if existing else option
+
+
+def _search_path_by_set(pg_conn_string: str) -> bool:
+    """Whether pools of this connection string set search_path with a SET instead of startup options"""
+    mode = config.pg_search_path_mode()
+    if mode != "auto":
+        return mode == "set"
+    hosts = (conninfo_to_dict(pg_conn_string).get("host") or "").split(",")
+    return any(host.split(".")[0].endswith("-pooler") for host in hosts)
+
+
+def _connection_kwargs(pg_conn_string: str, schema_name: str) -> Dict:
+    kwargs = {
+        "row_factory": dict_row,
+        # JSON columns are encoded with solar.jsonb's dumps (orjson when installed)
+        "context": adapters,
+        # Table.sql statements run on their own without BEGIN/COMMIT round-trips, multi-statement work opens an
+        # explicit conn.transaction()
+        "autocommit": True,
+        "keepalives": 1,
+        "keepalives_idle": DEFAULT_KEEPALIVE,
+        "keepalives_interval": DEFAULT_KEEPALIVE,
+        "keepalives_count": 3,
+    }
+    if not _search_path_by_set(pg_conn_string):
+        kwargs["options"] = _search_path_options(pg_conn_string, schema_name)
+    return kwargs
+
+
+def _configure_search_path(pg_conn_string: str, schema_name: str) -> Optional[str]:
+    """The SET a pool's configure hook runs on new connections, None when startup options pin search_path"""
+    if not _search_path_by_set(pg_conn_string):
+        return None
+    return "SET search_path TO auth, public" if schema_name == "public" else f"SET search_path TO {schema_name}"
+
+
+def _get_pg_conn_string(pg_key: str, replica: Optional[int] = None) -> str:
+    if replica is None:
+        return config.get_pg_connection_string(pg_key)
+    replicas = config.get_pg_replica_connection_strings(pg_key)
+    if replica >= len(replicas):
+        raise ConfigurationError(f"No replica {replica} configured for {pg_key}")
+    return replicas[replica]
+
+
+def _pool_name(pg_key: str, schema_name: str, replica: Optional[int]) -> str:
+    name = f"{pg_key}:{schema_name}"
+    return name if replica is None else f"{name}:replica{replica}"
+
+
+def _replica_lag_is_stale(pg_key: str, replica: int) -> bool:
+    checked_at, _ = _replica_lag.get((pg_key, replica), (0, None))
+    return time.time() - checked_at > _replica_check_interval
+
+
+def _pick_replica(pg_key: str) -> Optional[int]:
+    """Round-robin over the replicas whose last measured lag is acceptable"""
+    max_lag = config.pg_replica_max_lag()
+    candidates = [
+        replica
+        for (key, replica), (_, lag) in _replica_lag.items()
+        if key == pg_key and lag is not None and lag <= max_lag
+    ]
+    if not candidates:
+        return None
+    return sorted(candidates)[next(_replica_round_robin) % len(candidates)]
+
+
+def mark_replica_unavailable(pg_key: str, replica: int):
+    """Take a replica out of rotation until its next lag measurement, e.g. after a failed query"""
+    _replica_lag[(pg_key, replica)] = (time.time(), None)
+
+
+def _replica_indexes(pg_key: str) -> range:
+    return range(len(config.get_pg_replica_connection_strings(pg_key)))
+
+
+def _next_check_time() -> float:
+    """Spread pool checks out so pools created together aren't all checked in the same monitor pass"""
+    return time.monotonic() + _pool_check_interval * random.uniform(0.75, 1.25)
+
+
+def is_transient_error(e: Exception) -> bool:
+    """Whether a failed statement is worth retrying: lost connections, pool timeouts, serialization failures and
+    deadlocks. Statement timeouts and errors in the statement itself (constraints, syntax, ...) are not."""
+    return isinstance(e, OperationalError) and not isinstance(e, errors.QueryCanceled)
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so workers that failed together don't retry in lockstep"""
+    return random.uniform(0, min(DEFAULT_RETRY_BACKOFF_CAP, DEFAULT_RETRY_BACKOFF * 2**attempt))
+
+
+class RetryPolicy:
+    """
+    The retry decisions of one database operation over its attempts, shared by Table's _run, _arun, stream and
+    astream: only transient errors are retried, a failing replica falls back to the primary and the primary backs off.
+    """
+
+    def __init__(self, pg_key: str, replica: Optional[int], max_retries: int):
+        self.pg_key = pg_key
+        self.replica = replica
+        self.max_retries = max_retries
+        self.attempt = 0
+
+    def next_delay(self, e: Exception) -> Optional[float]:
+        """
+        Decide on a failed attempt. Raises e when it isn't worth retrying and RuntimeError once max_retries attempts
+        failed. Otherwise returns how long to back off before the next attempt, or None when the caller should
+        retry right away on the primary's pool (self.replica is then None).
+        """
+        # Errors in the statement itself would fail again, so only connection-level failures are retried
+        if not is_transient_error(e):
+            raise e
+        self.attempt += 1
+        logger.warning(f"Database operation failed (attempt {self.attempt}/{self.max_retries}): {str(e)}")
+
+        if self.attempt >= self.max_retries:
+            msg = f"Database operation failed after {self.max_retries} attempts"
+            logger.error(msg)
+            raise RuntimeError(msg) from e
+        if self.replica is not None:
+            # Fall back to the primary instead of refreshing the replica's pool
+            mark_replica_unavailable(self.pg_key, self.replica)
+            self.replica = None
+            return None
+        # Back off instead of resetting the pool, which would throw away its warm connections; the pool drops broken
+        # connections itself and the health monitor replaces a broken pool
+        return retry_delay(self.attempt)
+
+
+def register_hot_statement(pg_key: str, sql_statement: str, params: Any, write: bool = False):
+    """
+    Prepare a statement on every connection the pools of pg_key open from now on, so its first real execution
+    skips parsing and planning. params must have the types real calls use, since psycopg keys prepared statements
+    by query and parameter types; the statement is executed once with them and should be cheap. Writes are only
+    prepared on primaries, in registration order within one transaction that is rolled back, so a sample row written
+    by one can be referenced by the next; psycopg only keeps statements that ran without error.
+    """
+    statements = _hot_statements.setdefault(pg_key, [])
+    if all(statement != sql_statement for statement, _, _ in statements):
+        statements.append((sql_statement, params, write))
+
+
+######################################################################################################################
+# Blocking Pools
+######################################################################################################################
+
+
+def _configure_connection(pg_key: str, search_path: Optional[str], primary: bool, conn):
+    if search_path is not None:
+        # A failure here fails the connection: it would otherwise run against the wrong schema
+        conn.execute(search_path)
+    _prepare_hot_statements(pg_key, conn, primary)
+
+
+def _prepare_hot_statements(pg_key: str, conn, primary: bool = True):
+    statements = _hot_statements.get(pg_key, ())
+    for sql_statement, params, write in statements:
+        if not write:
+            _prepare_hot_statement(pg_key, conn, sql_statement, params)
+    writes = [(sql_statement, params) for sql_statement, params, write in statements if write]
+    if writes and primary:
+        # Prepared statements outlive the rollback, the sample rows don't
+        with conn.transaction(force_rollback=True):
+            for sql_statement, params in writes:
+                _prepare_hot_statement(pg_key, conn, sql_statement, params, savepoint=True)
+
+
+def _prepare_hot_statement(pg_key: str, conn, sql_statement: str, params: Any, savepoint: bool = False):
+    try:
+        # A savepoint keeps a failed write from aborting the ones after it
+        with conn.transaction() if savepoint else nullcontext():
+            conn.execute(sql_statement, params, prepare=True)
+    except Exception as e:
+        # Never fail the connection over it, the pool would retry it forever
+        logger.warning(f"Failed to prepare hot statement on {pg_key}: {str(e)}")
+
+
+def is_connection_alive(conn):
+    """Test if a database connection is still alive and usable"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            return True
+    except Exception as e:
+        logger.warning(f"Connection health check failed: {str(e)}")
+        return False
+
+
+def validate_pool(pool: ConnectionPool, pool_name: str) -> bool:
+    """Validate the entire pool's health and attempt to fix issues"""
+    try:
+        # Drop broken idle connections, then test one from the pool
+        pool.check()
+        with pool.connection(timeout=DEFAULT_RECONNECT_TIMEOUT) as conn:
+            if not is_connection_alive(conn):
+                logger.warning(f"Pool {pool_name} failed health check")
+                return False
+        return True
+    except Exception as e:
+        logger.error(f"Pool {pool_name} validation failed: {str(e)}")
+        return False
+
+
+def _create_pool(pg_key: str, schema_name: str, replica: Optional[int] = None) -> ConnectionPool:
+    pg_conn_string = _get_pg_conn_string(pg_key, replica)
+    name = _pool_name(pg_key, schema_name, replica)
+    try:
+        pool = ConnectionPool(
+            pg_conn_string,
+            min_size=config.pg_pool_min_size(),
+            max_size=config.pg_pool_max_size(),
+            timeout=DEFAULT_TIMEOUT,
+            kwargs=_connection_kwargs(pg_conn_string, schema_name),
+            configure=partial(
+                _configure_connection, pg_key, _configure_search_path(pg_conn_string, schema_name), replica is None
+            ),
+            name=name,
+        )
+        logger.info(f"Created new connection pool {name}")
+        return pool
+    except Exception as e:
+        logger.error(f"Failed to create pool {name}: {str(e)}")
+        raise
+
+
+def _retire_pool(pool: ConnectionPool):
+    """Close a replaced pool; connections still checked out are closed as they are returned"""
+    try:
+        pool.close(timeout=DEFAULT_RECONNECT_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Failed to close pool {pool.name}: {str(e)}")
+
+
+def get_pool(
+    pg_key: str,
+    schema_name: str = "public",
+    reset: bool = False,
+    replica: Optional[int] = None,
+) -> ConnectionPool:
+    """Get or create the connection pool for a PG key, schema and replica. Health is checked by the monitor."""
+    pool_key = (pg_key, _pool_schema(schema_name), replica)
+    old_pool = None
+
+    with _pools_lock:
+        if reset:
+            old_pool = _pools.pop(pool_key, None)
+
+        pool = _pools.get(pool_key)
+        if pool is None:
+            pool = _pools[pool_key] = _create_pool(*pool_key)
+            _pool_next_check[pool_key] = _next_check_time()
+            _start_health_monitor()
+
+    if old_pool is not None:
+        _retire_pool(old_pool)
+    return pool
+
+
+def warm_pools(pg_keys: Iterable[str], schema_name: str = "public", timeout: float = DEFAULT_TIMEOUT):
+    """
+    Create the pools of pg_keys and their replicas, and wait until each holds its min_size connections. Raises
+    RuntimeError when a primary's pool doesn't get there; a replica that doesn't is taken out of rotation instead.
+    """
+    failed = []
+    for pg_key in pg_keys:
+        for replica in [None, *_replica_indexes(pg_key)]:
+            pool = get_pool(pg_key, schema_name, replica=replica)
+            try:
+                pool.wait(timeout=timeout)
+                logger.info(f"Pool {pool.name} is warm")
+            except Exception as e:
+                logger.error(f"Pool {pool.name} failed to warm up: {str(e)}")
+                _warm_up_failed(failed, pool.name, pg_key, replica)
+    if failed:
+        raise RuntimeError(f"Pools failed to warm up: {', '.join(failed)}")
+
+
+def _warm_up_failed(failed: List[str], pool_name: str, pg_key: str, replica: Optional[int]):
+    """Record a pool that failed to warm up: primaries fail the warm-up, replicas are left out until they recover"""
+    if replica is None:
+        failed.append(pool_name)
+    else:
+        mark_replica_unavailable(pg_key, replica)
+
+
+def _measure_replica_lag(pg_key: str, replica: int):
+    try:
+        with get_pool(pg_key, replica=replica).connection(timeout=DEFAULT_RECONNECT_TIMEOUT) as conn:
+            lag = float(conn.execute(REPLICA_LAG_QUERY).fetchone()["lag"])
+    except Exception as e:
+        logger.warning(f"Replica {replica} of {pg_key} is unavailable: {str(e)}")
+        lag = None
+    if lag is not None and lag > config.pg_replica_max_lag():
+        logger.warning(f"Replica {replica} of {pg_key} is {lag:.1f}s behind, reading from the primary")
+    _replica_lag[(pg_key, replica)] = (time.time(), lag)
+
+
+def choose_replica(pg_key: str) -> Optional[int]:
+    """Pick a replica for a read-only query on pg_key, or None to use the primary"""
+    # Only the first query measures inline, after that the health monitor keeps the lag fresh
+    for replica in _replica_indexes(pg_key):
+        if (pg_key, replica) not in _replica_lag:
+            _measure_replica_lag(pg_key, replica)
+    return _pick_replica(pg_key)
+
+
+def _replace_broken_pool(pool_key: PoolKey, pool: ConnectionPool):
+    """Drop a pool that failed its health check, unless it was already replaced; get_pool recreates it on demand"""
+    with _pools_lock:
+        if _pools.get(pool_key) is not pool:
+            return
+        del _pools[pool_key]
+        _pool_next_check.pop(pool_key, None)
+    logger.warning(f"Pool {pool.name} failed health check, will be recreated")
+    _retire_pool(pool)
+
+
+def check_pools():
+    """One health monitor pass: validate the pools that are due, and refresh stale replica lag measurements"""
+    now = time.monotonic()
+    with _pools_lock:
+        due = [(key, pool) for key, pool in _pools.items() if _pool_next_check.get(key, 0) <= now]
+        pg_keys = {pg_key for pg_key, _, _ in _pools}
+
+    for pool_key, pool in due:
+        _pool_next_check[pool_key] = _next_check_time()
+        if not validate_pool(pool, pool.name):
+            _replace_broken_pool(pool_key, pool)
+
+    for pg_key in pg_keys:
+        for replica in _replica_indexes(pg_key):
+            if _replica_lag_is_stale(pg_key, replica):
+                _measure_replica_lag(pg_key, replica)
+
+
+def _run_health_monitor():
+    while not _monitor_stop.wait(_monitor_interval):
+        try:
+            check_pools()
+        except Exception as e:
+            logger.error(f"Pool health monitor pass failed: {str(e)}")
+
+
+def _start_health_monitor():
+    """Start the monitor thread if it isn't running; called with _pools_lock held when a pool is created"""
+    global _monitor_thread
+    if _monitor_thread is not None and _monitor_thread.is_alive():
+        return
+    _monitor_stop.clear()
+    _monitor_thread = threading.Thread(target=_run_health_monitor, name="solar-pool-monitor", daemon=True)
+    _monitor_thread.start()
+
+
+def stop_health_monitor():
+    """Stop the monitor thread, e.g. on application shutdown"""
+    global _monitor_thread
+    _monitor_stop.set()
+    if _monitor_thread is not None:
+        _monitor_thread.join(timeout=_monitor_interval)
+        _monitor_thread = None
+
+
+######################################################################################################################
+# Async Pools
+######################################################################################################################
+
+
+async def is_async_connection_alive(conn: AsyncConnection):
+    """Test if an async database connection is still alive and usable"""
+    try:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT 1")
+            return True
+    except Exception as e:
+        logger.warning(f"Async connection health check failed: {str(e)}")
+        return False
+
+
+async def _aconfigure_connection(pg_key: str, search_path: Optional[str], primary: bool, conn: AsyncConnection):
+    if search_path is not None:
+        await conn.execute(search_path)
+    await _aprepare_hot_statements(pg_key, conn, primary)
+
+
+async def _aprepare_hot_statements(pg_key: str, conn: AsyncConnection, primary: bool = True):
+    statements = _hot_statements.get(pg_key, ())
+    for sql_statement, params, write in statements:
+        if not write:
+            await _aprepare_hot_statement(pg_key, conn, sql_statement, params)
+    writes = [(sql_statement, params) for sql_statement, params, write in statements if write]
+    if writes and primary:
+        async with conn.transaction(force_rollback=True):
+            for sql_statement, params in writes:
+                await _aprepare_hot_statement(pg_key, conn, sql_statement, params, savepoint=True)
+
+
+async def _aprepare_hot_statement(
+    pg_key: str, conn: AsyncConnection, sql_statement: str, params: Any, savepoint: bool = False
+):
+    try:
+        async with conn.transaction() if savepoint else nullcontext():
+            await conn.execute(sql_statement, params, prepare=True)
+    except Exception as e:
+        logger.warning(f"Failed to prepare hot statement on {pg_key}: {str(e)}")
+
+
+async def _create_async_pool(
+    pg_key: str, schema_name: str, replica: Optional[int] = None
+) -> AsyncConnectionPool:
+    pg_conn_string = _get_pg_conn_string(pg_key, replica)
+    name = _pool_name(pg_key, schema_name, replica)
+    try:
+        pool = AsyncConnectionPool(
+            pg_conn_string,
+            min_size=config.pg_pool_min_size(),
+            max_size=config.pg_pool_max_size(),
+            timeout=DEFAULT_TIMEOUT,
+            kwargs=_connection_kwargs(pg_conn_string, schema_name),
+            configure=partial(
+                _aconfigure_connection, pg_key, _configure_search_path(pg_conn_string, schema_name), replica is None
+            ),
+            name=name,
+            open=False,
+        )
+        await pool.open()
+        logger.info(f"Created new async connection pool {name}")
+        return pool
+    except Exception as e:
+        logger.error(f"Failed to create async pool {name}: {str(e)}")
+        raise
+
+
+class _LoopPools:
+    """The async pools of one event loop; asyncio locks, tasks and pools can't be used from another loop"""
+
+    def __init__(self):
+        self.pools: Dict[PoolKey, AsyncConnectionPool] = {}
+        self.next_check: Dict[PoolKey, float] = {}
+        self.lock = asyncio.Lock()
+        self.monitor_task: Optional[asyncio.Task] = None
+
+
+def _loop_pools() -> _LoopPools:
+    """The async pools of the running event loop, created on its first use"""
+    loop = asyncio.get_running_loop()
+    with _async_loops_lock:
+        loop_pools = _async_loops.get(loop)
+        if loop_pools is None:
+            loop_pools = _async_loops[loop] = _LoopPools()
+        return loop_pools
+
+
+async def get_async_pool(
+    pg_key: str,
+    schema_name: str = "public",
+    reset: bool = False,
+    replica: Optional[int] = None,
+) -> AsyncConnectionPool:
+    """Get or create the async pool for a PG key, schema and replica. Must be called from the loop that will use it."""
+    pool_key = (pg_key, _pool_schema(schema_name), replica)
+    loop_pools = _loop_pools()
+    old_pool = None
+
+    async with loop_pools.lock:
+        if reset:
+            old_pool = loop_pools.pools.pop(pool_key, None)
+
+        pool = loop_pools.pools.get(pool_key)
+        if pool is None:
+            pool = loop_pools.pools[pool_key] = await _create_async_pool(*pool_key)
+            loop_pools.next_check[pool_key] = _next_check_time()
+            _start_async_health_monitor(loop_pools)
+
+    if old_pool is not None:
+        await _aretire_pool(old_pool)
+    return pool
+
+
+async def _aretire_pool(pool: AsyncConnectionPool):
+    try:
+        await pool.close(timeout=DEFAULT_RECONNECT_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Failed to close async pool {pool.name}: {str(e)}")
+
+
+async def avalidate_pool(pool: AsyncConnectionPool) -> bool:
+    """Async counterpart of validate_pool"""
+    try:
+        await pool.check()
+        async with pool.connection(timeout=DEFAULT_RECONNECT_TIMEOUT) as conn:
+            if not await is_async_connection_alive(conn):
+                logger.warning(f"Async pool {pool.name} failed health check")
+                return False
+        return True
+    except Exception as e:
+        logger.error(f"Async pool {pool.name} validation failed: {str(e)}")
+        return False
+
+
+async def awarm_pools(pg_keys: Iterable[str], schema_name: str = "public", timeout: float = DEFAULT_TIMEOUT):
+    """Async counterpart of warm_pools, for the async pools of the running event loop"""
+    failed = []
+    for pg_key in pg_keys:
+        for replica in [None, *_replica_indexes(pg_key)]:
+            pool = await get_async_pool(pg_key, schema_name, replica=replica)
+            try:
+                await pool.wait(timeout=timeout)
+                logger.info(f"Async pool {pool.name} is warm")
+            except Exception as e:
+                logger.error(f"Async pool {pool.name} failed to warm up: {str(e)}")
+                _warm_up_failed(failed, pool.name, pg_key, replica)
+    if failed:
+        raise RuntimeError(f"Async pools failed to warm up: {', '.join(failed)}")
+
+
+async def _ameasure_replica_lag(pg_key: str, replica: int):
+    try:
+        pool = await get_async_pool(pg_key, replica=replica)
+        async with pool.connection(timeout=DEFAULT_RECONNECT_TIMEOUT) as conn:
+            cursor = await conn.execute(REPLICA_LAG_QUERY)
+            lag = float((await cursor.fetchone())["lag"])
+    except Exception as e:
+        logger.warning(f"Replica {replica} of {pg_key} is unavailable: {str(e)}")
+        lag = None
+    if lag is not None and lag > config.pg_replica_max_lag():
+        logger.warning(f"Replica {replica} of {pg_key} is {lag:.1f}s behind, reading from the primary")
+    _replica_lag[(pg_key, replica)] = (time.time(), lag)
+
+
+async def achoose_replica(pg_key: str) -> Optional[int]:
+    """Async counterpart of choose_replica"""
+    for replica in _replica_indexes(pg_key):
+        if (pg_key, replica) not in _replica_lag:
+            await _ameasure_replica_lag(pg_key, replica)
+    return _pick_replica(pg_key)
+
+
+async def acheck_pools():
+    """Async counterpart of check_pools, for the pools of the running event loop"""
+    loop_pools = _loop_pools()
+    now = time.monotonic()
+    due = [(key, pool) for key, pool in loop_pools.pools.items() if loop_pools.next_check.get(key, 0) <= now]
+    pg_keys = {pg_key for pg_key, _, _ in loop_pools.pools}
+
+    for pool_key, pool in due:
+        loop_pools.next_check[pool_key] = _next_check_time()
+        if await avalidate_pool(pool):
+            continue
+        async with loop_pools.lock:
+            if loop_pools.pools.get(pool_key) is not pool:
+                continue
+            del loop_pools.pools[pool_key]
+            loop_pools.next_check.pop(pool_key, None)
+        logger.warning(f"Async pool {pool.name} failed health check, will be recreated")
+        await _aretire_pool(pool)
+
+    for pg_key in pg_keys:
+        for replica in _replica_indexes(pg_key):
+            if _replica_lag_is_stale(pg_key, replica):
+                await _ameasure_replica_lag(pg_key, replica)
+
+
+async def _run_async_health_monitor():
+    while True:
+        await asyncio.sleep(_monitor_interval)
+        try:
+            await acheck_pools()
+        except Exception as e:
+            logger.error(f"Async pool health monitor pass failed: {str(e)}")
+
+
+def _start_async_health_monitor(loop_pools: _LoopPools):
+    if loop_pools.monitor_task is None or loop_pools.monitor_task.done():
+        loop_pools.monitor_task = asyncio.get_running_loop().create_task(_run_async_health_monitor())
+
+
+async def close_async_pool():
+    """Close the running event loop's async pools and stop their health monitor, e.g. on application shutdown"""
+    loop_pools = _loop_pools()
+    if loop_pools.monitor_task is not None:
+        loop_pools.monitor_task.cancel()
+        loop_pools.monitor_task = None
+    async with loop_pools.lock:
+        for pool in loop_pools.pools.values():
+            try:
+                await pool.close()
+            except Exception as e:
+                logger.warning(f"Failed to close async pool {pool.name}: {str(e)}")
+        loop_pools.pools.clear()
+        loop_pools.next_check.clear()
@@ -10,110 +10,104 @@
 ######################################################################################################################
 
 
-from typing import Dict, Any, Optional
-from pydantic import BaseModel, Field
+from typing import (
+    Dict,
+    Any,
+    Optional,
+    List,
+    Tuple,
+    Iterator,
+    AsyncIterator,
+    Callable,
+    Awaitable,
+    FrozenSet,
+    Sequence,
+    Set,
+    Type,
+    get_args,
+    get_origin,
+)
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import partial
+from pydantic import BaseModel, Field, PrivateAttr
+from pydantic_core import to_json
 
-from psycopg.rows import dict_row
-from psycopg_pool import ConnectionPool
-from psycopg import Connection, Error as PsycopgError
+from psycopg import AsyncCursor, AsyncPipeline, Cursor, Pipeline, Error as PsycopgError
 from psycopg.types.json import Jsonb
 
 from .config import config
+from .pool import (
+    get_pool,
+    get_async_pool,
+    choose_replica,
+    achoose_replica,
+    RetryPolicy,
+)
+from .cache import EntityCache
+from .buffer import WriteBehindBuffer
+from .metrics import record_query, record_error, explain_due, schedule_explain
 
+import asyncio
+import base64
+import json
 import logging
+import re
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
-# Pool configuration constants
-DEFAULT_MIN_SIZE = 1
-DEFAULT_MAX_SIZE = 10
-DEFAULT_TIMEOUT = 30  # seconds
-DEFAULT_KEEPALIVE = 60  # seconds
-DEFAULT_RECONNECT_TIMEOUT = 5  # seconds
-DEFAULT_MAX_RETRIES = 3
+DEFAULT_STREAM_ITERSIZE = 1000  # rows fetched per round trip by Table.stream
+DEFAULT_PAGE_LIMIT = 50  # rows per page returned by Table.page
 
-_pool = None
-_last_pool_check = 0
-_pool_check_interval = 300  # Check pool health every 5 minutes
 
+######################################################################################################################
+# Backends
+######################################################################################################################
 
-class SchemaConnection(Connection):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        with self.cursor() as cur:
-            cur.execute("set search_path to auth, public")
 
+class Backend:
+    """
+    Runs Table statements somewhere other than the Postgres pools of solar.pool, e.g. solar.memory.MemoryBackend for
+    benchmarking the service layer without a database. get_pool/get_async_pool return pool-like objects whose
+    connection() hands out connections with the part of psycopg's (Async)Connection API that Table uses: cursor(),
+    execute(), transaction() and pipeline(), with rows returned as dicts. Install one with set_backend() or
+    SOLAR_TABLE_BACKEND.
+    """
 
-def is_connection_alive(conn):
-    """Test if a database connection is still alive and usable"""
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1")
-            return True
-    except Exception as e:
-        logger.warning(f"Connection health check failed: {str(e)}")
-        return False
+    def get_pool(self, table_class: Type["Table"], schema_name: str) -> Any:
+        raise NotImplementedError
 
+    async def get_async_pool(self, table_class: Type["Table"], schema_name: str) -> Any:
+        raise NotImplementedError
 
-def validate_pool(pool: ConnectionPool, pg_key: str) -> bool:
-    """Validate the entire pool's health and attempt to fix issues"""
-    try:
-        # Test a connection from the pool
-        with pool.getconn() as conn:
-            if not is_connection_alive(conn):
-                logger.warning(f"Pool {pg_key} failed health check")
-                return False
-        return True
-    except Exception as e:
-        logger.error(f"Pool {pg_key} validation failed: {str(e)}")
-        return False
 
+_backend: Optional[Backend] = None
+_backend_configured = False
+_backend_lock = threading.Lock()
 
-def get_pool(reset: bool = False) -> Dict[str, ConnectionPool]:
-    """Get or create the connection pool with enhanced health checks"""
-    global _pool, _last_pool_check
 
-    current_time = time.time()
+def set_backend(backend: Optional[Backend]):
+    """Route every Table through backend, or back to the Postgres pools with None"""
+    global _backend, _backend_configured
+    with _backend_lock:
+        _backend = backend
+        _backend_configured = True
 
-    # Check if we need to validate existing pools
-    if (
-        _pool is not None
-        and not reset
-        and (current_time - _last_pool_check) > _pool_check_interval
-    ):
-        logger.debug("Performing periodic pool health check")
-        for pg_key, pool in _pool.items():
-            if not validate_pool(pool, pg_key):
-                logger.warning(f"Pool {pg_key} failed health check, will be recreated")
-                reset = True
-        _last_pool_check = current_time
-
-    if _pool is None or reset:
-        _pool = {}
-        for pg_key, pg_conn_string in config.get_all_pg_connection_strings().items():
-            try:
-                _pool[pg_key] = ConnectionPool(
-                    pg_conn_string,
-                    min_size=DEFAULT_MIN_SIZE,
-                    max_size=DEFAULT_MAX_SIZE,
-                    timeout=DEFAULT_TIMEOUT,
-                    kwargs={
-                        "row_factory": dict_row,
-                        "keepalives": 1,
-                        "keepalives_idle": DEFAULT_KEEPALIVE,
-                        "keepalives_interval": DEFAULT_KEEPALIVE,
-                        "keepalives_count": 3,
-                    },
-                    connection_class=SchemaConnection,
-                    check=is_connection_alive,
-                )
-                logger.info(f"Created new connection pool for {pg_key}")
-            except Exception as e:
-                logger.error(f"Failed to create pool for {pg_key}: {str(e)}")
-                raise
-
-    return _pool
+
+def get_backend() -> Optional[Backend]:
+    """The installed Backend, or None when Tables use the Postgres pools"""
+    global _backend, _backend_configured
+    if not _backend_configured:
+        with _backend_lock:
+            if not _backend_configured:
+                if config.table_backend() == "memory":
+                    from .memory import MemoryBackend
+
+                    _backend = MemoryBackend()
+                _backend_configured = True
+    return _backend
 
 
 ######################################################################################################################
@@ -121,20 +115,274 @@ def get_pool(reset: bool = False) -> Dict[str, ConnectionPool]:
 ######################################################################################################################
 
 
-def ColumnDetails(*args, primary_key: bool = False, **kwargs):
-    """Wrap Field to bring some metadata args top-level"""
-    if not hasattr(kwargs, "json_schema_extra"):
-        kwargs["json_schema_extra"] = {}
+_WRITE_KEYWORDS = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE))\b", re.I)
+
+
+def _is_read_only_statement(sql_statement: str) -> bool:
+    """Whether a statement can safely run on a read replica: a SELECT (or WITH ... SELECT) that takes no row locks"""
+    statement = sql_statement.lstrip().lstrip("(")
+    first_word = statement[:6].upper()
+    if first_word != "SELECT" and not first_word.startswith("WITH"):
+        return False
+    return _WRITE_KEYWORDS.search(statement) is None
+
+
+def _may_hold_json(annotation) -> bool:
+    """Whether values of a field annotation can contain dicts, which must be sent as JSONB"""
+    if annotation is Any or annotation is dict or get_origin(annotation) is dict:
+        return True
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return True
+    return any(_may_hold_json(arg) for arg in get_args(annotation))
+
+
+def _may_mutate(annotation) -> bool:
+    """Whether values of a field annotation can change in place (lists, dicts, sets, models), unseen by __setattr__"""
+    if annotation is Any or annotation in (list, dict, set) or get_origin(annotation) in (list, dict, set):
+        return True
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return True
+    return any(_may_mutate(arg) for arg in get_args(annotation))
+
+
+def _placeholder(column: str, json_columns: FrozenSet[str]) -> str:
+    """
+    JSON columns are sent in binary: in text format psycopg has to regex-escape every quote of every element of a
+    jsonb[] array, which costs far more than encoding the JSON itself
+    """
+    return "%b" if column in json_columns else "%s"
+
+
+def _build_upsert_statement(
+    table_name: str,
+    primary_key: str,
+    columns: List[str],
+    json_columns: FrozenSet[str] = frozenset(),
+    row_count: int = 1,
+) -> str:
+    """Build an INSERT ... ON CONFLICT upsert for row_count rows of the given columns"""
+    columns_str = ", ".join(columns)
+    placeholders = ", ".join([_placeholder(col, json_columns) for col in columns])
+    values_placeholders = ", ".join([f"({placeholders})"] * row_count)
+    set_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in columns])
+
+    return f"""
+            INSERT INTO {table_name} ({columns_str})
+            VALUES {values_placeholders}
+            ON CONFLICT ({primary_key}) DO UPDATE
+            SET {set_clause}
+        """
+
+
+@dataclass
+class TablePlan:
+    """Metadata and SQL compiled once per Table subclass, so sync() doesn't rescan model_fields every call"""
+
+    table_name: str
+    primary_key: str
+    columns: List[str]
+    json_columns: FrozenSet[str]
+    upsert_statement: str
+    select_statement: str
+    select_many_statement: str
+    delete_statement: str
+    copy_statements: Tuple[str, str, str]
+    mutable_columns: FrozenSet[str] = frozenset()
+    upsert_many_statements: Dict[int, str] = field(default_factory=dict)
+    update_statements: Dict[FrozenSet[str], Tuple[str, List[str]]] = field(default_factory=dict)
+
+    @classmethod
+    def compile(cls, table_class: Type["Table"]) -> "TablePlan":
+        table_name = table_class._get_sql_table_name()
+        if table_name is None:
+            raise ValueError("Cannot sync without a table name defined")
+
+        primary_key = None
+        for field_name, field_info in table_class.model_fields.items():
+            if field_info.json_schema_extra and field_info.json_schema_extra.get(
+                "primary_key", False
+            ):
+                primary_key = field_name
+                break
+
+        if not primary_key:
+            raise ValueError("Cannot sync without a primary key defined")
+
+        columns = list(table_class.model_fields.keys())
+        json_columns = frozenset(
+            name
+            for name, field_info in table_class.model_fields.items()
+            if _may_hold_json(field_info.annotation)
+        )
+        columns_str = ", ".join(columns)
+        set_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in columns])
+
+        # COPY path of sync_many: stream rows into a per-transaction staging table, then merge in one upsert
+        staging_name = f"_staging_{table_class.__tablename__}"
+        create_staging_statement = f"""
+            CREATE TEMP TABLE {staging_name}
+            (LIKE {table_name} INCLUDING DEFAULTS)
+            ON COMMIT DROP
+        """
+        copy_statement = f"COPY {staging_name} ({columns_str}) FROM STDIN"
+        merge_statement = f"""
+            INSERT INTO {table_name} ({columns_str})
+            SELECT {columns_str} FROM {staging_name}
+            ON CONFLICT ({primary_key}) DO UPDATE
+            SET {set_clause}
+        """
+
+        return cls(
+            table_name=table_name,
+            primary_key=primary_key,
+            columns=columns,
+            json_columns=json_columns,
+            upsert_statement=_build_upsert_statement(table_name, primary_key, columns, json_columns),
+            select_statement=f"SELECT {columns_str} FROM {table_name} WHERE {primary_key} = %s",
+            select_many_statement=f"SELECT {columns_str} FROM {table_name} WHERE {primary_key} = ANY(%s)",
+            delete_statement=f"DELETE FROM {table_name} WHERE {primary_key} = %s",
+            copy_statements=(create_staging_statement, copy_statement, merge_statement),
+            mutable_columns=frozenset(
+                name for name, field_info in table_class.model_fields.items() if _may_mutate(field_info.annotation)
+            ),
+        )
+
+    def upsert_many_statement(self, row_count: int) -> str:
+        """Multi-row upsert for sync_many; batches are mostly full, so only a few sizes get cached"""
+        statement = self.upsert_many_statements.get(row_count)
+        if statement is None:
+            statement = self.upsert_many_statements[row_count] = _build_upsert_statement(
+                self.table_name, self.primary_key, self.columns, self.json_columns, row_count
+            )
+        return statement
+
+    def update_statement(self, fields: FrozenSet[str]) -> Tuple[str, List[str]]:
+        """Narrow UPDATE of just the given fields, returning the statement and its columns in parameter order"""
+        cached = self.update_statements.get(fields)
+        if cached is None:
+            columns = [col for col in self.columns if col in fields]
+            set_clause = ", ".join([f"{col} = {_placeholder(col, self.json_columns)}" for col in columns])
+            statement = f"""
+            UPDATE {self.table_name}
+            SET {set_clause}
+            WHERE {self.primary_key} = %s
+            RETURNING {self.primary_key}
+        """
+            cached = self.update_statements[fields] = (statement, columns)
+        return cached
+
+
+_table_plans: Dict[type, TablePlan] = {}
+
+
+@dataclass
+class Page:
+    """One page of Table.page results; pass next_cursor as `after` to fetch the next one (None on the last page)"""
+
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def _encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(to_json(values)).decode()
+
+
+def _decode_cursor(cursor: str, key_count: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as e:
+        raise ValueError("Invalid page cursor") from e
+    if not isinstance(values, list) or len(values) != key_count:
+        raise ValueError("Invalid page cursor")
+    return values
+
+
+def ColumnDetails(*args, primary_key: bool = False, index: bool = False, **kwargs):
+    """Wrap Field to bring some metadata args top-level. index=True declares a single-column index, see Index."""
+    kwargs.setdefault("json_schema_extra", {})
     kwargs["json_schema_extra"]["primary_key"] = primary_key
+    kwargs["json_schema_extra"]["index"] = index
     return Field(*args, **kwargs)
 
 
+@dataclass(frozen=True)
+class Index:
+    """
+    An index a Table's queries depend on, declared next to its columns so the model is the source of truth:
+
+        class ChatMessage(Table):
+            __indexes__ = (Index(("session_id", "message_order")),)
+
+    Single-column indexes can use ColumnDetails(index=True) instead. `python -m solar.indexes` emits the DDL and
+    reports which declared indexes the database is missing.
+    """
+
+    columns: Tuple[str, ...]
+    unique: bool = False
+    name: Optional[str] = None
+    where: Optional[str] = None  # predicate of a partial index
+
+
 class Table(BaseModel):
     __abstract__ = True
+    __cache__: Optional[EntityCache] = None  # opt-in primary-key cache, see solar/cache.py
+    __indexes__: Tuple[Index, ...] = ()  # composite and partial indexes, see Index
+    __write_behind__: Optional[WriteBehindBuffer] = None  # opt-in batched inserts, see solar/buffer.py
+
+    # Fields assigned since the row was loaded or last synced, and whether the row is known to exist. They let
+    # sync() send a narrow UPDATE instead of rewriting every column. Fields that can be mutated in place (lists,
+    # dicts, models) are compared against their JSON as loaded or synced, since assignment tracking can't see that.
+    _dirty_fields: Set[str] = PrivateAttr(default_factory=set)
+    _persisted: bool = PrivateAttr(default=False)
+    _snapshot: Dict[str, bytes] = PrivateAttr(default_factory=dict)
 
     class Config:
         extra = "ignore"
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__class__.model_fields:
+            self._dirty_fields.add(name)
+
+    def mark_dirty(self, *fields: str):
+        """
+        Flag fields for the next sync(). sync() finds lists, dicts and models mutated in place itself; this saves it
+        the comparison, or flags fields to rewrite anyway. With no arguments every field is flagged.
+        """
+        model_fields = self.__class__.model_fields
+        for name in fields:
+            if name not in model_fields:
+                raise ValueError(f"{self.__class__.__name__} has no field {name}")
+        self._dirty_fields.update(fields or model_fields)
+
+    def _mark_synced(self):
+        """Record that the database row now matches this instance"""
+        self._persisted = True
+        self._dirty_fields.clear()
+        self._take_snapshot()
+
+    def _take_snapshot(self):
+        """Remember the mutable fields as they are in the database, see _mark_mutated"""
+        mutable_columns = self.__class__._get_plan().mutable_columns
+        if mutable_columns:
+            self._snapshot = {
+                col: to_json(getattr(self, col), serialize_unknown=True) for col in mutable_columns
+            }
+
+    def _mark_mutated(self):
+        """Flag the mutable fields that changed in place since the row was loaded or synced"""
+        for col, snapshot in self._snapshot.items():
+            if col not in self._dirty_fields and to_json(getattr(self, col), serialize_unknown=True) != snapshot:
+                self._dirty_fields.add(col)
+
+    @classmethod
+    def _from_row(cls, row: Dict[str, Any]) -> "Table":
+        """Build an instance from a database row, already in sync with it"""
+        instance = cls.model_validate(row)
+        instance._persisted = True
+        instance._take_snapshot()
+        return instance
+
     @classmethod
     def _get_sql_table_name(cls, schema_name=None) -> Optional[str]:
         tablename = cls.__tablename__
@@ -144,6 +392,64 @@ class Table(BaseModel):
             return tablename
         return f"{schema_name}.{tablename}"
 
+    @classmethod
+    def _checkout(cls, schema_name: str, read_only: bool) -> Tuple[str, Optional[int], Any]:
+        """The pool key, replica (None for the primary) and pool a statement runs on"""
+        pg_key = config.get_pg_key_for_table(cls.__name__)
+        backend = get_backend()
+        if backend is not None:
+            return pg_key, None, backend.get_pool(cls, schema_name)
+        replica = choose_replica(pg_key) if read_only else None
+        return pg_key, replica, get_pool(pg_key, schema_name, replica=replica)
+
+    @classmethod
+    def _run(
+        cls,
+        operation: Callable[[Cursor], Any],
+        schema_name: str = "public",
+        max_retries: int = 3,
+        read_only: bool = False,
+        atomic: bool = True,
+        query: Optional[Tuple[str, Any]] = None,
+    ):
+        """
+        Run operation(cursor) in one transaction on a pooled connection, retrying on database errors.
+        read_only operations go to a read replica when one is configured and caught up. Pool connections are in
+        autocommit mode, so a single-statement operation can pass atomic=False to skip the BEGIN/COMMIT round-trips.
+        When the operation runs a single (statement, params) query, pass it to have it timed in solar.metrics.
+        """
+        pg_key, replica, pool = cls._checkout(schema_name, read_only)
+        retry = RetryPolicy(pg_key, replica, max_retries)
+
+        while True:
+            try:
+                # pool.connection() hands the connection back to the pool, whereas `with conn:` would close it and
+                # force a reconnect on the next checkout. The pool is pinned to schema_name's search_path, so the
+                # statement runs as is.
+                started = time.perf_counter()
+                with pool.connection() as conn:
+                    checked_out = time.perf_counter()
+                    with conn.transaction() if atomic else nullcontext():
+                        with conn.cursor() as cursor:
+                            result = operation(cursor)
+                            rowcount = cursor.rowcount
+                if query is not None:
+                    finished = time.perf_counter()
+                    slow = record_query(query[0], checked_out - started, finished - checked_out, rowcount)
+                    # EXPLAIN ANALYZE runs the statement again, which is only harmless for reads
+                    if slow and read_only and explain_due(query[0]):
+                        schedule_explain(query[0], partial(cls._explain, *query, schema_name))
+                return result
+
+            except PsycopgError as e:
+                if query is not None:
+                    record_error(query[0])
+                delay = retry.next_delay(e)
+                if delay is None:
+                    pool = get_pool(pg_key, schema_name)
+                else:
+                    time.sleep(delay)
+
     @classmethod
     def sql(
         cls,
@@ -151,78 +457,181 @@ class Table(BaseModel):
         params: Dict[str, Any] | None = None,
         schema_name: str = "public",
         max_retries: int = 3,
+        prepare: Optional[bool] = None,
+        read_only: Optional[bool] = None,
     ):
-        pg_key = config.get_pg_key_for_table(cls.__name__)
-        pool = get_pool()
-        retry_count = 0
+        """
+        Run a single statement and return its rows as dicts ([] for statements without results).
+        Read-only statements are detected automatically and may be served by a read replica; pass read_only=False
+        to pin a SELECT with side effects to the primary, or read_only=True for a statement the detection misses.
+        """
+        if read_only is None:
+            read_only = _is_read_only_statement(sql_statement)
+
+        def execute(cursor: Cursor):
+            cursor.execute(sql_statement, params, prepare=prepare)
+            if cursor.description is not None:
+                return cursor.fetchall()
+            else:
+                return []
+
+        return cls._run(
+            execute, schema_name, max_retries, read_only, atomic=False, query=(sql_statement, params)
+        )
 
-        while retry_count < max_retries:
-            current_pool = None
-            conn = None
+    @classmethod
+    def _explain(cls, sql_statement: str, params, schema_name: str) -> str:
+        """
+        The EXPLAIN (ANALYZE, BUFFERS) plan of a slow read-only statement, for solar.metrics.schedule_explain. Runs on
+        its explain thread with a blocking pool connection of its own, for async statements as well.
+        """
+
+        def explain(cursor: Cursor):
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql_statement}", params)
+            return "\n".join(row["QUERY PLAN"] for row in cursor.fetchall())
+
+        return cls._run(explain, schema_name, max_retries=1, read_only=True, atomic=False)
 
+    @classmethod
+    def stream(
+        cls,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        itersize: int = DEFAULT_STREAM_ITERSIZE,
+        as_model: bool = False,
+        schema_name: str = "public",
+        max_retries: int = 3,
+    ) -> Iterator[Any]:
+        """
+        Iterate over the rows of a query through a named server-side cursor, so only itersize rows are held in
+        memory at a time. Use this instead of sql() for exports and analytics over large tables.
+
+        Args:
+            sql_statement: A single SELECT statement
+            params: Query parameters, as for sql()
+            itersize: Number of rows fetched from the server per round trip
+            as_model: Yield instances of this Table instead of dicts
+            schema_name: Schema to resolve unqualified table names in
+            max_retries: Attempts made before the first row is yielded; errors mid-stream are raised as is
+
+        The pooled connection stays checked out until the generator is exhausted or closed.
+        """
+        pg_key, replica, pool = cls._checkout(schema_name, _is_read_only_statement(sql_statement))
+        retry = RetryPolicy(pg_key, replica, max_retries)
+        streaming = False
+
+        while True:
             try:
-                if pg_key in pool:
-                    current_pool = pool[pg_key]
-                    conn = current_pool.getconn()
-                else:
-                    pool = get_pool(reset=True)
-                    current_pool = pool[pg_key]
-                    conn = current_pool.getconn()
-
-                with conn:
-                    with conn.cursor() as cursor:
-                        try:
-                            if schema_name != "public" and schema_name != "auth":
-                                cursor.execute(f"SET search_path TO {schema_name}")
-                            cursor.execute(sql_statement, params)
-                            if cursor.description is not None:
-                                return cursor.fetchall()
-                            else:
-                                return []
-                        finally:
-                            if schema_name != "public" and schema_name != "auth":
-                                cursor.execute("SET search_path TO public, auth")
-                return  # Success, exit the retry loop
+                # Named cursors only live inside a transaction
+                with pool.connection() as conn, conn.transaction():
+                    with conn.cursor(name=f"_stream_{cls.__tablename__}") as cursor:
+                        cursor.itersize = itersize
+                        cursor.execute(sql_statement, params)
+                        for row in cursor:
+                            streaming = True
+                            yield cls._from_row(row) if as_model else row
+                return
 
             except PsycopgError as e:
-                retry_count += 1
-                logger.warning(
-                    f"Database operation failed (attempt {retry_count}/{max_retries}): {str(e)}"
-                )
-
-                if conn is not None:
-                    try:
-                        if current_pool is not None:
-                            current_pool.putconn(conn)
-                        else:
-                            conn.close()
-                    except Exception:
-                        try:
-                            conn.close()
-                        except Exception:
-                            pass
-
-                if retry_count < max_retries:
-                    # Refresh the pool before retrying
-                    pool = get_pool(reset=True)
-                    continue
+                # Rows already handed to the caller can't be un-yielded, so only retry a stream that hasn't started
+                if streaming:
+                    raise
+                delay = retry.next_delay(e)
+                if delay is None:
+                    pool = get_pool(pg_key, schema_name)
                 else:
-                    msg = f"Database operation failed after {max_retries} attempts"
-                    logger.error(msg)
-                    raise RuntimeError(msg) from e
-
-            finally:
-                if conn is not None:
-                    try:
-                        if current_pool is not None:
-                            current_pool.putconn(conn)
-                        else:
-                            conn.close()
-                    except Exception:
-                        try:
-                            conn.close()
-                        except Exception:
-                            pass
+                    time.sleep(delay)
+
+    @classmethod
+    def _page_query(
+        cls,
+        where: Optional[str],
+        params: Optional[Dict[str, Any]],
+        order_by: Sequence[str],
+        after: Optional[str],
+        limit: int,
+        descending: bool,
+    ) -> Tuple[str, Dict[str, Any], List[str]]:
+        """Build the keyset query for page/apage, returning the statement, its params and the sort key columns"""
+        plan = cls._get_plan()
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        for col in order_by:
+            if col not in plan.columns:
+                raise ValueError(f"Cannot order {cls.__name__} by unknown column {col}")
+        if limit < 1:
+            raise ValueError("Page limit must be at least 1")
+        # The primary key breaks ties, so every row has a unique position and none is skipped or repeated
+        key_columns = list(order_by) + ([plan.primary_key] if plan.primary_key not in order_by else [])
+
+        params = dict(params or {})
+        conditions = [f"({where})"] if where else []
+        if after is not None:
+            values = _decode_cursor(after, len(key_columns))
+            placeholders = []
+            for i, value in enumerate(values):
+                params[f"_after_{i}"] = value
+                placeholders.append(f"%(_after_{i})s")
+            operator = "<" if descending else ">"
+            conditions.append(f"({', '.join(key_columns)}) {operator} ({', '.join(placeholders)})")
+        # Fetch one extra row to learn whether there is a next page without a COUNT
+        params["_limit"] = limit + 1
+
+        direction = " DESC" if descending else ""
+        statement = f"""
+            SELECT {", ".join(plan.columns)} FROM {plan.table_name}
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY {", ".join(col + direction for col in key_columns)}
+            LIMIT %(_limit)s
+        """
+        return statement, params, key_columns
+
+    @classmethod
+    def _make_page(cls, rows: List[Dict[str, Any]], key_columns: List[str], limit: int, as_model: bool) -> Page:
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor([rows[-1][col] for col in key_columns])
+        items = [cls._from_row(row) for row in rows] if as_model else rows
+        return Page(items=items, next_cursor=next_cursor)
+
+    @classmethod
+    def page(
+        cls,
+        where: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        order_by: Sequence[str] = (),
+        after: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        descending: bool = False,
+        as_model: bool = True,
+        schema_name: str = "public",
+        read_only: Optional[bool] = None,
+    ) -> Page:
+        """
+        Fetch one page of rows with keyset (seek) pagination, so every page costs the same index range scan
+        however deep it is, unlike OFFSET:
+
+            page = ChatMessage.page("session_id = %(session_id)s", {"session_id": sid}, order_by=["message_order"])
+            more = ChatMessage.page(..., after=page.next_cursor)
+
+        Args:
+            where: Optional SQL condition, using %(name)s placeholders bound from params
+            params: Named parameters for where
+            order_by: Columns to sort by, all in the same direction; the primary key is appended as a tie-breaker.
+                They should be NOT NULL and covered by an index starting with the where columns.
+            after: next_cursor of the previous page, an opaque string safe to hand to clients
+            limit: Maximum number of rows in the page
+            descending: Sort newest/largest first
+            as_model: Return Table instances instead of dicts
+            read_only: As for sql(), False reads the primary, e.g. to see rows just written
+
+        Raises:
+            ValueError: For an unknown order_by column or a malformed cursor
+        """
+        statement, query_params, key_columns = cls._page_query(where, params, order_by, after, limit, descending)
+        rows = cls.sql(statement, query_params, schema_name=schema_name, read_only=read_only)
+        return cls._make_page(rows, key_columns, limit, as_model)
 
     def _prepare_value(self, value):
         """Helper to recursively prepare values for database insertion"""
@@ -235,54 +644,197 @@ class Table(BaseModel):
             return Jsonb(value)
         return value
 
-    def sync(self):
-        """Sync the model to the database"""
-        table_name = self.__class__._get_sql_table_name()
-        if table_name is None:
-            raise ValueError("Cannot sync without a table name defined")
+    @classmethod
+    def _get_plan(cls) -> TablePlan:
+        """Return the TablePlan for this class, compiling it on first use"""
+        plan = _table_plans.get(cls)
+        if plan is None:
+            plan = _table_plans[cls] = TablePlan.compile(cls)
+        return plan
+
+    def _get_row(self, plan: TablePlan) -> List[Any]:
+        """Dump the model once and return database-ready values in plan column order"""
         data = self.model_dump()
+        return [
+            self._prepare_value(data[col]) if col in plan.json_columns else data[col]
+            for col in plan.columns
+        ]
 
-        # Get column names and values
-        columns = list(data.keys())
-        values = []
-        for col in columns:
-            value = data[col]
-            field_info = self.__class__.model_fields[col]
-            values.append(self._prepare_value(value))
+    def _get_update(self, plan: TablePlan) -> Optional[Tuple[str, List[Any]]]:
+        """
+        Narrow UPDATE statement and values for the dirty fields of a persisted row, or None when the row has to be
+        written in full (it was never loaded or synced, or its primary key changed)
+        """
+        if not self._persisted or plan.primary_key in self._dirty_fields:
+            return None
+        statement, columns = plan.update_statement(frozenset(self._dirty_fields))
+        data = self.model_dump(include=set(columns))
+        values = [
+            self._prepare_value(data[col]) if col in plan.json_columns else data[col]
+            for col in columns
+        ]
+        values.append(getattr(self, plan.primary_key))
+        return statement, values
 
-        # Find primary key
-        primary_key = None
-        for field_name, field_info in self.__class__.model_fields.items():
-            if field_info.json_schema_extra and field_info.json_schema_extra.get(
-                "primary_key", False
-            ):
-                primary_key = field_name
-                break
+    @classmethod
+    def _iter_sync_many_batches(cls, objects, batch_size: int) -> Iterator[List["Table"]]:
+        """Normalize the sync_many input and split it into type-checked batches"""
+        # Handle single object case
+        if not isinstance(objects, list):
+            objects = [objects]
 
-        if not primary_key:
-            raise ValueError("Cannot sync without a primary key defined")
+        if not objects:
+            return  # Nothing to sync
 
-        # Build the SQL statement
-        columns_str = ", ".join(columns)
-        placeholders = ", ".join(["%s"] * len(columns))
-        set_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in columns])
+        # Validate the table up front so an invalid Table never reaches the database
+        cls._get_plan()
 
-        sql_statement = f"""
-            INSERT INTO {table_name} ({columns_str})
-            VALUES ({placeholders})
-            ON CONFLICT ({primary_key}) DO UPDATE
-            SET {set_clause}
+        # Process in batches
+        for i in range(0, len(objects), batch_size):
+            upper_idx = min(i + batch_size, len(objects))
+            batch = objects[i:upper_idx]
+            for obj in batch:
+                if not isinstance(obj, cls):
+                    raise TypeError(
+                        f"Expected instance of {cls.__name__}, got {type(obj).__name__}"
+                    )
+            yield batch
+
+    @classmethod
+    def _get_sync_many_statement(cls, batch: List["Table"]) -> Tuple[str, List[Any]]:
+        """Build one multi-row upsert statement and its parameters for a batch of objects"""
+        plan = cls._get_plan()
+        # Collect values for this batch, dumping each model exactly once
+        all_values = []
+        for obj in batch:
+            all_values.extend(obj._get_row(plan))
+        return plan.upsert_many_statement(len(batch)), all_values
+
+    @classmethod
+    def _copy_batch(cls, cursor: Cursor, batch: List["Table"]):
+        """Stream a batch into a temp staging table with COPY, then merge it with a single upsert"""
+        plan = cls._get_plan()
+        create_statement, copy_statement, merge_statement = plan.copy_statements
+
+        cursor.execute(create_statement)
+        with cursor.copy(copy_statement) as copy:
+            for obj in batch:
+                copy.write_row(obj._get_row(plan))
+        cursor.execute(merge_statement)
+        return []
+
+    @classmethod
+    async def _acopy_batch(cls, cursor: AsyncCursor, batch: List["Table"]):
+        plan = cls._get_plan()
+        create_statement, copy_statement, merge_statement = plan.copy_statements
+
+        await cursor.execute(create_statement)
+        async with cursor.copy(copy_statement) as copy:
+            for obj in batch:
+                await copy.write_row(obj._get_row(plan))
+        await cursor.execute(merge_statement)
+        return []
+
+    @classmethod
+    def _cache_put(cls, *instances: "Table"):
+        if cls.__cache__ is None:
+            return
+        primary_key = cls._get_plan().primary_key
+        for instance in instances:
+            cls.__cache__.put(getattr(instance, primary_key), instance)
+
+    @classmethod
+    def _cache_get_many(cls, pks: List[Any]) -> Tuple[Dict[Any, "Table"], List[Any]]:
+        """Split pks into cached instances and the pks that still have to be read from the database"""
+        if cls.__cache__ is None:
+            return {}, list(pks)
+        found, missing = {}, []
+        for pk in pks:
+            instance = cls.__cache__.get(pk)
+            if instance is None:
+                missing.append(pk)
+            else:
+                found[pk] = instance
+        return found, missing
+
+    @classmethod
+    def _after_sync(cls, instances: List["Table"]):
+        """Mark instances written to the database as clean and publish them to the cache"""
+        for instance in instances:
+            instance._mark_synced()
+        cls._cache_put(*instances)
+
+    @classmethod
+    def invalidate(cls, *pks):
+        """Drop rows from this Table's cache after writing them with raw SQL"""
+        if cls.__cache__ is not None:
+            cls.__cache__.evict(*pks)
+
+    @classmethod
+    def update_cached(cls, pk, **fields):
+        """Apply a raw SQL write of known values to the cached row instead of dropping it, e.g. a counter's RETURNING"""
+        if cls.__cache__ is not None:
+            cls.__cache__.update(pk, **fields)
+
+    @classmethod
+    def get(cls, pk) -> Optional["Table"]:
+        """Load a single row by primary key, or None if it doesn't exist"""
+        found, missing = cls._cache_get_many([pk])
+        if not missing:
+            return found[pk]
+        rows = cls.sql(cls._get_plan().select_statement, [pk], prepare=True)
+        if not rows:
+            return None
+        instance = cls._from_row(rows[0])
+        cls._cache_put(instance)
+        return instance
+
+    @classmethod
+    def get_many(cls, pks: List[Any]) -> Dict[Any, "Table"]:
+        """Load rows by primary key in one query, returning {pk: instance} for the rows that exist"""
+        found, missing = cls._cache_get_many(pks)
+        if missing:
+            plan = cls._get_plan()
+            rows = cls.sql(plan.select_many_statement, [missing], prepare=True)
+            instances = [cls._from_row(row) for row in rows]
+            cls._cache_put(*instances)
+            found.update((getattr(instance, plan.primary_key), instance) for instance in instances)
+        return found
+
+    def delete(self):
+        """Delete this row from the database"""
+        plan = self.__class__._get_plan()
+        pk = getattr(self, plan.primary_key)
+        self.__class__.sql(plan.delete_statement, [pk], prepare=True)
+        self.__class__.invalidate(pk)
+        self._persisted = False
+
+    def sync(self):
+        """
+        Sync the model to the database. Rows that were loaded or synced before only get their changed fields
+        written with a narrow UPDATE, and are skipped when nothing changed; new rows are upserted in full.
         """
-        self.__class__.sql(sql_statement, values)
+        plan = self.__class__._get_plan()
+        self._mark_mutated()
+        if self._persisted and not self._dirty_fields:
+            return
+        update = self._get_update(plan)
+        # An UPDATE that matched nothing means the row was deleted elsewhere, so fall back to writing it in full
+        if update is None or not self.__class__.sql(*update, prepare=True):
+            self.__class__.sql(plan.upsert_statement, self._get_row(plan), prepare=True)
+        self.__class__._after_sync([self])
 
     @classmethod
-    def sync_many(cls, objects, batch_size=1000):
+    def sync_many(cls, objects, batch_size=1000, copy=False):
         """
         Sync multiple model instances to the database in batched transactions.
 
         Args:
             objects: A single model instance or a list of model instances
             batch_size: Maximum number of objects to sync in a single transaction
+            copy: Stream each batch through COPY into a staging table and merge it with one
+                INSERT ... SELECT ... ON CONFLICT, instead of binding every value into a VALUES list.
+                Much faster for backfills; prefer larger batch sizes with it.
 
         Returns:
             None
@@ -290,63 +842,334 @@ class Table(BaseModel):
         Raises:
             ValueError: If no table name is defined or no primary key is found
         """
-        # Handle single object case
+        if copy:
+            for batch in cls._iter_sync_many_batches(objects, batch_size):
+                cls._run(partial(cls._copy_batch, batch=batch))
+                cls._after_sync(batch)
+            return
+
+        for batch in cls._iter_sync_many_batches(objects, batch_size):
+            cls.sql(*cls._get_sync_many_statement(batch))
+            cls._after_sync(batch)
+
+    @classmethod
+    @contextmanager
+    def transaction(cls, schema_name: str = "public") -> Iterator["Transaction"]:
+        """
+        Open a unit of work on one primary connection, for request paths that run several statements:
+
+            with ChatMessage.transaction() as tx:
+                history = tx.sql("SELECT ...", params)
+                tx.sync(user_message)
+                tx.sync(assistant_message)
+
+        Statements are pipelined: writes are queued and only sent, together with the COMMIT, when a later
+        tx.sql() needs its rows or the block exits, so a read followed by writes costs two round-trips and
+        a single commit. Any exception rolls everything back. Unlike sql(), the block is not retried.
+        """
+        _, _, pool = cls._checkout(schema_name, read_only=False)
+        with pool.connection() as conn:
+            with conn.pipeline() if Pipeline.is_supported() else nullcontext() as pipeline:
+                with conn.transaction():
+                    tx = Transaction(conn, pipeline)
+                    yield tx
+        tx._committed()
+
+    ##################################################################################################################
+    # Async API
+    ##################################################################################################################
+    # Awaitable twins of sql/sync/sync_many backed by AsyncConnectionPool. They share statement building with the
+    # blocking API, so the two can be mixed freely on the same Table. `async` is a reserved word, hence async_sync.
+
+    @classmethod
+    async def _acheckout(cls, schema_name: str, read_only: bool) -> Tuple[str, Optional[int], Any]:
+        pg_key = config.get_pg_key_for_table(cls.__name__)
+        backend = get_backend()
+        if backend is not None:
+            return pg_key, None, await backend.get_async_pool(cls, schema_name)
+        replica = await achoose_replica(pg_key) if read_only else None
+        return pg_key, replica, await get_async_pool(pg_key, schema_name, replica=replica)
+
+    @classmethod
+    async def _arun(
+        cls,
+        operation: Callable[[AsyncCursor], Awaitable[Any]],
+        schema_name: str = "public",
+        max_retries: int = 3,
+        read_only: bool = False,
+        atomic: bool = True,
+        query: Optional[Tuple[str, Any]] = None,
+    ):
+        """Async counterpart of _run: await operation(cursor) in one transaction with the same retry policy"""
+        pg_key, replica, pool = await cls._acheckout(schema_name, read_only)
+        retry = RetryPolicy(pg_key, replica, max_retries)
+
+        while True:
+            try:
+                started = time.perf_counter()
+                async with pool.connection() as conn:
+                    checked_out = time.perf_counter()
+                    async with conn.transaction() if atomic else nullcontext():
+                        async with conn.cursor() as cursor:
+                            result = await operation(cursor)
+                            rowcount = cursor.rowcount
+                if query is not None:
+                    finished = time.perf_counter()
+                    slow = record_query(query[0], checked_out - started, finished - checked_out, rowcount)
+                    if slow and read_only and explain_due(query[0]):
+                        schedule_explain(query[0], partial(cls._explain, *query, schema_name))
+                return result
+
+            except PsycopgError as e:
+                if query is not None:
+                    record_error(query[0])
+                delay = retry.next_delay(e)
+                if delay is None:
+                    pool = await get_async_pool(pg_key, schema_name)
+                else:
+                    await asyncio.sleep(delay)
+
+    @classmethod
+    async def asql(
+        cls,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        schema_name: str = "public",
+        max_retries: int = 3,
+        prepare: Optional[bool] = None,
+        read_only: Optional[bool] = None,
+    ):
+        if read_only is None:
+            read_only = _is_read_only_statement(sql_statement)
+
+        async def execute(cursor: AsyncCursor):
+            await cursor.execute(sql_statement, params, prepare=prepare)
+            if cursor.description is not None:
+                return await cursor.fetchall()
+            else:
+                return []
+
+        return await cls._arun(
+            execute, schema_name, max_retries, read_only, atomic=False, query=(sql_statement, params)
+        )
+
+    @classmethod
+    async def astream(
+        cls,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        itersize: int = DEFAULT_STREAM_ITERSIZE,
+        as_model: bool = False,
+        schema_name: str = "public",
+        max_retries: int = 3,
+    ) -> AsyncIterator[Any]:
+        """Async generator version of stream, see there for arguments"""
+        pg_key, replica, pool = await cls._acheckout(schema_name, _is_read_only_statement(sql_statement))
+        retry = RetryPolicy(pg_key, replica, max_retries)
+        streaming = False
+
+        while True:
+            try:
+                async with pool.connection() as conn, conn.transaction():
+                    async with conn.cursor(name=f"_stream_{cls.__tablename__}") as cursor:
+                        cursor.itersize = itersize
+                        await cursor.execute(sql_statement, params)
+                        async for row in cursor:
+                            streaming = True
+                            yield cls._from_row(row) if as_model else row
+                return
+
+            except PsycopgError as e:
+                if streaming:
+                    raise
+                delay = retry.next_delay(e)
+                if delay is None:
+                    pool = await get_async_pool(pg_key, schema_name)
+                else:
+                    await asyncio.sleep(delay)
+
+    @classmethod
+    async def apage(
+        cls,
+        where: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        order_by: Sequence[str] = (),
+        after: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_LIMIT,
+        descending: bool = False,
+        as_model: bool = True,
+        schema_name: str = "public",
+        read_only: Optional[bool] = None,
+    ) -> Page:
+        """Async version of page, see there for arguments"""
+        statement, query_params, key_columns = cls._page_query(where, params, order_by, after, limit, descending)
+        rows = await cls.asql(statement, query_params, schema_name=schema_name, read_only=read_only)
+        return cls._make_page(rows, key_columns, limit, as_model)
+
+    @classmethod
+    @asynccontextmanager
+    async def atransaction(cls, schema_name: str = "public") -> AsyncIterator["AsyncTransaction"]:
+        """Async version of transaction(); the AsyncTransaction's methods are awaited"""
+        _, _, pool = await cls._acheckout(schema_name, read_only=False)
+        async with pool.connection() as conn:
+            async with conn.pipeline() if AsyncPipeline.is_supported() else nullcontext() as pipeline:
+                async with conn.transaction():
+                    tx = AsyncTransaction(conn, pipeline)
+                    yield tx
+        tx._committed()
+
+    @classmethod
+    async def aget(cls, pk) -> Optional["Table"]:
+        found, missing = cls._cache_get_many([pk])
+        if not missing:
+            return found[pk]
+        rows = await cls.asql(cls._get_plan().select_statement, [pk], prepare=True)
+        if not rows:
+            return None
+        instance = cls._from_row(rows[0])
+        cls._cache_put(instance)
+        return instance
+
+    @classmethod
+    async def aget_many(cls, pks: List[Any]) -> Dict[Any, "Table"]:
+        found, missing = cls._cache_get_many(pks)
+        if missing:
+            plan = cls._get_plan()
+            rows = await cls.asql(plan.select_many_statement, [missing], prepare=True)
+            instances = [cls._from_row(row) for row in rows]
+            cls._cache_put(*instances)
+            found.update((getattr(instance, plan.primary_key), instance) for instance in instances)
+        return found
+
+    async def adelete(self):
+        plan = self.__class__._get_plan()
+        pk = getattr(self, plan.primary_key)
+        await self.__class__.asql(plan.delete_statement, [pk], prepare=True)
+        self.__class__.invalidate(pk)
+        self._persisted = False
+
+    async def async_sync(self):
+        """Sync the model to the database without blocking the event loop, see sync"""
+        plan = self.__class__._get_plan()
+        self._mark_mutated()
+        if self._persisted and not self._dirty_fields:
+            return
+        update = self._get_update(plan)
+        if update is None or not await self.__class__.asql(*update, prepare=True):
+            await self.__class__.asql(plan.upsert_statement, self._get_row(plan), prepare=True)
+        self.__class__._after_sync([self])
+
+    @classmethod
+    async def async_sync_many(cls, objects, batch_size=1000, copy=False):
+        """Awaitable version of sync_many, see there for arguments"""
+        if copy:
+            for batch in cls._iter_sync_many_batches(objects, batch_size):
+                await cls._arun(partial(cls._acopy_batch, batch=batch))
+                cls._after_sync(batch)
+            return
+
+        for batch in cls._iter_sync_many_batches(objects, batch_size):
+            await cls.asql(*cls._get_sync_many_statement(batch))
+            cls._after_sync(batch)
+
+
+######################################################################################################################
+# Transactions
+######################################################################################################################
+
+
+class _BaseTransaction:
+    def __init__(self, conn, pipeline):
+        self._conn = conn
+        self._pipeline = pipeline  # None when libpq doesn't support pipeline mode
+        self._synced: List[Table] = []
+
+    def _sync_statements(self, objects, batch_size: int) -> Iterator[Tuple[str, List[Any], bool]]:
+        """Yield (statement, params, prepare) upserts for objects, which must all be of one Table class"""
         if not isinstance(objects, list):
             objects = [objects]
-
         if not objects:
-            return  # Nothing to sync
+            return
+        table_class = objects[0].__class__
+        for batch in table_class._iter_sync_many_batches(objects, batch_size):
+            self._synced.extend(batch)
+            if len(batch) == 1:
+                plan = table_class._get_plan()
+                yield plan.upsert_statement, batch[0]._get_row(plan), True
+            else:
+                yield *table_class._get_sync_many_statement(batch), False
 
-        table_name = cls._get_sql_table_name()
-        if table_name is None:
-            raise ValueError("Cannot sync without a table name defined")
+    def _committed(self):
+        """Publish synced rows to their Table caches, only once the commit went through"""
+        for obj in self._synced:
+            obj.__class__._after_sync([obj])
 
-        # Find primary key
-        primary_key = None
-        for field_name, field_info in cls.model_fields.items():
-            if field_info.json_schema_extra and field_info.json_schema_extra.get(
-                "primary_key", False
-            ):
-                primary_key = field_name
-                break
 
-        if not primary_key:
-            raise ValueError("Cannot sync without a primary key defined")
+class Transaction(_BaseTransaction):
+    """Unit of work returned by Table.transaction()"""
 
-        # Process in batches
-        for i in range(0, len(objects), batch_size):
-            upper_idx = min(i + batch_size, len(objects))
-            batch = objects[i:upper_idx]
+    def sql(
+        self,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        prepare: Optional[bool] = None,
+    ):
+        """Run a statement and return its rows, flushing any queued writes first"""
+        with self._conn.cursor() as cursor:
+            cursor.execute(sql_statement, params, prepare=prepare)
+            if self._pipeline is not None:
+                self._pipeline.sync()
+            if cursor.description is not None:
+                return cursor.fetchall()
+            return []
 
-            # Build a SQL transaction for this batch
-            all_values = []
-            columns = list(batch[0].model_dump().keys())
-            columns_str = ", ".join(columns)
-            placeholders = ", ".join(["%s"] * len(columns))
-            set_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in columns])
+    def execute(
+        self,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        prepare: Optional[bool] = None,
+    ):
+        """Queue a statement whose result isn't needed, it is sent with the next flush or the commit"""
+        self._conn.execute(sql_statement, params, prepare=prepare)
 
-            # Collect values for this batch
-            for obj in batch:
-                if not isinstance(obj, cls):
-                    raise TypeError(
-                        f"Expected instance of {cls.__name__}, got {type(obj).__name__}"
-                    )
+    def sync(self, obj: Table):
+        """Queue an upsert of obj, see Table.sync"""
+        self.sync_many([obj])
 
-                data = obj.model_dump()
-                row_values = []
-                for col in columns:
-                    value = data[col]
-                    row_values.append(obj._prepare_value(value))
-                all_values.extend(row_values)
+    def sync_many(self, objects, batch_size: int = 1000):
+        """Queue upserts of objects, see Table.sync_many"""
+        for sql_statement, values, prepare in self._sync_statements(objects, batch_size):
+            self._conn.execute(sql_statement, values, prepare=prepare)
 
-            # Build the SQL statement for this batch
-            values_placeholders = ", ".join([f"({placeholders})" for _ in batch])
 
-            sql_statement = f"""
-                INSERT INTO {table_name} ({columns_str})
-                VALUES {values_placeholders}
-                ON CONFLICT ({primary_key}) DO UPDATE
-                SET {set_clause}
-            """
+class AsyncTransaction(_BaseTransaction):
+    """Unit of work returned by Table.atransaction()"""
+
+    async def sql(
+        self,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        prepare: Optional[bool] = None,
+    ):
+        async with self._conn.cursor() as cursor:
+            await cursor.execute(sql_statement, params, prepare=prepare)
+            if self._pipeline is not None:
+                await self._pipeline.sync()
+            if cursor.description is not None:
+                return await cursor.fetchall()
+            return []
+
+    async def execute(
+        self,
+        sql_statement: str,
+        params: Dict[str, Any] | None = None,
+        prepare: Optional[bool] = None,
+    ):
+        await self._conn.execute(sql_statement, params, prepare=prepare)
+
+    async def sync(self, obj: Table):
+        await self.sync_many([obj])
 
-            cls.sql(sql_statement, all_values)
+    async def sync_many(self, objects, batch_size: int = 1000):
+        for sql_statement, values, prepare in self._sync_statements(objects, batch_size):
+            await self._conn.execute(sql_statement, values, prepare=prepare)
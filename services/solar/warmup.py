@@ -0,0 +1,91 @@
+######################################################################################################################
+# General Information
+######################################################################################################################
+# This file contains the startup warm-up of the connection pools used by a set of Tables. Without it the first
+# requests after a deploy each pay for DNS resolution, TLS, connection startup and statement planning. warm_up opens
+# min_size connections (Config.pg_pool_min_size) in every pool the Tables use, blocking and async alike, and has each
+# new connection prepare the Tables' primary-key lookups and any further statements of the application's hot path.
+# It raises when a primary's pools can't be opened, so the application fails to start rather than taking traffic
+# with them. Call it from the application's startup hook:
+#
+#     @asynccontextmanager
+#     async def lifespan(app):
+#         await warm_up([ChatSession, ChatMessage], statements=[(ChatMessage, "SELECT ...", {"session_id": sid})])
+#         yield
+
+
+######################################################################################################################
+# Dependencies
+######################################################################################################################
+
+
+from typing import Any, Iterable, List, Tuple, Type
+
+from .config import config
+from .pool import awarm_pools, register_hot_statement, warm_pools
+from .table import Table, _is_read_only_statement, get_backend
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+######################################################################################################################
+# Warm-up
+######################################################################################################################
+
+
+def hot_statements(table_class: Type[Table]) -> List[Tuple[str, Any]]:
+    """The get/get_many lookups of a Table, with sample parameters of the primary key's type"""
+    plan = table_class._get_plan()
+    field_info = table_class.model_fields[plan.primary_key]
+    try:
+        sample_pk = None if field_info.is_required() else field_info.get_default(call_default_factory=True)
+    except Exception:
+        sample_pk = None
+    if sample_pk is None:
+        # Without a sample value the parameter types would differ from real calls, and psycopg wouldn't reuse it
+        return []
+    return [(plan.select_statement, [sample_pk]), (plan.select_many_statement, [[sample_pk]])]
+
+
+async def warm_up(
+    tables: Iterable[Type[Table]],
+    schema_name: str = "public",
+    statements: Iterable[Tuple[Type[Table], str, Any]] = (),
+):
+    """
+    Register the Tables' hot statements, then open and prepare min_size connections in each of their pools. Does
+    nothing when a Backend is installed (SOLAR_TABLE_BACKEND=memory), since Tables don't use the pools then.
+
+    Args:
+        tables: Tables whose pools to open and whose primary-key lookups to prepare
+        schema_name: Schema of the pools
+        statements: Further (Table, statement, sample params) to prepare on the pools of the Table's PG key, with
+            params of the types real calls use. Writes are rolled back, see register_hot_statement.
+
+    Raises:
+        RuntimeError: When a primary's pool can't open its min_size connections
+    """
+    if get_backend() is not None:
+        return
+    started = time.perf_counter()
+    pg_keys = []
+    for table_class in tables:
+        pg_key = config.get_pg_key_for_table(table_class.__name__)
+        for sql_statement, params in hot_statements(table_class):
+            register_hot_statement(pg_key, sql_statement, params)
+        if pg_key not in pg_keys:
+            pg_keys.append(pg_key)
+    for table_class, sql_statement, params in statements:
+        pg_key = config.get_pg_key_for_table(table_class.__name__)
+        register_hot_statement(pg_key, sql_statement, params, write=not _is_read_only_statement(sql_statement))
+        if pg_key not in pg_keys:
+            pg_keys.append(pg_key)
+
+    await awarm_pools(pg_keys, schema_name)
+    # Routes that still run blocking code in worker threads use the blocking pools
+    await asyncio.to_thread(warm_pools, pg_keys, schema_name)
+    logger.info(f"Warmed up pools for {', '.join(pg_keys)} in {time.perf_counter() - started:.2f}s")
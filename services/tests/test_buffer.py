@@ -0,0 +1,80 @@
+import threading
+import uuid
+from typing import ClassVar
+
+import psycopg
+
+from solar import Table, ColumnDetails, WriteBehindBuffer
+
+
+class Note(Table):
+    __tablename__ = "notes"
+    __write_behind__ = WriteBehindBuffer(partition_key="thread_id", flush_interval=0.01)
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+    thread_id: int
+    body: str
+
+    written: ClassVar[list] = []
+    committed: ClassVar[threading.Event] = threading.Event()
+
+    @classmethod
+    def sync_many(cls, objects, batch_size=1000, copy=False):
+        cls.written.append(list(objects))
+        cls.committed.set()
+
+
+def test_rows_are_readable_until_flushed_in_one_batch():
+    buffer = Note.__write_behind__
+    assert buffer.table_class is Note
+
+    buffer.add(Note(thread_id=1, body="a"), Note(thread_id=2, body="b"))
+    buffer.add(Note(thread_id=1, body="c"))
+    assert [note.body for note in buffer.pending(1)] == ["a", "c"]
+
+    assert Note.committed.wait(timeout=2)
+    assert [[note.body for note in batch] for batch in Note.written] == [["a", "b", "c"]]
+    assert buffer.pending() == []
+
+
+def test_closed_buffer_writes_through():
+    buffer = WriteBehindBuffer(flush_interval=0.01)
+    buffer.table_class = Note
+    buffer.close()
+    Note.written.clear()
+    buffer.add(Note(thread_id=3, body="d"))
+    assert [note.body for note in Note.written[0]] == ["d"]
+
+
+class Ledger(Table):
+    __tablename__ = "ledger"
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+    entry: int
+
+    written: ClassVar[list] = []
+
+    @classmethod
+    def sync_many(cls, objects, batch_size=1000, copy=False):
+        # Stands in for a unique constraint on entry
+        entries = [row.entry for row in objects]
+        if len(set(entries)) < len(entries) or any(entry in cls.written for entry in entries):
+            raise psycopg.errors.UniqueViolation("duplicate key value violates unique constraint")
+        cls.written.extend(entries)
+
+
+def test_rows_violating_a_constraint_are_repaired_or_set_aside():
+    def renumber(row):
+        # Only the first entry has somewhere else to go
+        if row.entry != 1:
+            return False
+        row.entry = 10
+        return True
+
+    buffer = WriteBehindBuffer(flush_interval=60, on_reject=renumber)
+    buffer.table_class = Ledger
+    buffer._pending = [Ledger(entry=1), Ledger(entry=2), Ledger(entry=1), Ledger(entry=3), Ledger(entry=2)]
+    buffer.flush()
+    assert Ledger.written == [1, 2, 10, 3]
+    assert [row.entry for row in buffer.dead_letters] == [2]
+    assert buffer.pending() == []
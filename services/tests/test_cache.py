@@ -0,0 +1,57 @@
+import time
+
+from pydantic import BaseModel
+
+from solar.cache import EntityCache
+
+
+class Row(BaseModel):
+    id: int
+    tags: list = []
+
+
+def test_hit_returns_copy():
+    cache = EntityCache(maxsize=2)
+    cache.put(1, Row(id=1))
+    row = cache.get(1)
+    row.tags.append("mutated")
+    assert cache.get(1).tags == []
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_eviction():
+    cache = EntityCache(maxsize=2)
+    cache.put(1, Row(id=1))
+    cache.put(2, Row(id=2))
+    cache.get(1)
+    cache.put(3, Row(id=3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["misses"] == 1
+
+
+def test_ttl_expiry():
+    cache = EntityCache(ttl=0.01)
+    cache.put(1, Row(id=1))
+    time.sleep(0.02)
+    assert cache.get(1) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_evict():
+    cache = EntityCache()
+    cache.put(1, Row(id=1))
+    cache.evict(1, 2)
+    assert cache.get(1) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_update_sets_fields_of_cached_rows_only():
+    cache = EntityCache()
+    cache.put(1, Row(id=1))
+    cache.update(1, tags=["a"])
+    cache.update(2, tags=["b"])
+    assert cache.get(1).tags == ["a"]
+    assert cache.get(2) is None
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.completion_cache import (
+    CompletionCache,
+    MemoryCompletionBackend,
+    SQLiteCompletionBackend,
+    complete,
+    set_completion_cache,
+)
+
+
+class StubCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **request):
+        self.calls += 1
+        content = f"Answer {self.calls}"
+        usage = SimpleNamespace(total_tokens=100)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+@pytest.fixture
+def client():
+    yield SimpleNamespace(chat=SimpleNamespace(completions=StubCompletions()))
+    set_completion_cache(None)
+
+
+def ask(content, **params):
+    return {
+        "model": "openai/o4-mini",
+        "messages": [{"role": "system", "content": "Ask one question."}, {"role": "user", "content": content}],
+        **params,
+    }
+
+
+def test_repeated_and_near_identical_requests_are_hits(client):
+    cache = CompletionCache(MemoryCompletionBackend(maxsize=16, ttl=60))
+    set_completion_cache(cache)
+
+    async def scenario():
+        return [
+            await complete(client, **ask("We run a dental clinic.")),
+            await complete(client, **ask("We run a dental clinic.")),
+            await complete(client, **ask("  we run a DENTAL clinic ")),
+            await complete(client, **ask("We run a bakery.")),
+        ]
+
+    assert asyncio.run(scenario()) == ["Answer 1", "Answer 1", "Answer 1", "Answer 2"]
+    assert client.chat.completions.calls == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["normalized_hits"], stats["misses"]) == (1, 1, 2)
+    assert stats["tokens_saved"] == 200
+
+
+def test_sampled_requests_are_not_cached(client):
+    cache = CompletionCache(MemoryCompletionBackend(maxsize=16, ttl=60))
+    set_completion_cache(cache)
+
+    async def scenario():
+        return [await complete(client, **ask("Name our bakery.", temperature=0.9)) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ["Answer 1", "Answer 2"]
+    assert cache.stats()["size"] == 0
+
+
+def test_memory_backend_evicts_least_recently_used_and_expired():
+    backend = MemoryCompletionBackend(maxsize=2, ttl=60)
+    backend.put("a", "A", 1)
+    backend.put("b", "B", 1)
+    backend.get("a")
+    backend.put("c", "C", 1)
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (("A", 1), None, ("C", 1))
+    assert backend.evictions == 1
+
+    backend.ttl = 0
+    assert backend.get("a") is None
+
+
+def test_sqlite_backend_evicts_in_passes(tmp_path, client):
+    backend = SQLiteCompletionBackend(str(tmp_path / "completions.sqlite3"), maxsize=2, ttl=60)
+    backend.EVICT_EVERY = 3
+    for key in ("a", "b"):
+        backend.put(key, key.upper(), 1)
+    backend.get("a")
+    backend.put("c", "C", 1)
+    assert backend.size() == 2
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (("A", 1), None, ("C", 1))
+    assert backend.evictions == 1
+
+    # Async callers use it from a thread
+    set_completion_cache(CompletionCache(backend))
+
+    async def scenario():
+        return [await complete(client, **ask("We run a dental clinic.")) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ["Answer 1", "Answer 1"]
@@ -0,0 +1,52 @@
+import pytest
+
+from solar.config import config
+
+
+@pytest.fixture(autouse=True)
+def pg_keys():
+    # Keys are resolved once per table, these tests change the env they come from
+    config.get_pg_key_for_table.cache_clear()
+    yield
+    config.get_pg_key_for_table.cache_clear()
+
+
+def test_tables_default_to_neon(monkeypatch):
+    monkeypatch.setenv("NEON_CONN_URL", "postgresql://primary/db")
+    monkeypatch.delenv("CHATMESSAGE", raising=False)
+    assert config.get_pg_key_for_table("ChatMessage") == "NEON_CONN_URL"
+
+
+def test_table_env_can_name_a_resource_key(monkeypatch):
+    monkeypatch.setenv("NEON_CONN_URL", "postgresql://primary/db")
+    monkeypatch.setenv("PG_RESOURCE_ANALYTICS", "postgresql://analytics/db")
+    monkeypatch.setenv("CHATMESSAGE", "PG_RESOURCE_ANALYTICS")
+    assert config.get_pg_key_for_table("ChatMessage") == "PG_RESOURCE_ANALYTICS"
+    assert config.get_pg_connection_string("PG_RESOURCE_ANALYTICS") == "postgresql://analytics/db"
+
+
+def test_table_env_can_hold_a_connection_string(monkeypatch):
+    monkeypatch.setenv("NEON_CONN_URL", "postgresql://primary/db")
+    monkeypatch.setenv("CHATMESSAGE", "postgresql://messages/db")
+    assert config.get_pg_key_for_table("ChatMessage") == "CHATMESSAGE"
+    assert config.get_pg_connection_string("CHATMESSAGE") == "postgresql://messages/db"
+
+
+def test_replicas_are_not_primary_keys(monkeypatch):
+    monkeypatch.setenv("NEON_CONN_URL", "postgresql://primary/db")
+    monkeypatch.setenv("PG_RESOURCE_ANALYTICS_REPLICAS", "postgresql://r1/db, postgresql://r2/db")
+    assert "PG_RESOURCE_ANALYTICS_REPLICAS" not in config.get_all_pg_connection_strings()
+    assert config.get_pg_replica_connection_strings("PG_RESOURCE_ANALYTICS") == [
+        "postgresql://r1/db",
+        "postgresql://r2/db",
+    ]
+
+
+def test_table_keys_are_resolved_once(monkeypatch):
+    monkeypatch.setenv("NEON_CONN_URL", "postgresql://primary/db")
+    monkeypatch.setenv("CHATMESSAGE", "postgresql://messages/db")
+    assert config.get_pg_key_for_table("ChatMessage") == "CHATMESSAGE"
+    monkeypatch.delenv("CHATMESSAGE")
+    assert config.get_pg_key_for_table("ChatMessage") == "CHATMESSAGE"
+    config.get_pg_key_for_table.cache_clear()
+    assert config.get_pg_key_for_table("ChatMessage") == "NEON_CONN_URL"
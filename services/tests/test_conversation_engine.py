@@ -0,0 +1,545 @@
+import asyncio
+import json
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from core import conversation_engine
+from core.chat_message import ChatMessage
+from core.chat_session import ChatSession
+from core.completion_cache import set_completion_cache
+from core.readiness import ReadinessAgreement
+from core.conversation_engine import PROPOSAL_READY_MESSAGE, SUMMARY_BATCH, SUMMARY_RECENT_MESSAGES
+from solar import MemoryBackend, set_backend
+
+
+class StubStream:
+    def __init__(self, parts, delay=0.0):
+        self.parts = parts
+        self.delay = delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for part in self.parts:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+    async def close(self):
+        self.closed = True
+
+
+class StubCompletions:
+    """Answers like the model would, and records what it was asked"""
+
+    def __init__(self):
+        self.requests = []
+        self.ready = False
+        self.delay = 0.0
+        self.summary_delay = 0.0
+        self.failures = 0
+        self.decision_question = None  # next_question of decide_turn, instead of a new question
+        self.streams = []
+
+    def calls(self, kind: str) -> int:
+        return sum(1 for request in self.requests if self.kind(request) == kind)
+
+    @staticmethod
+    def kind(request) -> str:
+        if "response_format" in request:
+            return "decide_turn"
+        if "running summary" in request["messages"][0]["content"]:
+            return "summarize"
+        if "Do we have enough information" in request["messages"][-1]["content"]:
+            return "readiness"
+        return "question"
+
+    async def create(self, **request):
+        self.requests.append(request)
+        kind = self.kind(request)
+        await asyncio.sleep(self.summary_delay if kind == "summarize" else self.delay)
+        if self.failures and kind != "summarize":
+            self.failures -= 1
+            raise RuntimeError("model unavailable")
+        question = f"Question {len(self.requests)}?"
+        if request.get("stream"):
+            self.streams.append(StubStream(["Question ", f"{len(self.requests)}?"], self.delay))
+            return self.streams[-1]
+        if kind == "decide_turn":
+            next_question = question if self.decision_question is None else self.decision_question
+            content = json.dumps({"ready": self.ready, "next_question": next_question})
+        elif kind == "summarize":
+            content = f"Summary {self.calls('summarize')}"
+        elif kind == "readiness":
+            content = "ready" if self.ready else "need_more"
+        else:
+            content = question
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    completions = StubCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(conversation_engine, "get_llm_client", lambda: client)
+    set_completion_cache(None)
+    yield completions
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = MemoryBackend()
+    set_backend(backend)
+    monkeypatch.setattr(conversation_engine, "_session_cache", conversation_engine.SessionHistoryCache())
+    monkeypatch.setattr(conversation_engine, "_idempotent_turns", conversation_engine.IdempotentTurns(ttl=600))
+    yield backend
+    ChatMessage.__write_behind__.flush()
+    set_backend(None)
+
+
+async def settle():
+    """Wait for the summaries that turns scheduled"""
+    while conversation_engine._summary_tasks:
+        await asyncio.gather(*conversation_engine._summary_tasks.values())
+
+
+async def history(session_id: str):
+    ChatMessage.__write_behind__.flush()
+    rows = await ChatMessage.asql(
+        "SELECT role, content, message_order, idempotency_key FROM chat_messages WHERE session_id = %(session_id)s "
+        "ORDER BY message_order",
+        {"session_id": uuid.UUID(session_id)},
+    )
+    return rows
+
+
+async def session_row(session_id: str):
+    rows = await ChatSession.asql(
+        "SELECT conversation_summary, summarized_messages FROM chat_sessions WHERE id = %(session_id)s",
+        {"session_id": uuid.UUID(session_id)},
+    )
+    return rows[0]["conversation_summary"], rows[0]["summarized_messages"]
+
+
+def test_summary_starts_at_the_threshold(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        before = []
+        # The opening question plus two messages a turn
+        while 1 + 2 * (len(before) + 1) < SUMMARY_RECENT_MESSAGES + SUMMARY_BATCH:
+            await conversation_engine.send_chat_message(session_id, f"answer {len(before)}")
+            await settle()
+            before.append(await session_row(session_id))
+        await conversation_engine.send_chat_message(session_id, "one more")
+        await settle()
+        return before, await session_row(session_id)
+
+    before, after = asyncio.run(scenario())
+    assert set(before) == {(None, 0)}
+    assert model.calls("summarize") == 1
+    assert after == ("Summary 1", 1 + 2 * (len(before) + 1) - SUMMARY_RECENT_MESSAGES)
+
+
+def test_summary_is_not_saved_over_a_newer_one(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        for turn in range(8):
+            await conversation_engine.send_chat_message(session_id, f"answer {turn}")
+        await settle()
+        # Another worker saved a summary while this one was writing its own
+        original = conversation_engine.ConversationEngine.summarize
+
+        async def summarize_late(self, messages):
+            await ChatSession.asql(
+                "UPDATE chat_sessions SET conversation_summary = 'elsewhere', summarized_messages = 99 "
+                "WHERE id = %(session_id)s",
+                {"session_id": uuid.UUID(session_id)},
+            )
+            return await original(self, messages)
+
+        conversation_engine.ConversationEngine.summarize = summarize_late
+        try:
+            for turn in range(SUMMARY_BATCH):
+                await conversation_engine.send_chat_message(session_id, f"late answer {turn}")
+            await settle()
+        finally:
+            conversation_engine.ConversationEngine.summarize = original
+        state = await conversation_engine._load_conversation(uuid.UUID(session_id))
+        return await session_row(session_id), state
+
+    row, state = asyncio.run(scenario())
+    assert row == ("elsewhere", 99)
+    # The cache doesn't claim a summary the table doesn't have
+    assert state.summary == "Summary 1"
+
+
+def test_overlapping_turns_keep_the_summary_in_step(backend, model):
+    # Summaries take longer than turns, so turns load the conversation while one is being written
+    model.delay = 0.002
+    model.summary_delay = 0.015
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        for burst in range(8):
+            await asyncio.gather(*[
+                conversation_engine.send_chat_message(session_id, f"answer {burst}.{turn}") for turn in range(2)
+            ])
+        await settle()
+        state = await conversation_engine._load_conversation(uuid.UUID(session_id))
+        return await session_row(session_id), state
+
+    (summary, summarized_messages), state = asyncio.run(scenario())
+    assert summary is not None
+    assert (state.summary, state.summarized_messages) == (summary, summarized_messages)
+    assert len(state.messages) - summarized_messages < SUMMARY_RECENT_MESSAGES + SUMMARY_BATCH
+    # Every summary the model wrote was saved
+    assert model.calls("summarize") == int(summary.split()[-1])
+
+
+def test_summaries_run_with_the_session_cache_off(backend, model, monkeypatch):
+    monkeypatch.setattr(conversation_engine, "_session_cache", conversation_engine.SessionHistoryCache(maxsize=0))
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        for turn in range(SUMMARY_RECENT_MESSAGES + SUMMARY_BATCH):
+            await conversation_engine.send_chat_message(session["session_id"], f"answer {turn}")
+            await settle()
+        return await session_row(session["session_id"])
+
+    summary, summarized_messages = asyncio.run(scenario())
+    assert summary is not None and summarized_messages > 0
+
+
+def test_repeated_requests_get_the_first_response(backend, model):
+    model.delay = 0.01
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        send = conversation_engine.send_chat_message
+        # A double submit while the turn is answered, then a retry after it was
+        first, second = await asyncio.gather(send(session_id, "hello", "key-1"), send(session_id, "hello", "key-1"))
+        third = await send(session_id, "hello", "key-1")
+        return (first, second, third), await history(session_id)
+
+    responses, rows = asyncio.run(scenario())
+    assert responses[0] == responses[1] == responses[2]
+    assert conversation_engine._idempotent_turns.coalesced == 2
+    assert model.calls("question") == 1
+    assert [(row["role"], row["message_order"], row["idempotency_key"]) for row in rows] == [
+        ("assistant", 1, None), ("user", 2, "key-1"), ("assistant", 3, None)
+    ]
+
+
+def test_a_repeat_on_another_worker_waits_for_the_claimed_turn(backend, model, monkeypatch):
+    model.delay = 0.05
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        first = asyncio.ensure_future(conversation_engine.send_chat_message(session_id, "hello", "key-1"))
+        await asyncio.sleep(0.01)
+        # The other worker has its own single-flight map, only the table tells it the turn is taken
+        monkeypatch.setattr(conversation_engine, "_idempotent_turns", conversation_engine.IdempotentTurns(ttl=600))
+        second = await conversation_engine.send_chat_message(session_id, "hello", "key-1")
+        return await first, second, await history(session_id)
+
+    first, second, rows = asyncio.run(scenario())
+    assert first == second
+    assert model.calls("question") == 1
+    assert [row["role"] for row in rows] == ["assistant", "user", "assistant"]
+
+
+def test_a_failed_turn_releases_its_key(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        model.failures = 1
+        with pytest.raises(RuntimeError):
+            await conversation_engine.send_chat_message(session_id, "hello", "key-1")
+        response = await conversation_engine.send_chat_message(session_id, "hello", "key-1")
+        return response, await history(session_id)
+
+    response, rows = asyncio.run(scenario())
+    assert response["ready_for_proposal"] is False
+    assert [(row["role"], row["idempotency_key"]) for row in rows] == [
+        ("assistant", None), ("user", "key-1"), ("assistant", None)
+    ]
+
+
+def test_answered_turn_needs_the_reply(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_uuid = uuid.UUID(session["session_id"])
+        state = await conversation_engine._load_conversation(session_uuid)
+        unknown = await conversation_engine._answered_turn(session_uuid, "key-1")
+        claim, state = await conversation_engine._claim_turn(session_uuid, state, "hello", "key-1")
+        in_progress = await conversation_engine._answered_turn(session_uuid, "key-1")
+        # A repeat can't claim the key again
+        repeat, _ = await conversation_engine._claim_turn(session_uuid, state, "hello", "key-1")
+        await conversation_engine._save_turn(session_uuid, state, [("assistant", PROPOSAL_READY_MESSAGE)], state.next_order)
+        buffered = await conversation_engine._answered_turn(session_uuid, "key-1")
+        ChatMessage.__write_behind__.flush()
+        saved = await conversation_engine._answered_turn(session_uuid, "key-1")
+        return claim, unknown, in_progress, repeat, buffered, saved
+
+    claim, unknown, in_progress, repeat, buffered, saved = asyncio.run(scenario())
+    assert claim is not None and repeat is None
+    assert unknown is None and in_progress is None
+    assert buffered == saved == {"message": PROPOSAL_READY_MESSAGE, "ready_for_proposal": True}
+
+
+def test_answered_turn_finds_a_renumbered_reply(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_uuid = uuid.UUID(session["session_id"])
+        state = await conversation_engine._load_conversation(session_uuid)
+        claim, state = await conversation_engine._claim_turn(session_uuid, state, "hello", "key-1")
+        # The order reserved for the reply is taken by a row written without a reservation, e.g. by an older deploy
+        await ChatMessage(
+            session_id=session_uuid, role="user", content="unreserved", message_order=state.next_order
+        ).async_sync()
+        await conversation_engine._save_turn(session_uuid, state, [("assistant", "Question?")], state.next_order)
+        ChatMessage.__write_behind__.flush()
+        return claim, await conversation_engine._answered_turn(session_uuid, "key-1"), await history(session["session_id"])
+
+    claim, answered, rows = asyncio.run(scenario())
+    assert [(row["content"], row["message_order"]) for row in rows][1:] == [
+        ("hello", claim.message_order), ("unreserved", claim.message_order + 1), ("Question?", claim.message_order + 2)
+    ]
+    assert answered == {"message": "Question?", "ready_for_proposal": False}
+
+def test_reserved_message_orders_do_not_overlap(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_uuid = uuid.UUID(session["session_id"])
+        firsts = await asyncio.gather(*[
+            conversation_engine._reserve_message_orders(session_uuid, 1, 2) for _ in range(5)
+        ])
+        # Sessions numbered before last_message_order existed continue after their loaded conversation
+        past_floor = await conversation_engine._reserve_message_orders(session_uuid, 40, 1)
+        with pytest.raises(ValueError):
+            await conversation_engine._reserve_message_orders(uuid.uuid4(), 1, 2)
+        return firsts, past_floor
+
+    firsts, past_floor = asyncio.run(scenario())
+    assert sorted(firsts) == [2, 4, 6, 8, 10]
+    assert past_floor == 41
+
+
+def test_a_buffered_message_whose_order_is_taken_is_renumbered(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_uuid = uuid.UUID(session["session_id"])
+        ChatMessage.__write_behind__.flush()
+        # Written without a reservation, e.g. by an older deploy
+        await ChatMessage(session_id=session_uuid, role="user", content="unreserved", message_order=2).async_sync()
+        ChatMessage.__write_behind__.add(ChatMessage(session_id=session_uuid, role="user", content="buffered", message_order=2))
+        return await history(session["session_id"])
+
+    rows = asyncio.run(scenario())
+    assert [(row["content"], row["message_order"]) for row in rows][1:] == [("unreserved", 2), ("buffered", 3)]
+    assert ChatMessage.__write_behind__.dead_letters == []
+
+
+def test_readiness_score_is_compared_in_shadow_and_skips_the_model_when_on(model, monkeypatch):
+    monkeypatch.setattr(conversation_engine, "readiness_agreement", ReadinessAgreement())
+    thin = []
+    for turn in range(4):
+        thin += [{"role": "assistant", "content": "Tell me more?"}, {"role": "user", "content": f"Answer {turn}."}]
+
+    async def scenario(mode):
+        monkeypatch.setenv("READINESS_HEURISTIC", mode)
+        return await conversation_engine.ConversationEngine().plan_turn(uuid.uuid4(), thin)
+
+    # Shadow asks the model and counts whether the score agreed with it
+    assert asyncio.run(scenario("shadow")) == (False, "Question 1?")
+    assert model.calls("decide_turn") == 1
+    # On, the score rules the thin answers out and only the question is asked
+    assert asyncio.run(scenario("on")) == (False, "Question 2?")
+    assert model.calls("decide_turn") == 1
+    readiness = conversation_engine.engine_stats()["readiness"]
+    assert (readiness["mode"], readiness["compared"], readiness["agreed"], readiness["skipped"]) == ("on", 1, 1, 1)
+
+
+def message(text):
+    return {"role": "user", "content": text}
+
+
+def test_session_cache_evicts_the_least_recently_used():
+    cache = conversation_engine.SessionHistoryCache(maxsize=2)
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    cache.put(first, conversation_engine.SessionState([message("a")], 2))
+    cache.put(second, conversation_engine.SessionState([message("b")], 2))
+    assert cache.get(first, 2) is not None
+    cache.put(third, conversation_engine.SessionState([message("c")], 2))
+    assert cache.get(second, 2) is None
+    assert [state.messages for state in (cache.get(first, 2), cache.get(third, 2))] == [[message("a")], [message("c")]]
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+
+
+def test_session_cache_only_takes_turns_in_order():
+    cache = conversation_engine.SessionHistoryCache()
+    session_id = uuid.uuid4()
+    cache.put(session_id, conversation_engine.SessionState([message("a")], 2))
+    assert cache.advance(session_id, 2, [message("b"), message("c")])
+    # Another worker saved a turn at 4, this one is numbered after it
+    assert not cache.advance(session_id, 5, [message("e")])
+    # The entry no longer matches the table, so it is dropped rather than trusted
+    assert cache.get(session_id, 4) is None
+    assert not cache.advance(session_id, 4, [message("d")])
+
+
+def test_session_cache_hands_out_copies_and_expires_idle_sessions():
+    cache = conversation_engine.SessionHistoryCache(idle_seconds=0.01)
+    session_id = uuid.uuid4()
+    cache.put(session_id, conversation_engine.SessionState([message("a")], 2))
+    cache.get(session_id, 2).messages.append(message("not saved"))
+    assert cache.get(session_id, 2).messages == [message("a")]
+    time.sleep(0.02)
+    assert cache.get(session_id, 2) is None
+
+
+def test_session_cache_size_zero_turns_it_off(backend, model, monkeypatch):
+    cache = conversation_engine.SessionHistoryCache(maxsize=0)
+    monkeypatch.setattr(conversation_engine, "_session_cache", cache)
+    session_id = uuid.uuid4()
+    cache.put(session_id, conversation_engine.SessionState([message("a")], 2))
+    assert cache.get(session_id, 2) is None
+    assert not cache.advance(session_id, 2, [message("b")])
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        for turn in range(2):
+            await conversation_engine.send_chat_message(session["session_id"], f"answer {turn}")
+        return await conversation_engine._load_conversation(uuid.UUID(session["session_id"]))
+
+    # Every turn reads the conversation back from the table
+    state = asyncio.run(scenario())
+    assert [msg["role"] for msg in state.messages] == ["assistant", "user", "assistant", "user", "assistant"]
+    assert state.next_order == 6
+    assert cache.stats()["size"] == 0 and cache.stats()["hits"] == 0
+
+
+
+def conversation(answers):
+    history = [{"role": "assistant", "content": "What does your business do?"}]
+    for turn in range(answers):
+        history += [{"role": "user", "content": f"Answer {turn}."}, {"role": "assistant", "content": "And then?"}]
+    return history[:-1]
+
+
+def test_plan_turn_asks_for_the_question_only_before_four_answers(model):
+    engine = conversation_engine.ConversationEngine()
+    assert asyncio.run(engine.plan_turn(uuid.uuid4(), conversation(3))) == (False, "Question 1?")
+    assert [model.kind(request) for request in model.requests] == ["question"]
+
+
+def test_plan_turn_decides_with_one_call_after_four_answers(model):
+    engine = conversation_engine.ConversationEngine()
+    assert asyncio.run(engine.plan_turn(uuid.uuid4(), conversation(4))) == (False, "Question 1?")
+    model.ready = True
+    assert asyncio.run(engine.plan_turn(uuid.uuid4(), conversation(4))) == (True, None)
+    # Not ready without a question: the question is asked for separately
+    model.ready, model.decision_question = False, " "
+    assert asyncio.run(engine.plan_turn(uuid.uuid4(), conversation(4))) == (False, "Question 4?")
+    assert [model.kind(request) for request in model.requests] == ["decide_turn", "decide_turn", "decide_turn", "question"]
+
+
+def test_sequential_mode_asks_readiness_then_the_question(model):
+    engine = conversation_engine.ConversationEngine(mode="sequential")
+    assert asyncio.run(engine.plan_turn(uuid.uuid4(), conversation(4))) == (False, "Question 2?")
+    assert [model.kind(request) for request in model.requests] == ["readiness", "question"]
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def test_streamed_turn_yields_tokens_then_the_saved_response(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        events = await collect(conversation_engine.stream_chat_message(session["session_id"], "hello"))
+        return events, await history(session["session_id"])
+
+    events, rows = asyncio.run(scenario())
+    assert events == [
+        {"event": "token", "data": {"text": "Question "}},
+        {"event": "token", "data": {"text": "1?"}},
+        {"event": "done", "data": {"message": "Question 1?", "ready_for_proposal": False}},
+    ]
+    assert [(row["role"], row["content"]) for row in rows][1:] == [("user", "hello"), ("assistant", "Question 1?")]
+
+
+def test_streamed_turn_of_a_ready_session_only_says_so(backend, model):
+    model.ready = True
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        for turn in range(3):
+            await conversation_engine.send_chat_message(session["session_id"], f"answer {turn}")
+        events = await collect(conversation_engine.stream_chat_message(session["session_id"], "answer 3"))
+        return events, await history(session["session_id"])
+
+    events, rows = asyncio.run(scenario())
+    assert events == [{"event": "done", "data": {"message": PROPOSAL_READY_MESSAGE, "ready_for_proposal": True}}]
+    assert rows[-1]["content"] == PROPOSAL_READY_MESSAGE
+    # The question started alongside the readiness check was stopped
+    assert all(stream.closed for stream in model.streams)
+
+
+def test_a_client_leaving_mid_stream_stops_the_turn(backend, model):
+    model.delay = 0.01
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        events = conversation_engine.stream_chat_message(session["session_id"], "hello")
+        first = await anext(events)
+        await events.aclose()
+        return first, await history(session["session_id"])
+
+    first, rows = asyncio.run(scenario())
+    assert first == {"event": "token", "data": {"text": "Question "}}
+    assert model.streams[0].closed
+    assert [row["role"] for row in rows] == ["assistant"]
+
+
+def test_streamed_repeats_share_the_turn(backend, model):
+    model.delay = 0.01
+
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_id = session["session_id"]
+        first, second = await asyncio.gather(
+            collect(conversation_engine.stream_chat_message(session_id, "hello", "key-1")),
+            collect(conversation_engine.stream_chat_message(session_id, "hello", "key-1")),
+        )
+        later = await conversation_engine.send_chat_message(session_id, "hello", "key-1")
+        return first, second, later, await history(session_id)
+
+    first, second, later, rows = asyncio.run(scenario())
+    done = {"event": "done", "data": {"message": "Question 1?", "ready_for_proposal": False}}
+    assert first[-1] == second[-1] == done and later == done["data"]
+    # The tokens went to the request that started the turn
+    assert sorted([len(first), len(second)]) == [1, 3]
+    assert model.calls("question") == 1
+    assert [row["role"] for row in rows] == ["assistant", "user", "assistant"]
+
+
+def test_turns_keep_the_cached_session_current(backend, model):
+    async def scenario():
+        session = await conversation_engine.start_chat_session()
+        session_uuid = uuid.UUID(session["session_id"])
+        for turn in range(2):
+            await conversation_engine.send_chat_message(session["session_id"], f"answer {turn}")
+        return ChatSession.__cache__.get(session_uuid)
+
+    cached = asyncio.run(scenario())
+    assert cached is not None and cached.last_message_order == 5
@@ -0,0 +1,42 @@
+import uuid
+
+import pytest
+
+from solar import Table, ColumnDetails, Index
+from solar.indexes import declared_indexes, create_index_statement, _is_covered
+
+
+class Gadget(Table):
+    __tablename__ = "gadgets"
+    __indexes__ = (Index(("owner_id", "position"), unique=True),)
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+    owner_id: uuid.UUID = ColumnDetails(index=True)
+    position: int
+
+
+def test_declared_indexes_are_named_and_rendered():
+    single, composite = declared_indexes(Gadget)
+    assert single == Index(("owner_id",), name="ix_gadgets_owner_id")
+    assert composite.name == "ux_gadgets_owner_id_position"
+    assert create_index_statement(Gadget, composite) == (
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_gadgets_owner_id_position "
+        "ON gadgets (owner_id, position);"
+    )
+
+
+def test_unknown_index_column_is_rejected():
+    class Broken(Gadget):
+        __indexes__ = (Index(("missing",)),)
+
+    with pytest.raises(ValueError):
+        declared_indexes(Broken)
+
+
+def test_existing_indexes_cover_declared_ones():
+    single, composite = declared_indexes(Gadget)
+    existing = [("other", "CREATE INDEX other ON public.gadgets USING btree (owner_id, position)")]
+    assert _is_covered(single, existing)
+    # A non-unique index doesn't enforce a declared unique one
+    assert not _is_covered(composite, existing)
+    assert _is_covered(composite, [("ux_gadgets_owner_id_position", "")])
@@ -0,0 +1,113 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+import pytest
+from psycopg import errors
+
+from solar import Table, ColumnDetails, Index, MemoryBackend, set_backend
+from solar.memory import translate
+
+
+class Ticket(Table):
+    __tablename__ = "tickets"
+    __indexes__ = (Index(("queue", "position"), unique=True),)
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+    queue: str
+    position: int
+    labels: List[str] = []
+    details: Optional[dict] = None
+    closed: bool = False
+    created_at: datetime = ColumnDetails(default_factory=datetime.now)
+
+
+@pytest.fixture
+def backend():
+    backend = MemoryBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+
+def test_statements_are_translated_to_sqlite():
+    assert translate("SELECT * FROM t WHERE id = ANY(%s)") == (
+        "SELECT * FROM t WHERE id IN (SELECT value FROM json_each(?))"
+    )
+    assert translate("UPDATE t SET a = %(a)s::jsonb WHERE b ILIKE 'x%%'") == "UPDATE t SET a = :a WHERE b LIKE 'x%'"
+    assert translate("UPDATE t SET n = GREATEST(n, %(floor)s) + 1 RETURNING n") == (
+        "UPDATE t SET n = MAX(n, :floor) + 1 RETURNING n"
+    )
+
+
+def test_rows_round_trip_with_postgres_types(backend):
+    ticket = Ticket(queue="support", position=1, labels=["billing"], details={"priority": "high"})
+    ticket.sync()
+    Ticket.sync_many([Ticket(queue="support", position=position) for position in (2, 3)])
+
+    loaded = Ticket.get(ticket.id)
+    assert loaded == ticket
+    assert Ticket.get(uuid.uuid4()) is None
+
+    rows = Ticket.sql(
+        "SELECT id, closed, created_at FROM tickets WHERE queue = %(queue)s ORDER BY position", {"queue": "support"}
+    )
+    assert [type(value) for value in rows[0].values()] == [uuid.UUID, bool, datetime]
+    assert len(Ticket.get_many([row["id"] for row in rows])) == 3
+
+
+def test_dirty_updates_deletes_and_pages(backend):
+    tickets = [Ticket(queue="sales", position=position) for position in range(5)]
+    Ticket.sync_many(tickets)
+
+    tickets[0].closed = True
+    tickets[0].sync()
+    assert Ticket.sql("SELECT closed FROM tickets WHERE id = %s", [tickets[0].id]) == [{"closed": True}]
+
+    tickets[4].delete()
+    query = {"where": "queue = %(queue)s", "params": {"queue": "sales"}, "order_by": ["position"], "limit": 3}
+    first = Ticket.page(**query)
+    second = Ticket.page(**query, after=first.next_cursor)
+    assert [ticket.position for ticket in first.items + second.items] == [0, 1, 2, 3]
+    assert second.next_cursor is None
+
+
+def test_constraint_violations_raise_psycopg_errors(backend):
+    Ticket(queue="ops", position=1).sync()
+    with pytest.raises(errors.UniqueViolation):
+        Ticket(queue="ops", position=1).sync()
+
+
+def test_transactions_roll_back(backend):
+    with pytest.raises(RuntimeError):
+        with Ticket.transaction() as tx:
+            tx.sync(Ticket(queue="ops", position=7))
+            raise RuntimeError("abort")
+    assert Ticket.sql("SELECT COUNT(*) AS n FROM tickets") == [{"n": 0}]
+
+
+def test_async_api(backend):
+    async def scenario():
+        ticket = Ticket(queue="async", position=1)
+        await ticket.async_sync()
+        async with Ticket.atransaction() as tx:
+            await tx.sync(Ticket(queue="async", position=2))
+        page = await Ticket.apage(where="queue = %(queue)s", params={"queue": "async"}, order_by=["position"])
+        return await Ticket.aget(ticket.id), page
+
+    loaded, page = asyncio.run(scenario())
+    assert loaded.queue == "async"
+    assert [ticket.position for ticket in page.items] == [1, 2]
+
+
+def test_streams_return_every_row(backend):
+    Ticket.sync_many([Ticket(queue="bulk", position=position) for position in range(5)])
+    statement = "SELECT * FROM tickets WHERE queue = %(queue)s ORDER BY position"
+
+    async def scenario():
+        return [row async for row in Ticket.astream(statement, {"queue": "bulk"}, itersize=2)]
+
+    streamed = Ticket.stream(statement, {"queue": "bulk"}, itersize=2, as_model=True)
+    assert [ticket.position for ticket in streamed] == [0, 1, 2, 3, 4]
+    assert [row["position"] for row in asyncio.run(scenario())] == [0, 1, 2, 3, 4]
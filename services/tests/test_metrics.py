@@ -0,0 +1,66 @@
+import queue
+import threading
+
+from solar import metrics
+from solar.metrics import fingerprint, query_stats, record_query, record_error, reset_query_stats
+
+
+def test_fingerprint_groups_statements_by_shape():
+    assert fingerprint("SELECT *\n  FROM t WHERE id = %(id)s AND n > 10 AND s = 'x''y'") == (
+        "SELECT * FROM t WHERE id = ? AND n > ? AND s = ?"
+    )
+    assert fingerprint("SELECT * FROM t2 WHERE a = %s") == "SELECT * FROM t2 WHERE a = ?"
+
+
+def test_stats_split_pool_wait_from_execution(monkeypatch):
+    monkeypatch.setenv("SLOW_QUERY_THRESHOLD_MS", "100")
+    reset_query_stats()
+    assert not record_query("SELECT 1", pool_wait=0.001, execution=0.002, rows=1)
+    assert record_query("SELECT 2", pool_wait=0.1, execution=0.05, rows=3)
+    record_error("SELECT 2")
+
+    stats = query_stats()
+    slow = stats["SELECT ?"]
+    assert slow["calls"] == 2 and slow["slow_calls"] == 1 and slow["errors"] == 1
+    assert slow["rows"] == 4
+    assert round(slow["pool_wait_ms"]) == 101
+    assert round(slow["execution_ms"]) == 52
+    assert slow["p50_ms"] == 5 and slow["p99_ms"] == 250
+    reset_query_stats()
+
+
+def test_explain_is_opt_in_and_rate_limited(monkeypatch):
+    reset_query_stats()
+    record_query("SELECT 1", 0, 1, 1)
+    assert not metrics.explain_due("SELECT 1")
+    monkeypatch.setenv("SLOW_QUERY_EXPLAIN", "true")
+    assert metrics.explain_due("SELECT 1")
+    assert not metrics.explain_due("SELECT 1")
+    reset_query_stats()
+
+
+def test_plans_are_captured_off_the_request_path(monkeypatch):
+    reset_query_stats()
+    record_query("SELECT 1", 0, 1, 1)
+    release = threading.Event()
+    threads = []
+
+    def explain():
+        release.wait(timeout=2)
+        threads.append(threading.current_thread().name)
+        return "Seq Scan on t"
+
+    assert metrics.schedule_explain("SELECT 1", explain)
+    # The statement's caller doesn't wait for the plan
+    assert query_stats()["SELECT ?"]["last_plan"] is None
+    release.set()
+    metrics._explain_queue.join()
+    assert query_stats()["SELECT ?"]["last_plan"] == "Seq Scan on t"
+    assert threads == ["solar-explain"]
+
+    # Past the queue's size, plans are dropped rather than queued without bound
+    monkeypatch.setattr(metrics, "_explain_queue", queue.Queue(maxsize=1))
+    monkeypatch.setattr(metrics, "_explain_thread", threading.current_thread())
+    assert metrics.schedule_explain("SELECT 1", explain)
+    assert not metrics.schedule_explain("SELECT 1", explain)
+    reset_query_stats()
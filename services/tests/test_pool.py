@@ -0,0 +1,153 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from psycopg import errors, OperationalError
+
+from solar import pool
+from solar.pool import (
+    DEFAULT_RETRY_BACKOFF,
+    DEFAULT_RETRY_BACKOFF_CAP,
+    RetryPolicy,
+    _configure_search_path,
+    _connection_kwargs,
+    _pool_schema,
+    _search_path_options,
+    is_transient_error,
+    retry_delay,
+)
+
+
+def test_public_and_auth_share_a_pool():
+    assert _pool_schema("auth") == _pool_schema("public") == "public"
+    assert _pool_schema("analytics") == "analytics"
+
+
+def test_search_path_is_pinned_through_options():
+    assert _search_path_options("postgresql://u@h/db", "public") == "-c search_path=auth,public"
+    assert _search_path_options("postgresql://u@h/db", "analytics") == "-c search_path=analytics"
+
+
+def test_existing_options_are_kept():
+    options = _search_path_options("postgresql://u@h/db?options=-c%20statement_timeout%3D5s", "public")
+    assert options == "-c statement_timeout=5s -c search_path=auth,public"
+
+
+def test_only_connection_failures_are_retried():
+    assert is_transient_error(OperationalError("server closed the connection unexpectedly"))
+    assert is_transient_error(errors.SerializationFailure())
+    assert not is_transient_error(errors.QueryCanceled())
+    assert not is_transient_error(errors.UniqueViolation())
+
+
+def test_retry_delay_backs_off_with_a_cap():
+    for attempt in range(1, 10):
+        delay = retry_delay(attempt)
+        assert 0 <= delay <= min(DEFAULT_RETRY_BACKOFF_CAP, DEFAULT_RETRY_BACKOFF * 2**attempt)
+
+
+def test_retry_policy_falls_back_to_the_primary_then_backs_off(monkeypatch):
+    unavailable = []
+    monkeypatch.setattr(pool, "mark_replica_unavailable", lambda pg_key, replica: unavailable.append((pg_key, replica)))
+    lost = OperationalError("server closed the connection unexpectedly")
+
+    retry = RetryPolicy("NEON_CONN_URL", 0, max_retries=3)
+    assert retry.next_delay(lost) is None
+    assert (retry.replica, unavailable) == (None, [("NEON_CONN_URL", 0)])
+    assert 0 <= retry.next_delay(lost) <= DEFAULT_RETRY_BACKOFF_CAP
+    with pytest.raises(RuntimeError, match="after 3 attempts"):
+        retry.next_delay(lost)
+
+    with pytest.raises(errors.UniqueViolation):
+        RetryPolicy("NEON_CONN_URL", None, max_retries=3).next_delay(errors.UniqueViolation())
+
+
+def test_pooler_hosts_set_search_path_on_connect(monkeypatch):
+    monkeypatch.delenv("PG_SEARCH_PATH_MODE", raising=False)
+    direct = "postgresql://u@ep-cool-1.us-east-2.aws.neon.tech/db"
+    pooled = "postgresql://u@ep-cool-1-pooler.us-east-2.aws.neon.tech/db"
+    assert "options" in _connection_kwargs(direct, "public")
+    assert _configure_search_path(direct, "public") is None
+
+    assert "options" not in _connection_kwargs(pooled, "public")
+    assert _configure_search_path(pooled, "public") == "SET search_path TO auth, public"
+    assert _configure_search_path(pooled, "analytics") == "SET search_path TO analytics"
+
+    monkeypatch.setenv("PG_SEARCH_PATH_MODE", "set")
+    assert "options" not in _connection_kwargs(direct, "public")
+    monkeypatch.setenv("PG_SEARCH_PATH_MODE", "options")
+    assert "options" in _connection_kwargs(pooled, "public")
+
+
+def test_each_event_loop_gets_its_own_async_pools(monkeypatch):
+    async def create(pg_key, schema_name, replica=None):
+        return object()
+
+    monkeypatch.setattr(pool, "_create_async_pool", create)
+    monkeypatch.setattr(pool, "_start_async_health_monitor", lambda loop_pools: None)
+
+    async def twice():
+        return await pool.get_async_pool("NEON_CONN_URL"), await pool.get_async_pool("NEON_CONN_URL", "auth")
+
+    first, again = asyncio.run(twice())
+    assert first is again
+    # A new loop can't use the first loop's lock or pools
+    second, _ = asyncio.run(twice())
+    assert second is not first
+
+
+class PreparingConnection:
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.log = []
+
+    @contextmanager
+    def transaction(self, force_rollback=False):
+        self.log.append("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.log.append("ROLLBACK")
+            raise
+        self.log.append("ROLLBACK" if force_rollback else "COMMIT")
+
+    def execute(self, sql_statement, params=None, prepare=None):
+        if sql_statement in self.failing:
+            raise errors.ForeignKeyViolation()
+        self.log.append(sql_statement)
+
+
+def test_hot_writes_are_prepared_in_a_rolled_back_transaction(monkeypatch):
+    monkeypatch.setattr(pool, "_hot_statements", {})
+    pool.register_hot_statement("NEON_CONN_URL", "UPDATE a", {})
+    pool.register_hot_statement("NEON_CONN_URL", "SELECT b", {})
+    pool.register_hot_statement("NEON_CONN_URL", "UPDATE a", {}, write=True)
+    pool.register_hot_statement("NEON_CONN_URL", "INSERT c", [], write=True)
+    pool.register_hot_statement("NEON_CONN_URL", "INSERT d", [], write=True)
+
+    conn = PreparingConnection(failing={"INSERT c"})
+    pool._prepare_hot_statements("NEON_CONN_URL", conn)
+    # Registered once, as a read; a failed write only rolls back its savepoint
+    assert conn.log == ["UPDATE a", "SELECT b", "BEGIN", "BEGIN", "ROLLBACK", "BEGIN", "INSERT d", "COMMIT", "ROLLBACK"]
+
+    replica = PreparingConnection()
+    pool._prepare_hot_statements("NEON_CONN_URL", replica, primary=False)
+    assert replica.log == ["UPDATE a", "SELECT b"]
+
+
+def test_warm_up_fails_on_primaries_only(monkeypatch):
+    class ColdPool:
+        def __init__(self, name):
+            self.name = name
+
+        def wait(self, timeout):
+            raise TimeoutError()
+
+    unavailable = []
+    monkeypatch.setattr(pool, "_replica_indexes", lambda pg_key: range(1))
+    monkeypatch.setattr(pool, "mark_replica_unavailable", lambda pg_key, replica: unavailable.append(replica))
+    monkeypatch.setattr(pool, "get_pool", lambda pg_key, schema_name, replica: ColdPool(f"{pg_key}:{replica}"))
+
+    with pytest.raises(RuntimeError, match="NEON_CONN_URL:None"):
+        pool.warm_pools(["NEON_CONN_URL"])
+    assert unavailable == [0]
@@ -0,0 +1,46 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from core.completion_cache import set_completion_cache
+from core.conversation_engine import MAX_CONTEXT_MESSAGES
+from core.proposal_generator import ProposalGenerator
+
+
+class StubCompletions:
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        content = json.dumps({"business_name": "Bright Smiles", "industry": "Dental"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def conversation(turns):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "assistant", "content": f"Question {turn}?"})
+        history.append({"role": "user", "content": f"Answer {turn} about the clinic."})
+    return history
+
+
+def test_profile_prompt_stays_bounded_in_long_conversations():
+    completions = StubCompletions()
+    generator = ProposalGenerator(SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    set_completion_cache(None)
+
+    async def scenario():
+        for turns in (MAX_CONTEXT_MESSAGES, 10 * MAX_CONTEXT_MESSAGES):
+            profile = await generator.extract_business_profile(conversation(turns), "Summary", 2 * turns - 20)
+            assert profile["business_name"] == "Bright Smiles"
+        await generator.extract_business_profile(conversation(10 * MAX_CONTEXT_MESSAGES))
+
+    asyncio.run(scenario())
+    prompts = [request["messages"][-1]["content"] for request in completions.requests]
+    # Same summary and window of recent messages whatever the length
+    assert prompts[0].startswith("Summary of the earlier conversation: Summary\n")
+    assert len(prompts[0].splitlines()) == len(prompts[1].splitlines()) == 21
+    assert prompts[1].endswith(f"Business Owner: Answer {10 * MAX_CONTEXT_MESSAGES - 1} about the clinic.")
+    # Without a summary the window alone bounds it
+    assert len(prompts[2].splitlines()) == MAX_CONTEXT_MESSAGES
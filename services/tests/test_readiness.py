@@ -0,0 +1,79 @@
+import pytest
+
+from core.readiness import MIN_ANSWER_WORDS, ReadinessAgreement, readiness_mode, score_readiness
+
+
+def answers(*texts):
+    history = []
+    for text in texts:
+        history.append({"role": "assistant", "content": "Tell me about the customer emails and the backlog."})
+        history.append({"role": "user", "content": text})
+    return history
+
+
+COVERED = answers(
+    "We are a dental clinic with six staff.",
+    "The biggest problem is the phone, patients call all day to book an appointment.",
+    "Reminders are copied by hand from a spreadsheet every day.",
+    "Bookings fall through and we double book when the front desk is overwhelmed.",
+)
+
+
+def padded(history, words):
+    return history + answers(" ".join(["ok"] * words))
+
+
+def test_areas_come_from_the_owners_answers_only():
+    score = score_readiness(answers("We sell flowers."), min_areas=3)
+    # The assistant's questions mention customers, emails and backlogs; only the answer counts
+    assert score.areas == ["business"]
+    assert score.answer_words == 3
+
+
+def test_maybe_ready_needs_enough_areas_and_words():
+    covered = score_readiness(padded(COVERED, MIN_ANSWER_WORDS), min_areas=3)
+    assert covered.areas == ["business", "challenges", "manual_work", "customers", "bottlenecks"]
+    assert covered.maybe_ready
+
+    # Every area, but too short to have said anything about them
+    assert not score_readiness(answers("Clinic: problem, spreadsheet, patients, backlog."), min_areas=3).maybe_ready
+
+    # Long enough, but about too few areas
+    two_areas = padded(answers("We are a dental clinic.", "Patients call all day."), MIN_ANSWER_WORDS)
+    assert score_readiness(two_areas, min_areas=2).maybe_ready
+    assert not score_readiness(two_areas, min_areas=3).maybe_ready
+
+
+def test_min_areas_and_mode_come_from_the_environment(monkeypatch):
+    history = padded(answers("We are a dental clinic.", "Patients call all day."), MIN_ANSWER_WORDS)
+    monkeypatch.setenv("READINESS_HEURISTIC_MIN_AREAS", "2")
+    assert score_readiness(history).maybe_ready
+
+    monkeypatch.setenv("READINESS_HEURISTIC", "Shadow")
+    assert readiness_mode() == "shadow"
+    monkeypatch.setenv("READINESS_HEURISTIC", "sometimes")
+    with pytest.raises(ValueError):
+        readiness_mode()
+
+
+def test_agreement_counts_missed_proposals_apart():
+    agreement = ReadinessAgreement()
+    maybe_ready = score_readiness(padded(COVERED, MIN_ANSWER_WORDS), min_areas=3)
+    not_ready = score_readiness(answers("We sell flowers."), min_areas=3)
+
+    agreement.record(maybe_ready, True)
+    agreement.record(not_ready, False)
+    # The model wants more although the score would ask it: expected, the model decides
+    agreement.record(maybe_ready, False)
+    # The score would have held back a conversation the model calls ready
+    agreement.record(not_ready, True)
+    agreement.record_skip()
+
+    assert agreement.stats() == {
+        "compared": 4,
+        "agreed": 2,
+        "agreement_rate": 0.5,
+        "missed_ready": 1,
+        "skipped": 1,
+    }
+    assert ReadinessAgreement().stats()["agreement_rate"] is None
@@ -0,0 +1,381 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+import pytest
+from psycopg import AsyncPipeline, Pipeline
+from psycopg.types.json import Jsonb
+
+from solar import Table, ColumnDetails, EntityCache
+from solar.table import _is_read_only_statement
+
+
+class Widget(Table):
+    __tablename__ = "widgets"
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+    name: str
+    tags: dict = {}
+
+
+class Keyless(Table):
+    __tablename__ = "keyless"
+
+    name: str
+
+
+def test_plan_is_compiled_once_per_class():
+    plan = Widget._get_plan()
+    assert plan is Widget._get_plan()
+    assert plan.primary_key == "id"
+    assert plan.columns == ["id", "name", "tags"]
+    assert plan.json_columns == frozenset({"tags"})
+    assert "INSERT INTO widgets (id, name, tags)" in plan.upsert_statement
+    assert "ON CONFLICT (id) DO UPDATE" in plan.upsert_statement
+    assert plan.select_statement == "SELECT id, name, tags FROM widgets WHERE id = %s"
+    assert plan.delete_statement == "DELETE FROM widgets WHERE id = %s"
+
+
+def test_row_wraps_only_json_columns():
+    widget = Widget(name="a", tags={"x": 1})
+    values = widget._get_row(Widget._get_plan())
+    assert values[:2] == [widget.id, "a"]
+    assert isinstance(values[2], Jsonb)
+
+
+def test_sync_many_batches_rows():
+    widgets = [Widget(name=str(i)) for i in range(5)]
+    batches = list(Widget._iter_sync_many_batches(widgets, batch_size=2))
+    statements = [Widget._get_sync_many_statement(batch) for batch in batches]
+    assert [len(values) for _, values in statements] == [6, 6, 3]
+    assert statements[-1][0].count("(%s, %s, %b)") == 1
+
+
+def test_sync_many_rejects_foreign_objects():
+    with pytest.raises(TypeError):
+        list(Widget._iter_sync_many_batches([Widget(name="a"), Keyless(name="b")], 10))
+
+
+def test_assignment_marks_fields_dirty():
+    widget = Widget._from_row({"id": uuid.uuid4(), "name": "a", "tags": {"x": 1}})
+    assert widget._get_update(Widget._get_plan()) is not None
+    assert not widget._dirty_fields
+
+    widget.name = "b"
+    statement, values = widget._get_update(Widget._get_plan())
+    assert "SET name = %s" in statement
+    assert "tags" not in statement
+    assert values == ["b", widget.id]
+
+
+def test_mark_dirty_flags_in_place_mutations():
+    widget = Widget._from_row({"id": uuid.uuid4(), "name": "a", "tags": {}})
+    widget.tags["x"] = 1
+    assert not widget._dirty_fields
+    widget.mark_dirty("tags")
+    statement, values = widget._get_update(Widget._get_plan())
+    assert "SET tags = %b" in statement
+    assert isinstance(values[0], Jsonb)
+    with pytest.raises(ValueError):
+        widget.mark_dirty("missing")
+
+
+def test_new_rows_and_key_changes_are_written_in_full():
+    plan = Widget._get_plan()
+    widget = Widget(name="a")
+    widget.name = "b"
+    assert widget._get_update(plan) is None
+
+    loaded = Widget._from_row({"id": uuid.uuid4(), "name": "a", "tags": {}})
+    loaded.id = uuid.uuid4()
+    assert loaded._get_update(plan) is None
+
+
+def test_sync_requires_primary_key():
+    with pytest.raises(ValueError):
+        Keyless._get_plan()
+
+
+def test_copy_statements_merge_through_staging_table():
+    create_statement, copy_statement, merge_statement = Widget._get_plan().copy_statements
+    assert "CREATE TEMP TABLE _staging_widgets" in create_statement
+    assert "ON COMMIT DROP" in create_statement
+    assert copy_statement == "COPY _staging_widgets (id, name, tags) FROM STDIN"
+    assert "SELECT id, name, tags FROM _staging_widgets" in merge_statement
+    assert "ON CONFLICT (id) DO UPDATE" in merge_statement
+
+
+@pytest.mark.parametrize(
+    "sql_statement, read_only",
+    [
+        ("SELECT role, content FROM chat_messages WHERE session_id = %(session_id)s", True),
+        ("  with recent as (select 1) select * from recent", True),
+        ("SELECT * FROM chat_sessions WHERE id = %s FOR UPDATE", False),
+        ("WITH moved AS (DELETE FROM a RETURNING *) SELECT * FROM moved", False),
+        ("UPDATE chat_sessions SET calendar_booking_completed = true", False),
+        ("INSERT INTO widgets (id) VALUES (%s)", False),
+    ],
+)
+def test_read_only_statement_detection(sql_statement, read_only):
+    assert _is_read_only_statement(sql_statement) is read_only
+
+
+def test_page_query_seeks_past_the_cursor():
+    statement, params, key_columns = Widget._page_query(
+        "name = %(name)s", {"name": "a"}, ["name"], None, 10, False
+    )
+    assert key_columns == ["name", "id"]
+    assert "ORDER BY name, id" in statement
+    assert params == {"name": "a", "_limit": 11}
+
+    rows = [{"id": uuid.uuid4(), "name": str(i), "tags": {}} for i in range(11)]
+    page = Widget._make_page(rows, key_columns, 10, as_model=True)
+    assert len(page.items) == 10 and page.items[0]._persisted
+
+    statement, params, _ = Widget._page_query(None, None, ["name"], page.next_cursor, 10, True)
+    assert "(name, id) < (%(_after_0)s, %(_after_1)s)" in statement
+    assert "ORDER BY name DESC, id DESC" in statement
+    assert [params["_after_0"], params["_after_1"]] == ["9", str(rows[9]["id"])]
+
+
+def test_last_page_has_no_cursor():
+    rows = [{"id": uuid.uuid4(), "name": "a", "tags": {}}]
+    assert Widget._make_page(rows, ["id"], 10, as_model=False).next_cursor is None
+
+
+@pytest.mark.parametrize("order_by, after", [(["missing"], None), (["name"], "not a cursor"), (["name"], "WzFd")])
+def test_page_rejects_bad_input(order_by, after):
+    with pytest.raises(ValueError):
+        Widget._page_query(None, None, order_by, after, 10, False)
+
+
+def test_json_columns_are_sent_in_binary():
+    plan = Widget._get_plan()
+    assert "VALUES (%s, %s, %b)" in plan.upsert_statement
+    assert "(%s, %s, %b), (%s, %s, %b)" in plan.upsert_many_statement(2)
+
+
+class CachedWidget(Table):
+    __tablename__ = "cached_widgets"
+    __cache__ = EntityCache()
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+    name: str
+
+
+class RecordingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __iter__(self):
+        return iter(self.connection.rows)
+
+    @property
+    def itersize(self):
+        return self.connection.itersize
+
+    @itersize.setter
+    def itersize(self, value):
+        self.connection.itersize = value
+
+    def execute(self, sql_statement, params=None, prepare=None):
+        self.connection.log.append(sql_statement.split()[0])
+        self.description = [] if sql_statement.startswith("SELECT") else None
+
+    def fetchall(self):
+        return self.connection.rows
+
+
+class RecordingConnection:
+    """Stands in for a pool and its pooled connection, logging what Table sends"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.log = []
+        self.itersize = None
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    @contextmanager
+    def transaction(self):
+        self.log.append("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.log.append("ROLLBACK")
+            raise
+        self.log.append("COMMIT")
+
+    @contextmanager
+    def pipeline(self):
+        yield self
+
+    def sync(self):
+        self.log.append("sync")
+
+    def cursor(self, name=None):
+        self.log.append(f"cursor {name}")
+        return RecordingCursor(self)
+
+    def execute(self, sql_statement, params=None, prepare=None):
+        RecordingCursor(self).execute(sql_statement, params)
+
+
+class AsyncRecordingCursor(RecordingCursor):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def __aiter__(self):
+        for row in self.connection.rows:
+            yield row
+
+    async def execute(self, sql_statement, params=None, prepare=None):
+        RecordingCursor.execute(self, sql_statement, params)
+
+    async def fetchall(self):
+        return self.connection.rows
+
+
+class AsyncRecordingConnection(RecordingConnection):
+    @asynccontextmanager
+    async def connection(self):
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        with RecordingConnection.transaction(self):
+            yield
+
+    @asynccontextmanager
+    async def pipeline(self):
+        yield self
+
+    async def sync(self):
+        self.log.append("sync")
+
+    def cursor(self, name=None):
+        self.log.append(f"cursor {name}")
+        return AsyncRecordingCursor(self)
+
+    async def execute(self, sql_statement, params=None, prepare=None):
+        RecordingCursor(self).execute(sql_statement, params)
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = RecordingConnection([{"id": uuid.uuid4(), "name": name, "tags": {}} for name in "abc"])
+    checkout = classmethod(lambda cls, schema_name, read_only: ("main", None, connection))
+    monkeypatch.setattr(Table, "_checkout", checkout)
+    monkeypatch.setattr(Pipeline, "is_supported", classmethod(lambda cls: True))
+    return connection
+
+
+@pytest.fixture
+def async_connection(monkeypatch):
+    connection = AsyncRecordingConnection([{"id": uuid.uuid4(), "name": name, "tags": {}} for name in "abc"])
+
+    async def acheckout(cls, schema_name, read_only):
+        return "main", None, connection
+
+    monkeypatch.setattr(Table, "_acheckout", classmethod(acheckout))
+    monkeypatch.setattr(AsyncPipeline, "is_supported", classmethod(lambda cls: True))
+    return connection
+
+
+def test_stream_reads_through_a_named_cursor(connection):
+    widgets = list(Widget.stream("SELECT id, name, tags FROM widgets", itersize=2, as_model=True))
+    assert [widget.name for widget in widgets] == ["a", "b", "c"]
+    assert not widgets[0]._dirty_fields
+    # Named cursors only live inside a transaction
+    assert connection.log == ["BEGIN", "cursor _stream_widgets", "SELECT", "COMMIT"]
+    assert connection.itersize == 2
+
+
+def test_astream_reads_through_a_named_cursor(async_connection):
+    async def scenario():
+        return [row async for row in Widget.astream("SELECT id, name, tags FROM widgets", itersize=2)]
+
+    assert [row["name"] for row in asyncio.run(scenario())] == ["a", "b", "c"]
+    assert async_connection.log == ["BEGIN", "cursor _stream_widgets", "SELECT", "COMMIT"]
+    assert async_connection.itersize == 2
+
+
+def test_transaction_sends_queued_writes_with_the_next_read(connection):
+    first, second = CachedWidget(name="first"), CachedWidget(name="second")
+    with CachedWidget.transaction() as tx:
+        tx.sync(first)
+        tx.execute("UPDATE cached_widgets SET name = name")
+        assert tx.sql("SELECT id, name FROM cached_widgets") == connection.rows
+        tx.sync(second)
+        # Nothing is published before the commit
+        assert CachedWidget.__cache__.get(first.id) is None
+    assert connection.log == ["BEGIN", "INSERT", "UPDATE", "cursor None", "SELECT", "sync", "INSERT", "COMMIT"]
+    assert CachedWidget.__cache__.get(first.id) == first and CachedWidget.__cache__.get(second.id) == second
+
+
+def test_transaction_rolls_back_without_publishing(connection):
+    widget = CachedWidget(name="lost")
+    with pytest.raises(RuntimeError):
+        with CachedWidget.transaction() as tx:
+            tx.sync(widget)
+            raise RuntimeError("abort")
+    assert connection.log == ["BEGIN", "INSERT", "ROLLBACK"]
+    assert CachedWidget.__cache__.get(widget.id) is None
+
+
+def test_atransaction_sends_queued_writes_with_the_next_read(async_connection):
+    widget = CachedWidget(name="async")
+
+    async def scenario():
+        async with CachedWidget.atransaction() as tx:
+            await tx.sync(widget)
+            await tx.sql("SELECT id, name FROM cached_widgets")
+            await tx.execute("UPDATE cached_widgets SET name = name")
+
+    asyncio.run(scenario())
+    assert async_connection.log == ["BEGIN", "INSERT", "cursor None", "SELECT", "sync", "UPDATE", "COMMIT"]
+    assert CachedWidget.__cache__.get(widget.id) == widget
+
+
+def statements(connection):
+    return [entry for entry in connection.log if not entry.startswith("cursor")]
+
+
+def test_sync_writes_fields_mutated_in_place(connection):
+    assert Widget._get_plan().mutable_columns == frozenset({"tags"})
+    widget = Widget._from_row({"id": uuid.uuid4(), "name": "a", "tags": {"x": 1}})
+    widget.sync()
+    assert connection.log == []
+
+    # Never assigned nor marked dirty
+    widget.tags["y"] = 2
+    widget._mark_mutated()
+    statement, _ = widget._get_update(Widget._get_plan())
+    assert "SET tags = %b" in statement
+    widget.sync()
+    # The UPDATE matches no recorded row, so the row is then written in full
+    assert statements(connection) == ["UPDATE", "INSERT"]
+
+    connection.log.clear()
+    widget.sync()
+    assert connection.log == []
+
+
+def test_async_sync_writes_fields_mutated_in_place(async_connection):
+    widget = Widget._from_row({"id": uuid.uuid4(), "name": "a", "tags": {}})
+    widget.tags["x"] = [1]
+    asyncio.run(widget.async_sync())
+    assert statements(async_connection) == ["UPDATE", "INSERT"]
@@ -0,0 +1,62 @@
+import asyncio
+import uuid
+
+from core.conversation_engine import turn_hot_statements
+from solar import Table, ColumnDetails, MemoryBackend, set_backend
+from solar.config import ConfigurationError, config
+from solar import warmup
+from solar.warmup import hot_statements, warm_up
+
+
+class Sprocket(Table):
+    __tablename__ = "sprockets"
+
+    id: uuid.UUID = ColumnDetails(default_factory=uuid.uuid4, primary_key=True)
+
+
+class Named(Table):
+    __tablename__ = "named"
+
+    name: str = ColumnDetails(primary_key=True)
+
+
+def test_hot_statements_use_the_primary_key_type():
+    (select, (pk,)), (select_many, ([many_pk],)) = hot_statements(Sprocket)
+    assert select == Sprocket._get_plan().select_statement
+    assert isinstance(pk, uuid.UUID) and isinstance(many_pk, uuid.UUID)
+
+
+def test_tables_without_a_sample_key_are_skipped():
+    assert hot_statements(Named) == []
+
+
+def test_warm_up_leaves_the_pools_alone_with_a_backend(monkeypatch):
+    def no_postgres(table_name):
+        raise ConfigurationError("NEON_CONN_URL is not set")
+
+    monkeypatch.setattr(config, "get_pg_key_for_table", no_postgres)
+    set_backend(MemoryBackend())
+    try:
+        asyncio.run(warm_up([Sprocket]))
+    finally:
+        set_backend(None)
+
+
+def test_turn_statements_are_registered_as_reads_and_writes(monkeypatch):
+    registered = []
+
+    async def warm(pg_keys, schema_name):
+        pass
+
+    monkeypatch.setattr(warmup, "register_hot_statement", lambda *args, write=False: registered.append(write))
+    monkeypatch.setattr(warmup, "awarm_pools", warm)
+    monkeypatch.setattr(warmup, "warm_pools", lambda pg_keys, schema_name: None)
+    monkeypatch.setattr(config, "get_pg_key_for_table", lambda table_name: "NEON_CONN_URL")
+
+    statements = turn_hot_statements()
+    asyncio.run(warm_up([], statements=statements))
+    # The next message_order read, then the sample session, the reservation and the message upsert
+    assert registered == [False, True, True, True]
+    assert "MAX(message_order)" in statements[0][1]
+    assert statements[2][1].startswith("UPDATE chat_sessions SET last_message_order")
+    assert "INSERT INTO chat_messages" in statements[3][1]